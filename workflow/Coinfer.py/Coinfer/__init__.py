@@ -1,24 +1,40 @@
+import atexit
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
+import shutil
 import sys
 import tarfile
 import tempfile
-from collections import defaultdict
+import threading
+import weakref
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from functools import cached_property, lru_cache
 from html import escape as html_escape
+from itertools import islice, repeat
 from pathlib import Path
-from typing import Any, Callable
-from urllib.parse import unquote
+from typing import TYPE_CHECKING, Any, Self
+from urllib.parse import quote, unquote
 
 import numpy as np
-from bokeh.embed import json_item
-from bokeh.layouts import gridplot
 
 from . import sample_cmd_impl
-from .client import Client, RunInfoData
+from .client import ChainIterMap, Client, RunInfoData, experiment_status
 from .client_common import get_token
+from .experiment_cache import DEFAULT_MAX_BYTES, FINISHED_STATUSES, CacheEntry, ExperimentCache
 from .logged_requests import CheckResponseSubject, requests
+from .resource_monitor import RESOURCES_FILE
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import xarray as xr
+
+    from .convert_csv_to_idata import McmcDataTailer
+    from .downsample import DownsampleMethod
 
 logger = logging.getLogger(__name__)
 
@@ -57,15 +73,191 @@ def _is_sync():
     return False
 
 
+def _is_shared_posterior():
+    """Set by the analyze command running several analyzers, which then read the posterior from the shared cache."""
+    return os.environ.get("COINFER_SHARED_POSTERIOR") == "TRUE"
+
+
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# AbstractMCMC counts the iterations logged by the sampler from 1
+_FIRST_ITERATION = 1
+# budget of the stacked arrays `Experiment.draws()` keeps, least recently used ones are dropped beyond it
+_DEFAULT_DRAW_CACHE_BYTES = 1024**3
+
+
+def _load_netcdf(path: str, group_indexed: bool = False, lazy: bool = False):
+    import arviz as az
+
+    from .convert_csv_to_idata import group_indexed_posterior
+
+    # lazy: only the metadata is read here, values are read from the file when a var is first accessed
+    with az.rc_context({"data.load": "lazy" if lazy else "eager"}):
+        inference_data = az.from_netcdf(path)
+    name_mapping = {name: unquote(name) for name in inference_data.posterior.data_vars.keys()}
+    inference_data.rename(name_mapping, inplace=True)
+    if group_indexed:
+        group_indexed_posterior(inference_data, lazy)
+    return inference_data
+
+
+def _decode_executor(lazy: bool) -> Executor:
+    """Pool decoding the per-chain netCDF files.
+
+    Threads by default: the netCDF/HDF5 reads release the GIL, while worker processes would pickle every decoded
+    dataset back to the parent. `COINFER_DECODE_PROCESSES=TRUE` decodes eagerly loaded files in processes instead,
+    lazily opened datasets hold file handles so they always stay in threads.
+    """
+    max_workers = int(os.environ.get("COINFER_DECODE_WORKERS") or 0) or os.cpu_count() or 1
+    if os.environ.get("COINFER_DECODE_PROCESSES") != "TRUE" or lazy or max_workers == 1:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    # forking while the main thread may hold the import lock (prefetch) can deadlock the workers
+    if threading.current_thread() is not threading.main_thread():
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+def _run_in_background(func: Callable[..., Any], *args: Any) -> "Future[Any]":
+    # a daemon thread, an experiment prefetched but never used must not keep the interpreter alive
+    future: Future[Any] = Future()
+
+    def _run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:  # noqa: BLE001, raised again by `future.result()` in the waiting thread
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="coinfer-prefetch", daemon=True).start()
+    return future
+
+
+def _release_all(releases: list[Callable[[], None]]):
+    for release in releases:
+        release()
+
+
 class Experiment:
-    def __init__(self, server_endpoint: str, auth_token: str, experiment_id: str, share_password: str = ""):
+    def __init__(
+        self,
+        server_endpoint: str,
+        auth_token: str,
+        experiment_id: str,
+        share_password: str = "",
+        group_indexed: bool = False,
+        lazy: bool = False,
+        prefetch: bool = False,
+    ):
+        """With `prefetch` the data is downloaded in a background thread, `inference_data` waits for it."""
         self.experiment_id = experiment_id
         self.server_endpoint = server_endpoint
         self.auth_token = auth_token
         self.share_password = share_password
-        self.inference_data = self._download_inference_data(
-            self.server_endpoint, self.auth_token, self.experiment_id, self.share_password
+        self.group_indexed = group_indexed
+        self.lazy = lazy
+        self._tailer: McmcDataTailer | None = None
+        # sampler iterations of the draws of every chain, sent to the server to only get the newer ones
+        self._iterations: ChainIterMap = {}
+        self._skip_draws: dict[str, int] = {}
+        self._draw_arrays: OrderedDict[str, tuple[np.ndarray, list[int]]] = OrderedDict()
+        self._summaries: dict[tuple[Any, ...], pd.DataFrame] = {}
+        self._inference_data_future: Future[dict[str, Any]] | None = None
+        self._track_holds()
+        download_args = (
+            self.server_endpoint,
+            self.auth_token,
+            self.experiment_id,
+            self.share_password,
+            self.group_indexed,
+            self.lazy,
+            self._holds,
         )
+        if prefetch:
+            self._inference_data_future = _run_in_background(self._download_inference_data, *download_args)
+        else:
+            self.inference_data = self._download_inference_data(*download_args)
+
+    @property
+    def inference_data(self) -> dict[str, Any]:
+        if self._inference_data_future is not None:
+            self._inference_data = self._inference_data_future.result()
+            self._inference_data_future = None
+        return self._inference_data
+
+    @inference_data.setter
+    def inference_data(self, inference_data: dict[str, Any]):
+        self._inference_data = inference_data
+        self._inference_data_future = None
+
+    def _track_holds(self):
+        # releases of the cache entries read lazily, called by `close` or when the experiment is garbage collected
+        self._holds: list[Callable[[], None]] = []
+        self._release_holds = weakref.finalize(self, _release_all, self._holds)
+
+    def close(self):
+        """Close the files of lazily loaded data and release their cache entries.
+
+        Until then, another process can neither update nor evict the entries, e.g. an `Experiment` of the same
+        experiment loaded without `lazy` waits for them. Also done when the experiment is garbage collected.
+        """
+        try:
+            if self.lazy:
+                # waits for a prefetch, its entries are released too
+                for inference_data in self.inference_data.values():
+                    inference_data.close()
+        finally:
+            self._release_holds()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object):
+        self.close()
+
+    @classmethod
+    def _from_inference_data(
+        cls, experiment_id: str, inference_data: dict[str, Any], group_indexed: bool = False
+    ) -> "Experiment":
+        xp = cls.__new__(cls)
+        xp.experiment_id = experiment_id
+        xp.server_endpoint = ""
+        xp.auth_token = ""
+        xp.share_password = ""
+        xp.group_indexed = group_indexed
+        xp.lazy = False
+        xp._tailer = None
+        xp._iterations = {}
+        xp._skip_draws = {}
+        xp._draw_arrays = OrderedDict()
+        xp._summaries = {}
+        xp.inference_data = inference_data
+        xp._track_holds()
+        return xp
+
+    @classmethod
+    def from_stan_csv(
+        cls, paths: list[str | Path], group_indexed: bool = False, max_workers: int | None = None
+    ) -> "Experiment":
+        """Build an experiment from CmdStan output files, one file per chain."""
+        import arviz as az
+
+        from .convert_wide_csv_to_idata import load_stan_csv
+
+        set_arviz_params(az)
+        paths = [Path(path) for path in paths]
+        inference_data = load_stan_csv(paths, group_indexed, max_workers)
+        return cls._from_inference_data(paths[0].stem.rsplit("_", 1)[0], inference_data, group_indexed)
+
+    @classmethod
+    def from_turing_csv(cls, path: str | Path, group_indexed: bool = False) -> "Experiment":
+        """Build an experiment from a wide CSV exported from Turing/MCMCChains."""
+        import arviz as az
+
+        from .convert_wide_csv_to_idata import load_turing_csv
+
+        set_arviz_params(az)
+        inference_data = load_turing_csv(Path(path), group_indexed)
+        return cls._from_inference_data(Path(path).stem, inference_data, group_indexed)
 
     @lru_cache(maxsize=1)
     def all_chains(self) -> list[str]:
@@ -76,49 +268,512 @@ class Experiment:
         idata = next(iter(self.inference_data.values()))
         return list(idata.posterior.data_vars.keys())
 
+    def draws(
+        self,
+        var: str,
+        chains: str | list[str] | None = None,
+        start: int | None = None,
+        stop: int | None = None,
+        thin: int = 1,
+    ) -> np.ndarray:
+        """Draws of a posterior var as a `(chain, draw, *shape)` array.
+
+        The array is a view of one contiguous copy of the var built on first use, slicing draws costs nothing.
+        The copies are kept within `COINFER_DRAW_CACHE_BYTES` (default 1 GiB, 0 keeps none). Chains of different
+        lengths are cut to the shortest of the selected ones. `chains` that are not adjacent in `all_chains()`
+        need a fancy index and so return a copy.
+        """
+        values, lengths = self._draw_array(var)
+        chain_index = self._chain_index(chains)
+        if isinstance(chain_index, slice):
+            num_draws = min(lengths[chain_index], default=0)
+        else:
+            num_draws = min((lengths[i] for i in chain_index), default=0)
+        draw_index = slice(*slice(start, stop, thin).indices(num_draws))
+        if isinstance(chain_index, slice):
+            return values[chain_index, draw_index]
+        return values[chain_index][:, draw_index]
+
+    def iter_draws(self, var: str, batch: int = 1000, chains: str | list[str] | None = None, thin: int = 1):
+        """Yield `(chain, draw, *shape)` arrays of at most `batch` consecutive draws each, like `draws()`.
+
+        Every batch is sliced from the data of each chain, lazily loaded data is read one batch at a time and
+        the whole var is never copied. A var already kept by `draws()` is served as views of its copy.
+        """
+        if batch <= 0:
+            raise ValueError(f"batch must be positive: {batch}")
+        if var in self._draw_arrays:
+            num_draws = self.draws(var, chains).shape[1]
+            for start in range(0, num_draws, batch * thin):
+                yield self.draws(var, chains, start, min(start + batch * thin, num_draws), thin)
+            return
+        all_chains = self.all_chains()
+        chain_index = self._chain_index(chains)
+        selected = all_chains[chain_index] if isinstance(chain_index, slice) else [all_chains[i] for i in chain_index]
+        data_arrays = [self._chain_data_array(chain, var) for chain in selected]
+        num_draws = min((data_array.sizes["draw"] for data_array in data_arrays), default=0)
+        for start in range(0, num_draws, batch * thin):
+            draw_index = slice(start, min(start + batch * thin, num_draws), thin)
+            yield np.stack([data_array.isel(draw=draw_index).values[0] for data_array in data_arrays])
+
+    def _chain_data_array(self, chain: str, var: str) -> "xr.DataArray":
+        posterior = self.inference_data[chain].posterior
+        if var not in posterior:
+            raise KeyError(f"{var} not in the posterior of chain {chain}")
+        return posterior[var].transpose("chain", "draw", ...)
+
+    def _draw_array(self, var: str) -> tuple[np.ndarray, list[int]]:
+        if var in self._draw_arrays:
+            self._draw_arrays.move_to_end(var)
+            return self._draw_arrays[var]
+        chain_values = [self._chain_data_array(chain, var).values[0] for chain in self.inference_data]
+        lengths = [len(values) for values in chain_values]
+        shape = chain_values[0].shape[1:]
+        if any(values.shape[1:] != shape for values in chain_values):
+            raise ValueError(f"{var} has different shapes across chains")
+        dtype = np.result_type(*chain_values)
+        array = np.empty((len(chain_values), max(lengths, default=0), *shape), dtype=dtype)
+        for i, values in enumerate(chain_values):
+            array[i, : len(values)] = values
+        # shared views must not let an analyzer change the data of another one
+        array.flags.writeable = False
+        budget = int(os.environ.get("COINFER_DRAW_CACHE_BYTES", _DEFAULT_DRAW_CACHE_BYTES))
+        if array.nbytes <= budget:
+            self._draw_arrays[var] = array, lengths
+            total = sum(cached.nbytes for cached, _ in self._draw_arrays.values())
+            while total > budget:
+                _, (evicted, _) = self._draw_arrays.popitem(last=False)
+                total -= evicted.nbytes
+        return array, lengths
+
+    def _chain_index(self, chains: str | list[str] | None) -> slice | list[int]:
+        all_chains = self.all_chains()
+        if chains is None:
+            return slice(None)
+        if isinstance(chains, str):
+            chains = [chains]
+        index = [all_chains.index(chain) for chain in chains]
+        if index and index == list(range(index[0], index[0] + len(index))):
+            return slice(index[0], index[0] + len(index))
+        return index
+
+    def summary(
+        self,
+        var_names: list[str] | None = None,
+        hdi_prob: float = 0.94,
+        quantiles: list[float] | None = None,
+        cache: bool = True,
+    ) -> "pd.DataFrame":
+        """The columns of `arviz.summary` (unrounded) for the posterior vars, plus optional `q_<p>%` quantiles.
+
+        All params are stacked into one `(chain, draw, param)` array and summarized in a single batched pass.
+        With `cache`, the table is kept for the next call and, for experiments in the download cache, written
+        next to their data so other analyzers of the same draws reuse it.
+        """
+        import pandas as pd
+
+        from .posterior_summary import summarize
+
+        var_names = var_names or self.all_vars()
+        key = (tuple(var_names), hdi_prob, tuple(quantiles or ()))
+        if cache and key in self._summaries:
+            return self._summaries[key].copy()
+        cache_file = self._summary_cache_file(key) if cache else None
+        if cache_file and cache_file.is_file():
+            table = pd.read_csv(cache_file, index_col=0, float_precision="round_trip")
+        else:
+            columns: list[np.ndarray] = []
+            labels: list[str] = []
+            for var in var_names:
+                values = self.draws(var)
+                columns.append(values.reshape(*values.shape[:2], -1))
+                labels.extend(self._param_labels(var))
+            table = pd.DataFrame(summarize(np.concatenate(columns, axis=2), hdi_prob, key[2]), index=labels)
+            if cache_file:
+                tmp_file = cache_file.with_suffix(".tmp")
+                table.to_csv(tmp_file)
+                os.replace(tmp_file, cache_file)
+        if cache:
+            self._summaries[key] = table
+        return table.copy()
+
+    def _param_labels(self, var: str) -> list[str]:
+        data_array = next(iter(self.inference_data.values())).posterior[var]
+        dims = [dim for dim in data_array.dims if dim not in ("chain", "draw")]
+        if not dims:
+            return [var]
+        coords = np.stack(np.meshgrid(*[data_array[dim].values for dim in dims], indexing="ij"), axis=-1)
+        return [f"{var}[{', '.join(str(c) for c in coord)}]" for coord in coords.reshape(-1, len(dims)).tolist()]
+
+    def _summary_cache_file(self, key: tuple[Any, ...]) -> Path | None:
+        cache = ExperimentCache()
+        if not _is_sync() or cache.get(self.experiment_id) is None:
+            return None
+        # draws are only ever appended, the draw counts identify the data the summary was computed on
+        num_draws = {chain: idata.posterior.sizes["draw"] for chain, idata in self.inference_data.items()}
+        digest = hashlib.sha1(json.dumps([*key, num_draws]).encode()).hexdigest()[:16]
+        return cache.entry_dir(self.experiment_id) / f"summary-{digest}.csv"
+
+    def refresh(self) -> dict[str, int]:
+        """Append the draws produced since the experiment was loaded or last refreshed.
+
+        Only new draws are transferred and parsed. Returns the number of new draws of every chain.
+        """
+        from .convert_csv_to_idata import append_draws
+
+        if _is_sync():
+            new_inference_data = self._fetch_new_draws()
+        else:
+            new_inference_data = self._read_new_local_draws()
+
+        new_draws: dict[str, int] = {}
+        for chain, new_idata in new_inference_data.items():
+            new_draws[chain] = new_idata.posterior.sizes["draw"]
+            if not new_draws[chain]:
+                continue
+            if chain in self.inference_data:
+                append_draws(self.inference_data[chain], new_idata)
+            else:
+                self.inference_data[chain] = new_idata
+        Experiment.all_chains.cache_clear()
+        Experiment.all_vars.cache_clear()
+        self._draw_arrays.clear()
+        self._summaries.clear()
+        logger.info("refreshed experiment %s: %s", self.experiment_id, new_draws)
+        return new_draws
+
+    def _fetch_new_draws(self):
+        if not self._iterations:
+            # the draws of a chain are its consecutive sampler iterations, the `draw` coords are only positions
+            self._iterations = {
+                chain: (_FIRST_ITERATION, _FIRST_ITERATION + idata.posterior.sizes["draw"] - 1)
+                for chain, idata in self.inference_data.items()
+            }
+        download_url = f"{self.server_endpoint}/sys/get-arviz-data"
+        params = {"experiment_id": self.experiment_id, "iteration": json.dumps(self._iterations)}
+        rsp = requests.get(
+            download_url, headers=_download_headers(self.auth_token, self.share_password), params=params, stream=True
+        )
+        if requests.errmsg:
+            raise RuntimeError(f"get inference data failed: {requests.errmsg}")
+        assert rsp
+        with rsp, tempfile.TemporaryDirectory() as temp_dir:
+            new_inference_data = _stream_inference_data(rsp, Path(temp_dir), self.group_indexed)
+        for chain, new_idata in new_inference_data.items():
+            known_draws = 0
+            next_draw = 0
+            if chain in self.inference_data:
+                known_draws = self.inference_data[chain].posterior.sizes["draw"]
+                next_draw = int(self.inference_data[chain].posterior["draw"][-1]) + 1 if known_draws else 0
+            # servers not supporting `iteration` send every draw again
+            skip = known_draws if _resends_draws(self.inference_data.get(chain), new_idata) else 0
+            num_draws = new_idata.posterior.sizes["draw"] - skip
+            for group in new_idata.groups():
+                dataset = new_idata[group]
+                if "draw" in dataset.dims:
+                    dataset = dataset.isel(draw=slice(skip, None))
+                    setattr(new_idata, group, dataset.assign_coords(draw=np.arange(next_draw, next_draw + num_draws)))
+            first, last = self._iterations.get(chain, (_FIRST_ITERATION, _FIRST_ITERATION - 1))
+            self._iterations[chain] = (first, last + num_draws)
+        return new_inference_data
+
+    def _read_new_local_draws(self):
+        from .convert_csv_to_idata import McmcDataTailer, _chain_to_idata
+
+        if self._tailer is None:
+            # the first poll reads the files from the start, skip what the initial load already has
+            self._tailer = McmcDataTailer(Path(os.environ["COINFER_MCMC_DATA_PATH"]))
+            self._skip_draws = {chain: idata.posterior.sizes["draw"] for chain, idata in self.inference_data.items()}
+        new_inference_data = {}
+        for chain, (iterations, data_dict) in self._tailer.poll().items():
+            skip = min(self._skip_draws.get(chain, 0), len(iterations))
+            self._skip_draws[chain] = self._skip_draws.get(chain, 0) - skip
+            if skip == len(iterations):
+                continue
+            data_dict = {var_name: values[skip:] for var_name, values in data_dict.items()}
+            new_idata = _chain_to_idata(chain, data_dict, len(iterations) - skip, self.group_indexed)
+            if chain in self.inference_data:
+                known_draws = self.inference_data[chain].posterior.sizes["draw"]
+                new_idata.posterior = new_idata.posterior.assign_coords(draw=new_idata.posterior["draw"] + known_draws)
+            new_inference_data[chain] = new_idata
+        return new_inference_data
+
     @classmethod
-    def _download_inference_data(cls, server_endpoint: str, auth_token: str, experiment_id: str, share_password: str):
+    def _download_inference_data(
+        cls,
+        server_endpoint: str,
+        auth_token: str,
+        experiment_id: str,
+        share_password: str,
+        group_indexed: bool = False,
+        lazy: bool = False,
+        holds: list[Callable[[], None]] | None = None,
+    ):
+        """The data of every chain. With `lazy`, the releases of the cache entries read lazily go to `holds`."""
         import arviz as az
 
         set_arviz_params(az)
+        holds = [] if holds is None else holds
 
         if _is_sync():
-            download_url = f"{server_endpoint}/sys/get-arviz-data?experiment_id={experiment_id}"
-            if share_password:
-                headers = {"X-Share-Password": share_password}
-            elif auth_token:
-                headers = {"Authorization": f"Bearer {auth_token}"}
-            else:
-                headers = {}  # public share
-            rsp = requests.get(download_url, headers=headers)
-            if requests.errmsg:
-                raise RuntimeError(f"get inference data failed: {requests.errmsg}")
-            assert rsp
-            with tempfile.TemporaryDirectory() as temp_dir:
-                with open(os.path.join(temp_dir, "data.tar"), "wb") as f:
-                    f.write(rsp.content)
-                with tarfile.open(os.path.join(temp_dir, "data.tar")) as tar:
-                    tar.extractall(temp_dir)
-
-                inference_data_by_chain: dict[str, az.InferenceData] = {}
-                for item in os.listdir(temp_dir):
-                    if item.endswith(".nc"):
-                        inference_data = az.from_netcdf(os.path.join(temp_dir, item))
-                        name_mapping = {name: unquote(name) for name in inference_data.posterior.data_vars.keys()}
-                        inference_data.rename(name_mapping, inplace=True)
-                        inference_data_by_chain[item[:-3]] = inference_data
-                if not inference_data_by_chain:
-                    raise RuntimeError("no inference data found")
-                return inference_data_by_chain
+            cache = ExperimentCache()
+            if _is_shared_posterior() and cache.enabled:
+                if lazy:
+                    holds.append(cache.hold(experiment_id))
+                with cache.lock(experiment_id, shared=True):
+                    entry = cache.get(experiment_id)
+                    if entry is not None:
+                        # fetched by the analyze command for all its analyzers, used as is so they see the same draws
+                        _revalidate(server_endpoint, auth_token, experiment_id, share_password, entry)
+                        logger.info("use the shared data of experiment %s", experiment_id)
+                        return cls._load_cached_inference_data(cache, experiment_id, group_indexed, lazy)
+            if lazy and not cache.enabled:
+                # lazily opened files must outlive the download, keep them in a private cache removed at exit
+                private_dir = Path(tempfile.mkdtemp(prefix="coinfer-experiment-"))
+                atexit.register(shutil.rmtree, private_dir, True)
+                cache = ExperimentCache(private_dir, DEFAULT_MAX_BYTES)
+            if lazy:
+                # the files are read after returning, they must not be evicted or replaced meanwhile
+                holds.append(cache.hold(experiment_id))
+            with cache.lock(experiment_id):
+                return cls._download_inference_data_with_cache(
+                    cache, server_endpoint, auth_token, experiment_id, share_password, group_indexed, lazy
+                )
         else:
-            from .convert_csv_to_idata import convert_csv_to_idata
-
             mcmcdata_dir = Path(os.environ["COINFER_MCMC_DATA_PATH"])
-            inference_data_by_chain = convert_csv_to_idata(mcmcdata_dir)
-            return inference_data_by_chain
+            cache = ExperimentCache()
+            if _is_shared_posterior() and cache.enabled:
+                return cls._convert_local_data_with_cache(cache, mcmcdata_dir, group_indexed, lazy, holds)
+            return _convert_local_data(mcmcdata_dir, group_indexed)
+
+    @classmethod
+    def _download_inference_data_with_cache(
+        cls,
+        cache: ExperimentCache,
+        server_endpoint: str,
+        auth_token: str,
+        experiment_id: str,
+        share_password: str,
+        group_indexed: bool,
+        lazy: bool,
+    ):
+        inference_data_by_chain = _update_cache(
+            cache, server_endpoint, auth_token, experiment_id, share_password, group_indexed, decode=not lazy
+        )
+        if inference_data_by_chain is None:
+            return cls._load_cached_inference_data(cache, experiment_id, group_indexed, lazy)
+        return inference_data_by_chain
+
+    @classmethod
+    def _convert_local_data_with_cache(
+        cls,
+        cache: ExperimentCache,
+        mcmcdata_dir: Path,
+        group_indexed: bool,
+        lazy: bool,
+        holds: list[Callable[[], None]],
+    ):
+        """Convert the local MCMC data once into netCDF files in `cache`, for all the analyzers reading them.
+
+        The entry is keyed by the data directory and validated by the size and mtime of its files, the first
+        analyzer converts the data while the others wait for the cache lock, then every one opens the same files.
+        """
+        key = "local-" + hashlib.blake2b(mcmcdata_dir.resolve().as_posix().encode(), digest_size=8).hexdigest()
+        if lazy:
+            holds.append(cache.hold(key))
+        files = sorted(path for path in mcmcdata_dir.rglob("*") if path.is_file() and path.name != RESOURCES_FILE)
+        source = [
+            (path.relative_to(mcmcdata_dir).as_posix(), path.stat().st_size, path.stat().st_mtime_ns) for path in files
+        ]
+        fingerprint = hashlib.blake2b(json.dumps(source).encode(), digest_size=16).hexdigest()
+        with cache.lock(key):
+            entry = cache.get(key)
+            if entry and entry.get("etag") == fingerprint:
+                logger.info("use the converted data of %s", mcmcdata_dir)
+                cache.touch(key)
+            else:
+                with cache.staging(key) as staging_dir:
+                    # stored like the files of `get-arviz-data`, which `_load_netcdf` groups when loading
+                    for chain, inference_data in _convert_local_data(mcmcdata_dir, group_indexed=False).items():
+                        names = {name: quote(name, safe="") for name in inference_data.posterior.data_vars}
+                        inference_data.rename(names, inplace=True)
+                        inference_data.to_netcdf((staging_dir / f"{chain}.nc").as_posix())
+                    cache.commit(key, staging_dir, {"etag": fingerprint})
+            return cls._load_cached_inference_data(cache, key, group_indexed, lazy)
+
+    @staticmethod
+    def _load_cached_inference_data(cache: ExperimentCache, experiment_id: str, group_indexed: bool, lazy: bool):
+        nc_files = cache.nc_files(experiment_id)
+        with _decode_executor(lazy) as executor:
+            nc_paths = [nc_file.as_posix() for nc_file in nc_files]
+            loaded = executor.map(_load_netcdf, nc_paths, repeat(group_indexed), repeat(lazy))
+            inference_data_by_chain = dict(zip((nc_file.stem for nc_file in nc_files), loaded))
+        if not inference_data_by_chain:
+            raise RuntimeError("no inference data found")
+        return inference_data_by_chain
+
+
+def _resends_draws(idata: Any, new_idata: Any) -> bool:
+    """Whether `new_idata` starts with the draws `idata` already has, i.e. the server sent the whole chain again."""
+    if idata is None:
+        return False
+    known_draws = idata.posterior.sizes["draw"]
+    if not known_draws or new_idata.posterior.sizes["draw"] < known_draws:
+        return False
+    var = next(iter(idata.posterior.data_vars), None)
+    if var is None or var not in new_idata.posterior:
+        return False
+    known = idata.posterior[var].values
+    resent = new_idata.posterior[var].isel(draw=slice(0, known_draws)).values
+    return known.shape == resent.shape and np.array_equal(known, resent, equal_nan=known.dtype.kind == "f")
+
+
+def _convert_local_data(mcmcdata_dir: Path, group_indexed: bool) -> dict[str, Any]:
+    from .convert_csv_to_idata import convert_csv_to_idata, convert_draw_store_to_idata, has_draw_store
+
+    if has_draw_store(mcmcdata_dir):
+        return convert_draw_store_to_idata(mcmcdata_dir, group_indexed)
+    return convert_csv_to_idata(mcmcdata_dir, group_indexed)
+
+
+def _update_cache(
+    cache: ExperimentCache,
+    server_endpoint: str,
+    auth_token: str,
+    experiment_id: str,
+    share_password: str,
+    group_indexed: bool,
+    decode: bool,
+) -> dict[str, Any] | None:
+    """Download the data of the experiment into `cache`, unless the cached copy is current. Called with the lock held.
+
+    Even the cached data of a finished experiment is revalidated, the server decides whether the credentials of the
+    caller give access to it: by a conditional request, or when the server sent no `ETag`/`Last-Modified` for it, by
+    asking for the status of the experiment, the cached data of a finished one being kept. Returns the decoded data
+    when it was downloaded with `decode`, otherwise None: the data is read from the cache.
+    """
+    entry = cache.get(experiment_id)
+    status = ""
+    if not ExperimentCache.conditional_headers(entry):
+        # asked before the download, a status taken after it could be newer than the data
+        status = _experiment_status(server_endpoint, auth_token, experiment_id, share_password)
+        if entry and status in FINISHED_STATUSES and entry.get("status") in FINISHED_STATUSES:
+            logger.info("experiment %s finished, use cached data", experiment_id)
+            cache.touch(experiment_id)
+            return None
+    rsp = _conditional_get(server_endpoint, auth_token, experiment_id, share_password, entry)
+    if rsp.status_code == 304 and entry:
+        logger.info("experiment %s not modified, use cached data", experiment_id)
+        rsp.close()
+        cache.touch(experiment_id)
+        return None
+    if rsp.status_code != 200:
+        raise RuntimeError(f"get inference data failed: {rsp.status_code}")
+
+    with rsp, cache.staging(experiment_id) as staging_dir:
+        # without decoding, the files are opened from the cache entry after commit, the staging path goes away
+        inference_data_by_chain = _stream_inference_data(rsp, staging_dir, group_indexed, decode=decode)
+        if not any(staging_dir.glob("*.nc")):
+            raise RuntimeError("no inference data found")
+        cache.commit(
+            experiment_id,
+            staging_dir,
+            {
+                "etag": rsp.headers.get("ETag", ""),
+                "last_modified": rsp.headers.get("Last-Modified", ""),
+                "status": status,
+            },
+        )
+    return inference_data_by_chain if decode else None
+
+
+def _conditional_get(
+    server_endpoint: str, auth_token: str, experiment_id: str, share_password: str, entry: CacheEntry | None
+) -> Any:
+    download_url = f"{server_endpoint}/sys/get-arviz-data?experiment_id={experiment_id}"
+    headers = _download_headers(auth_token, share_password)
+    headers.update(ExperimentCache.conditional_headers(entry))
+    rsp = requests.get(download_url, headers=headers, stream=True, valid_status_code=range(200, 305))
+    if requests.errmsg:
+        raise RuntimeError(f"get inference data failed: {requests.errmsg}")
+    assert rsp
+    return rsp
+
+
+def _revalidate(server_endpoint: str, auth_token: str, experiment_id: str, share_password: str, entry: CacheEntry):
+    """Make sure the server still gives the caller access to the cached data, without downloading it again."""
+    rsp = _conditional_get(server_endpoint, auth_token, experiment_id, share_password, entry)
+    # the body of a modified experiment is not read: the cached copy is kept so all analyzers see the same draws
+    rsp.close()
+
+
+def prefetch_experiment(server_endpoint: str, auth_token: str, experiment_id: str, share_password: str = "") -> bool:
+    """Download the data of an experiment into the experiment cache without decoding it.
+
+    Analyzers started with `COINFER_SHARED_POSTERIOR=TRUE` then open the cached files instead of downloading them
+    again. Returns False when the cache is disabled.
+    """
+    cache = ExperimentCache()
+    if not cache.enabled:
+        return False
+    with cache.lock(experiment_id):
+        _update_cache(cache, server_endpoint, auth_token, experiment_id, share_password, True, decode=False)
+    return True
+
+
+def _download_headers(auth_token: str, share_password: str) -> dict[str, str]:
+    if share_password:
+        return {"X-Share-Password": share_password}
+    elif auth_token:
+        return {"Authorization": f"Bearer {auth_token}"}
+    else:
+        return {}  # public share
 
 
-def current_experiment():
+def _stream_inference_data(rsp: Any, target_dir: Path, group_indexed: bool, decode: bool = True) -> dict[str, Any]:
+    """Extract the `<chain>.nc` files of a `get-arviz-data` tarball response into `target_dir`.
+
+    The response is read in stream mode and every file is decoded in a pool as soon as it is extracted,
+    while the rest of the tarball is still downloading. Without `decode` the files are only extracted.
+    """
+    # honor Content-Encoding when reading the raw stream
+    rsp.raw.decode_content = True
+    decoding: dict[str, Future[Any]] = {}
+    with _decode_executor(lazy=False) as executor:
+        with tarfile.open(fileobj=rsp.raw, mode="r|*") as tar:
+            for member in tar:
+                name = os.path.basename(member.name)
+                if not member.isfile() or not name.endswith(".nc"):
+                    continue
+                nc_path = target_dir / name
+                fmember = tar.extractfile(member)
+                assert fmember
+                with open(nc_path, "wb") as fout:
+                    shutil.copyfileobj(fmember, fout, _DOWNLOAD_CHUNK_SIZE)
+                if decode:
+                    decoding[name[:-3]] = executor.submit(_load_netcdf, nc_path.as_posix(), group_indexed)
+        return {chain: future.result() for chain, future in decoding.items()}
+
+
+def _experiment_status(server_endpoint: str, auth_token: str, experiment_id: str, share_password: str) -> str:
+    """Status of the experiment, used to decide whether its cached data may still change, `""` when unknown.
+
+    Also checks the access of the caller: a denied request gives `""`, and the data is then downloaded, or not.
+    """
+    try:
+        exp_data = Client(server_endpoint, auth_token).get_experiment(experiment_id, share_password)
+    except Exception:
+        logger.warning("get experiment status failed: %s", experiment_id, exc_info=True)
+        return ""
+    return experiment_status(exp_data)
+
+
+def current_experiment(lazy: bool = False, prefetch: bool = False):
+    """The experiment of the running analyzer.
+
+    With `prefetch` the download starts in the background and `inference_data` waits for it. Analyzers run by the
+    analyze command always prefetch, like `current_workflow()`.
+    """
     with open(sys.argv[1]) as fin:
         input_data = json.load(fin)
 
@@ -127,19 +782,122 @@ def current_experiment():
         get_token(),
         input_data["experiment_id"],
         input_data.get("coinfer_share_password", ""),
+        lazy=lazy,
+        prefetch=prefetch or bool(os.environ.get("COINFER_ANALYZE_OUTPUT_DIR")),
     )
     return xp
 
 
-def save_result(data: bytes, filename: str = "output.html"):
+class ExperimentComparison:
+    """Experiments loaded by `load_experiments`, their posteriors aligned on the vars they have in common."""
+
+    def __init__(self, experiments: dict[str, Experiment]):
+        self.experiments = experiments
+
+    @cached_property
+    def common_vars(self) -> list[str]:
+        """Posterior vars present with the same shape in every experiment, in the order of the first one."""
+        shapes = [
+            {var: data_array.shape[2:] for var, data_array in next(iter(xp.inference_data.values())).posterior.items()}
+            for xp in self.experiments.values()
+        ]
+        return [var for var, shape in shapes[0].items() if all(other.get(var) == shape for other in shapes[1:])]
+
+    def draws(self, var: str) -> np.ndarray:
+        """Draws of `var` as an `(experiment, chain, draw, *shape)` array, cut to the fewest chains and draws."""
+        arrays = [xp.draws(var) for xp in self.experiments.values()]
+        num_chains = min(array.shape[0] for array in arrays)
+        num_draws = min(array.shape[1] for array in arrays)
+        return np.stack([array[:num_chains, :num_draws] for array in arrays])
+
+    def summary(
+        self, var_names: list[str] | None = None, hdi_prob: float = 0.94, quantiles: list[float] | None = None
+    ) -> "pd.DataFrame":
+        """`Experiment.summary()` of every experiment in one batched pass, indexed by `(experiment, param)`."""
+        import pandas as pd
+
+        from .posterior_summary import summarize
+
+        first_xp = next(iter(self.experiments.values()))
+        columns: list[np.ndarray] = []
+        labels: list[str] = []
+        for var in var_names or self.common_vars:
+            values = self.draws(var)
+            columns.append(values.reshape(*values.shape[:3], -1))
+            labels.extend(first_xp._param_labels(var))
+        stacked = np.concatenate(columns, axis=3)
+        num_experiments, num_chains, num_draws, num_params = stacked.shape
+        # experiments side by side on the param axis, every param of every experiment is summarized at once
+        stacked = np.moveaxis(stacked, 0, 2).reshape(num_chains, num_draws, num_experiments * num_params)
+        index = pd.MultiIndex.from_product([list(self.experiments), labels], names=["experiment", "param"])
+        return pd.DataFrame(summarize(stacked, hdi_prob, tuple(quantiles or ())), index=index)
+
+
+def load_experiments(
+    experiment_ids: list[str], max_workers: int | None = None, lazy: bool = False
+) -> ExperimentComparison:
+    """Download and decode experiments of the current analyzer's server concurrently.
+
+    The downloads share the connection pool of `requests`, so comparing many experiments is bound by
+    bandwidth rather than by the latency of one download after the other.
+    """
+    with open(sys.argv[1]) as fin:
+        input_data = json.load(fin)
+    experiment_ids = list(dict.fromkeys(experiment_ids))
+    if not experiment_ids:
+        raise ValueError("no experiment to load")
+    max_workers = max_workers or min(len(experiment_ids), 8)
+    requests.set_pool_size(max_workers)
+
+    def _load(experiment_id: str) -> Experiment:
+        return Experiment(
+            input_data["coinfer_server_endpoint"],
+            get_token(),
+            experiment_id,
+            input_data.get("coinfer_share_password", ""),
+            lazy=lazy,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {experiment_id: executor.submit(_load, experiment_id) for experiment_id in experiment_ids}
+        experiments: dict[str, Experiment] = {}
+        for experiment_id, future in futures.items():
+            try:
+                experiments[experiment_id] = future.result()
+            except Exception as e:
+                raise RuntimeError(f"load experiment {experiment_id} failed: {e}") from e
+    return ExperimentComparison(experiments)
+
+
+def save_result(data: bytes | str | os.PathLike | Iterable[bytes | str], filename: str = "output.html"):
+    """Save the analyzer result as `filename` in `COINFER_ANALYZE_OUTPUT_DIR`.
+
+    `data` is the content (`str` is encoded as UTF-8), the path of an already written file, which is moved there,
+    or an iterable of content chunks (e.g. `iter_plots_html(...)`) written one at a time. The file is written under a
+    temporary name and renamed, so it never appears half written.
+    """
     workflow_dir = os.environ["WORKFLOW_DIR"]
     analyze_output_dir = os.environ["COINFER_ANALYZE_OUTPUT_DIR"]
     full_output_file_path = Path(analyze_output_dir, filename)
-    with open(full_output_file_path, "wb") as fresult:
-        fresult.write(data)
-    tmp_dir = Path(workflow_dir, "tmp")
-    os.makedirs(tmp_dir, exist_ok=True)
-    with open(Path(tmp_dir, "analyze_result_path"), "w") as f:
+    if isinstance(data, os.PathLike):
+        if Path(data).resolve() != full_output_file_path.resolve():
+            shutil.move(data, full_output_file_path)
+    else:
+        if isinstance(data, (bytes, bytearray, memoryview, str)):
+            data = [data]
+        tmp_path = Path(analyze_output_dir, f".{filename}.tmp")
+        try:
+            with open(tmp_path, "wb") as fresult:
+                fresult.writelines(chunk.encode() if isinstance(chunk, str) else chunk for chunk in data)
+            os.replace(tmp_path, full_output_file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    # where the analyze command looks for the result, one file per analyzer when it runs several
+    result_path_file = Path(
+        os.environ.get("COINFER_ANALYZE_RESULT_PATH_FILE") or Path(workflow_dir, "tmp", "analyze_result_path")
+    )
+    os.makedirs(result_path_file.parent, exist_ok=True)
+    with open(result_path_file, "w") as f:
         f.write(full_output_file_path.as_posix())
 
     logger.info("Saved result to %s", full_output_file_path.as_posix())
@@ -160,62 +918,336 @@ def _ensure_center_last(data: Any):
     return data
 
 
-def render_plots_to_html(plot) -> str:
-    plot_json = _convert_plots_to_json(plot)
+_binary_embed_script = """
+async function coinferEmbedBinary(plotId) {
+    var item = JSON.parse(document.getElementById(plotId + "_data").textContent);
+    var buffersElem = document.getElementById(plotId + "_buffers");
+    var text = atob(buffersElem.textContent);
+    var bytes = new Uint8Array(text.length);
+    for (var i = 0; i < text.length; i++) {
+        bytes[i] = text.charCodeAt(i);
+    }
+    if (buffersElem.dataset.encoding === "gzip") {
+        var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+        bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+    }
+    coinferAttachBuffers(item, bytes);
+    Bokeh.embed.embed_item(item, plotId);
+}
+function coinferUnshuffle(bytes, itemsize) {
+    var count = bytes.length / itemsize;
+    var out = new Uint8Array(bytes.length);
+    for (var b = 0; b < itemsize; b++) {
+        var base = b * count;
+        for (var i = 0; i < count; i++) {
+            out[i * itemsize + b] = bytes[base + i];
+        }
+    }
+    return out;
+}
+function coinferAttachBuffers(node, bytes) {
+    if (Array.isArray(node)) {
+        node.forEach(function (child) { coinferAttachBuffers(child, bytes); });
+    } else if (node !== null && typeof node === "object") {
+        if (node.type === "bytes" && Array.isArray(node.data)) {
+            // a copy, bokeh uses the whole underlying ArrayBuffer of a typed array
+            var data = bytes.slice(node.data[0], node.data[0] + node.data[1]);
+            node.data = node.data[2] > 1 ? coinferUnshuffle(data, node.data[2]) : data;
+            return;
+        }
+        for (var key in node) {
+            coinferAttachBuffers(node[key], bytes);
+        }
+    }
+}
+"""
+
+_lazy_embed_script = """
+var coinferGroups = {};
+function coinferLoadGroup(src) {
+    if (!(src in coinferGroups)) {
+        coinferGroups[src] = fetch(src).then(async function (response) {
+            if (!response.ok) {
+                throw new Error("failed to load " + src + ": " + response.status);
+            }
+            var bytes = new Uint8Array(await response.arrayBuffer());
+            // servers sending the file with `Content-Encoding: gzip` have it decompressed by the browser already
+            if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+                var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+                bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+            }
+            return JSON.parse(new TextDecoder().decode(bytes));
+        });
+    }
+    return coinferGroups[src];
+}
+var coinferObserver = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+        if (!entry.isIntersecting) {
+            return;
+        }
+        var node = entry.target;
+        coinferObserver.unobserve(node);
+        coinferLoadGroup(node.dataset.src).then(function (items) {
+            node.style.minHeight = "";
+            Bokeh.embed.embed_item(items[node.id], node.id);
+        });
+    });
+}, {rootMargin: "400px"});
+document.querySelectorAll("div[data-src]").forEach(function (node) { coinferObserver.observe(node); });
+"""
+
+
+def _group_plots(plots) -> list[tuple[str, list[tuple[Any, ...]]]]:
     group_by = defaultdict(list)
-    for plot_func, chain, var_name, plot_json in plot_json:
-        group_by[plot_func].append((chain, var_name, plot_json))
-
-    divs: list[str] = []
-    scripts: list[str] = []
-    for plot_func in group_by:
-        divs.append(f'<div id="{html_escape(plot_func)}">')
-        divs.append(f"<h3>{html_escape(plot_func, quote=False)}</h3>")
-        for chain, var_name, plot_json in group_by[plot_func]:
-            if not chain or not var_name:
-                divs.append("<h4>all vars</h4>")
-            else:
-                divs.append(
-                    f"<h4>chain={html_escape(chain, quote=False)} var_name={html_escape(var_name, quote=False)}</h4>"
-                )
-            divs.append(f'<div id="{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}"></div>')
-
-            # Embed the JSON data safely in a <script type="application/json"> tag
-            divs.append(
-                f'<script type="application/json" id="{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}_data">{html_escape(json.dumps(plot_json), quote=False)}</script>'
-            )
-            # In the JS, retrieve and parse the JSON before passing to Bokeh
-            scripts.append(
-                f'''
-var dataElem = document.getElementById("{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}_data");
+    for plot in plots:
+        group_by[plot[0]].append(plot)
+    return list(group_by.items())
+
+
+def _plot_heading(chain: str, var_name: str) -> str:
+    if not chain or not var_name:
+        return "<h4>all vars</h4>"
+    return f"<h4>chain={html_escape(chain, quote=False)} var_name={html_escape(var_name, quote=False)}</h4>"
+
+
+def _plot_html(plot_func: str, chain: str, var_name: str, plot_json: Any, binary: bool, compress: bool) -> str:
+    from .plot_encoding import encode_blob, pack_buffers, script_json
+
+    plot_id = f"{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}"
+    divs = [_plot_heading(chain, var_name), f'<div id="{plot_id}"></div>']
+
+    if binary:
+        plot_json, blob = pack_buffers(plot_json, shuffle=compress)
+        blob_text, encoding = encode_blob(blob, compress)
+        divs.append(f'<script type="application/json" id="{plot_id}_data">{script_json(plot_json)}</script>')
+        divs.append(
+            f'<script type="application/octet-stream" id="{plot_id}_buffers" data-encoding="{encoding}">'
+            f"{blob_text}</script>"
+        )
+        divs.append(f'<script>coinferEmbedBinary("{plot_id}");</script>')
+        return "\n".join(divs)
+
+    # Embed the JSON data safely in a <script type="application/json"> tag
+    divs.append(
+        f'<script type="application/json" id="{plot_id}_data">{html_escape(json.dumps(plot_json), quote=False)}</script>'
+    )
+    # In the JS, retrieve and parse the JSON before passing to Bokeh
+    divs.append(
+        f'''<script>
+var dataElem = document.getElementById("{plot_id}_data");
 var plotData = JSON.parse(dataElem.textContent);
-Bokeh.embed.embed_item(plotData, "{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}");
-'''
-            )
-        divs.append("</div>")
+Bokeh.embed.embed_item(plotData, "{plot_id}");
+</script>'''
+    )
+    return "\n".join(divs)
 
-    html = html_template.replace("###div###", "\n".join(divs))
-    html = html.replace("###script###", "\n".join(scripts))
-    return html
 
+def iter_plots_html(
+    plot,
+    binary: bool = False,
+    compress: bool = False,
+    max_workers: int | None = None,
+    max_points: int | None = None,
+    downsample: "DownsampleMethod" = "minmax",
+    split: bool = False,
+) -> Iterator[str]:
+    """Render `(plot_func, chain, var_name, figure[, key])` tuples to a standalone HTML page, section by section.
 
-def _convert_plots_to_json(plots):
-    plot_jsons = []
-    for plot in plots:
-        if isinstance(plot[3], np.ndarray):
-            g = gridplot(plot[3].tolist())
-            plot_data = json_item(g)
-        else:
-            plot_data = json_item(plot[3])
+    Every plot is yielded with its embed script as soon as it is serialized, so writing the sections to a file
+    (`save_result(iter_plots_html(...))`) holds about one plot in memory. See `render_plots_to_html` for the options.
+    Only plots given with a 5th `key` element are cached: the figures of 4-tuples are built and serialized again on
+    every run, the analyzer has to pass the data and parameters of a figure as its key to get it reused.
+    """
+    from .plot_encoding import PLOT_DATA_DIR, write_plot_group
+
+    head, tail = html_template.split("###div###")
+    yield head
+    if binary and not split:
+        yield f"<script>{_binary_embed_script}</script>\n"
+    groups = _group_plots(plot)
+    # split pages embed the bokeh JSON as is: the data files are compressed as a whole
+    plots = _iter_plots_to_json(
+        [plot for _, group in groups for plot in group], binary, max_workers, max_points, downsample
+    )
+    for plot_func, group in groups:
+        group_html = f'<div id="{html_escape(plot_func)}">\n<h3>{html_escape(plot_func, quote=False)}</h3>\n'
+        if not split:
+            yield group_html
+            for _ in group:
+                _, chain, var_name, plot_json = next(plots)
+                yield _plot_html(plot_func, chain, var_name, plot_json, binary, compress) + "\n"
+            yield "</div>\n"
+            continue
+
+        items = (
+            (f"{plot_func}_{chain}_{var_name}", plot_json)
+            for _, chain, var_name, plot_json in islice(plots, len(group))
+        )
+        data_file = write_plot_group(Path(os.environ["COINFER_ANALYZE_OUTPUT_DIR"], PLOT_DATA_DIR), items)
+        data_src = html_escape(f"{PLOT_DATA_DIR}/{data_file}")
+        for _, chain, var_name, *_ in group:
+            plot_id = f"{html_escape(plot_func)}_{html_escape(chain)}_{html_escape(var_name)}"
+            group_html += f'{_plot_heading(chain, var_name)}\n'
+            group_html += f'<div id="{plot_id}" data-src="{data_src}" style="min-height: 400px"></div>\n'
+        yield group_html + "</div>\n"
+    yield tail.replace("###script###", _lazy_embed_script if split else "")
+
+
+def render_plots_to_html(
+    plot,
+    binary: bool = False,
+    compress: bool = False,
+    max_workers: int | None = None,
+    max_points: int | None = None,
+    downsample: "DownsampleMethod" = "minmax",
+    split: bool = False,
+) -> str:
+    """Render `(plot_func, chain, var_name, figure[, key])` tuples to a standalone HTML page.
+
+    With `binary`, the data columns are embedded as one base64 blob of raw typed-array bytes per plot instead of
+    inside the plot JSON, `compress` additionally gzips the blob (decompressed by the browser).
+    The figures are serialized by `max_workers` processes, see `_convert_plots_to_json`.
+    Lines longer than `max_points` are decimated with the `downsample` method, see `downsample.downsample_lines`:
+    off by default, 4000 keeps 4 points for each of 1000 pixel columns with `minmax`.
+    A plot with a `key`, e.g. `(draws, params)`, is cached by it: reruns with the same key reuse the serialized plot,
+    see `plot_cache`.
+    For large reports, pass `iter_plots_html` to `save_result` instead of building the page in memory.
+    With `split`, the page only holds placeholders: the plots of every group are written to one compressed data
+    file in `COINFER_ANALYZE_OUTPUT_DIR`/`plot_data`, which the page fetches when one of them is scrolled into view.
+    The page must then be saved in `COINFER_ANALYZE_OUTPUT_DIR` and served (or uploaded) with its data files.
+    """
+    return "".join(iter_plots_html(plot, binary, compress, max_workers, max_points, downsample, split))
 
-        plot_jsons.append((*plot[:3], _ensure_center_last(plot_data)))
-    return plot_jsons
+
+def _plot_to_json(figure: Any, binary: bool = False, max_points: int = 0, downsample: "DownsampleMethod" = "minmax"):
+    from bokeh.embed import json_item
+    from bokeh.layouts import gridplot
+
+    from .downsample import downsample_lines
+    from .plot_encoding import binary_columns
+
+    if callable(figure):
+        figure = figure()
+    if isinstance(figure, np.ndarray):
+        g = gridplot(figure.tolist())
+    else:
+        g = figure
+    if max_points:
+        downsample_lines(g, max_points, downsample)
+    if binary:
+        binary_columns(g)
+    return _ensure_center_last(json_item(g))
+
+
+# without an explicit `max_workers`, each plot worker gets at least this many plots to serialize
+_MIN_PLOTS_PER_WORKER = 4
+
+# the plots of the running `_convert_plots_to_json`, inherited by the forked workers: bokeh models do not pickle
+_forked_plots: list[Any] = []
+
+
+def _forked_plot_to_json(index: int, binary: bool, max_points: int, downsample: "DownsampleMethod"):
+    return _plot_to_json(_forked_plots[index][3], binary, max_points, downsample)
+
+
+def _plot_workers(num_plots: int, max_workers: int | None) -> int:
+    # forking from another thread may copy locks held by the main thread
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return 1
+    if threading.current_thread() is not threading.main_thread():
+        return 1
+    if max_workers is None:
+        max_workers = int(os.environ.get("COINFER_PLOT_WORKERS") or 0) or os.cpu_count() or 1
+        # by default, a pool only for reports where it pays for the forks
+        num_plots //= _MIN_PLOTS_PER_WORKER
+    return max(1, min(max_workers, num_plots))
+
+
+def _iter_plots_to_json(
+    plots,
+    binary: bool = False,
+    max_workers: int | None = None,
+    max_points: int | None = None,
+    downsample: "DownsampleMethod" = "minmax",
+) -> Iterator[tuple[Any, ...]]:
+    """Serialize `(plot_func, chain, var_name, figure[, key])` tuples with `json_item`, yielding them in order.
+
+    `figure` is a bokeh model, an array of them for a grid, or a callable building either, so analyzers can leave
+    the construction of the figures to the pool too. With more than one worker, the plots are serialized in
+    forked processes which inherit the figures, at most two per worker ahead of the consumer. `max_workers`
+    defaults to `COINFER_PLOT_WORKERS` or the number of CPUs, with at least `_MIN_PLOTS_PER_WORKER` plots a worker:
+    small reports are serialized here, without a pool.
+    Line sources longer than `max_points` (default `COINFER_PLOT_MAX_POINTS`, unset or 0 keeps every point) are
+    decimated.
+    Plots with a `key` (the data and parameters the figure is built from) are served from the `PlotCache` of the
+    analyzer output dir when the key is unchanged, without building the figure.
+    """
+    global _forked_plots
+
+    from .plot_cache import PlotCache
+
+    if max_points is None:
+        max_points = int(os.environ.get("COINFER_PLOT_MAX_POINTS") or 0)
+    plots = list(plots)
+    cache = PlotCache()
+    keys = [cache.key(plot, (binary, max_points, downsample)) for plot in plots]
+    cached = [cache.contains(key) for key in keys]
+    if any(cached):
+        logger.info("reuse %d of %d plots from the plot cache", sum(cached), len(plots))
+
+    def _result(index: int, future: Future | None) -> tuple[Any, ...]:
+        plot_json = cache.get(keys[index]) if cached[index] else None
+        if plot_json is None:
+            # serialized here without a pool, or evicted meanwhile
+            plot_json = future.result() if future else _plot_to_json(plots[index][3], binary, max_points, downsample)
+            cache.put(keys[index], plot_json)
+        return (*plots[index][:3], plot_json)
+
+    max_workers = _plot_workers(cached.count(False), max_workers)
+    if max_workers == 1:
+        for index in range(len(plots)):
+            yield _result(index, None)
+        cache.evict()
+        return
+
+    _forked_plots = plots
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            # a bounded window of submitted plots, finished ones wait for the consumer in the parent
+            pending: deque[tuple[int, Future | None]] = deque()
+            for index in range(len(plots)):
+                if cached[index]:
+                    pending.append((index, None))
+                else:
+                    pending.append(
+                        (index, executor.submit(_forked_plot_to_json, index, binary, max_points, downsample))
+                    )
+                if len(pending) >= 2 * max_workers:
+                    yield _result(*pending.popleft())
+            while pending:
+                yield _result(*pending.popleft())
+    finally:
+        _forked_plots = []
+    cache.evict()
+
+
+def _convert_plots_to_json(
+    plots,
+    binary: bool = False,
+    max_workers: int | None = None,
+    max_points: int | None = None,
+    downsample: "DownsampleMethod" = "minmax",
+) -> list[tuple[Any, ...]]:
+    """All the serialized plots of `_iter_plots_to_json` as a list."""
+    return list(_iter_plots_to_json(plots, binary, max_workers, max_points, downsample))
 
 
 class Workflow:
-    def __init__(self, workflow_id: str, client: Client) -> None:
+    def __init__(self, workflow_id: str, client: Client, prefetch: bool = False) -> None:
         self.client = client
         self.workflow_id = workflow_id
+        self.prefetch = prefetch
         if _is_sync() and workflow_id:
             wf_rsp = client.get_object(workflow_id)
             self.model_id = wf_rsp["model_id"]
@@ -230,10 +1262,15 @@ class Workflow:
             self.data = data_path.read_bytes()
         else:
             self.data = None
+        if prefetch:
+            # start downloading now, `experiment.inference_data` waits for it
+            _ = self.experiment
 
     @cached_property
     def experiment(self):
-        return Experiment(self.client.endpoints, self.client.coinfer_auth_token, self.experiment_id)
+        return Experiment(
+            self.client.endpoints, self.client.coinfer_auth_token, self.experiment_id, prefetch=self.prefetch
+        )
 
     def parse_data(self, parse_func: Callable[[bytes | None], Any]) -> None:
         parsed_data = json.dumps(parse_func(self.data))
@@ -244,7 +1281,8 @@ class Workflow:
 
 def current_workflow():
     client = Client(os.environ["COINFER_SERVER_ENDPOINT"], os.environ["COINFER_AUTH_TOKEN"])
-    return Workflow(os.environ["WORKFLOW_ID"], client)
+    # only analyzers read the experiment, data.py runs before there is any
+    return Workflow(os.environ["WORKFLOW_ID"], client, prefetch=bool(os.environ.get("COINFER_ANALYZE_OUTPUT_DIR")))
 
 
 __all__ = [
@@ -254,7 +1292,11 @@ __all__ = [
     "RunInfoData",
     "save_result",
     "current_experiment",
+    "Experiment",
+    "ExperimentComparison",
+    "load_experiments",
     "render_plots_to_html",
+    "iter_plots_html",
     "Workflow",
     "current_workflow",
     "sample_cmd_impl",
@@ -1,23 +1,36 @@
+import filecmp
 import json
 import logging
+import math
 import os
 import shutil
 import subprocess
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import IO, Any, Callable, cast
+from typing import IO, Any, Callable, NamedTuple, cast
 
 import yaml
 
-from .client import Client
-from .client_common import NEED_LOGIN_PROMPT, bool_sync, get_token
+from . import warm_worker
+from .artifacts import collect_artifacts
+from .client import Client, experiment_status
+from .client_common import NEED_LOGIN_PROMPT, SAMPLING_STATUS_FILE, bool_sync, get_token
+from .experiment_cache import FINISHED_STATUSES
+from .plot_encoding import PLOT_DATA_DIR
+from .resource_monitor import RESOURCES_FILE, ResourceMonitor, ResourceSummary
 
 logger = logging.getLogger(__name__)
 EFS_DIR = os.environ.get("EFS_DIR")
 PROCESS_WAIT_TIMEOUT_SECONDS = int(os.environ.get("PROCESS_WAIT_TIMEOUT_SECONDS", 850))
+WATCH_POLL_SECONDS = float(os.environ.get("COINFER_WATCH_POLL_SECONDS", "1"))
+# experiments in these states will not produce new draws, failed or not
+_ENDED_STATUSES = (*FINISHED_STATUSES, "ERR")
 
 
-def analyze():
+def analyze(watch: bool = False, debounce: float = 5.0, min_interval: float = 30.0, max_wait: float = 60.0):
     with open("workflow.yaml") as f:
         settings: dict[str, Any] = yaml.safe_load(f)
     analysis = settings.get("analysis", {})
@@ -28,51 +41,308 @@ def analyze():
     if is_sync and not token:
         return print(NEED_LOGIN_PROMPT)
 
-    return_code, errlines, result_file = _run(settings)
+    if watch:
+        _watch(settings, debounce, min_interval, max_wait)
+    else:
+        _analyze_once(settings)
+
+
+def _analyze_once(settings: dict[str, Any]):
+    return_code, errlines, result_files, resources = _run(settings)
+    # the result page of the first analyzer that saved one
+    result_file = next(iter(result_files.values()), "")
     if result_file:
         if Path(result_file).is_file():
-            _save_analyzer_result(settings, return_code, errlines, result_file)
+            _save_analyzer_result(settings, return_code, errlines, result_files, resources)
         else:
             logger.error(f"Analyzer result file {result_file} does not exist.")
 
 
-def _save_analyzer_result(settings: dict[str, Any], return_code: int, errlines: list[str], result_file: str):
+def _watch(settings: dict[str, Any], debounce: float, min_interval: float, max_wait: float):
+    """Run the analyzer whenever the MCMC data changes, until the sampling is finished or the user interrupts.
+
+    A run starts once the data has not changed for `debounce` seconds, or at the latest `max_wait` seconds after the
+    first change it has not seen yet, so a sampler writing continuously still gets its diagnostics updated. Runs
+    start at least `min_interval` seconds apart. The analyzer reuses the on-disk experiment and plot caches of the
+    previous runs, and `save_result` replaces the result atomically, so the previous result stays readable during a
+    run. A failing poll or run is logged, the watch goes on.
+    """
+    poll = _change_poller(settings)
+    fingerprint: Any = None
+    # the first and the last change not seen by a run yet
+    first_change: float | None = None
+    last_change = -math.inf
+    last_run = -math.inf
+    logger.info("watching the MCMC data, debounce=%ss min_interval=%ss max_wait=%ss", debounce, min_interval, max_wait)
+    try:
+        while True:
+            try:
+                new_fingerprint, finished = poll()
+            except Exception:
+                logger.exception("poll the MCMC data failed, keep watching")
+                time.sleep(WATCH_POLL_SECONDS)
+                continue
+            now = time.monotonic()
+            if new_fingerprint != fingerprint:
+                fingerprint, last_change = new_fingerprint, now
+                if first_change is None:
+                    first_change = now
+            if (
+                first_change is not None
+                and now - last_run >= min_interval
+                and (now - last_change >= debounce or now - first_change >= max_wait)
+            ):
+                first_change, last_run = None, now
+                try:
+                    _analyze_once(settings)
+                except Exception:
+                    logger.exception("analyze failed, keep watching")
+            elif finished and first_change is None:
+                logger.info("sampling finished, stop watching")
+                return
+            time.sleep(WATCH_POLL_SECONDS)
+    except KeyboardInterrupt:
+        logger.info("stop watching")
+
+
+def _change_poller(settings: dict[str, Any]) -> Callable[[], tuple[Any, bool]]:
+    """A callable returning a fingerprint of the MCMC data and whether the sampling is finished.
+
+    The local MCMC data directory is watched when the sampler writes there, otherwise the experiment on the server.
+    The sampling of the local data is finished once the sampler wrote its `SAMPLING_STATUS_FILE` after the data.
+    """
+    exp_id, client = _experiment_id(settings)
+    mcmc_data_path = _mcmc_data_path(settings, exp_id)
+    if mcmc_data_path.is_dir() or client is None:
+
+        def _poll_directory() -> tuple[Any, bool]:
+            if not mcmc_data_path.is_dir():
+                return None, False
+            files = sorted(
+                path
+                for path in mcmc_data_path.rglob("*")
+                if path.is_file() and path.name not in (RESOURCES_FILE, SAMPLING_STATUS_FILE)
+            )
+            fingerprint = [(path.as_posix(), path.stat().st_size, path.stat().st_mtime_ns) for path in files]
+            status_file = mcmc_data_path / SAMPLING_STATUS_FILE
+            # a status left by a previous run in the same directory is older than the data of this run
+            finished = status_file.is_file() and all(
+                status_file.stat().st_mtime_ns >= mtime for _, _, mtime in fingerprint
+            )
+            return fingerprint, finished
+
+        return _poll_directory
+
+    def _poll_server() -> tuple[Any, bool]:
+        exp_data = client.get_experiment(exp_id)
+        return json.dumps(exp_data, sort_keys=True), experiment_status(exp_data) in _ENDED_STATUSES
+
+    return _poll_server
+
+
+def _save_analyzer_result(
+    settings: dict[str, Any],
+    return_code: int,
+    errlines: list[str],
+    result_files: dict[str, str],
+    resources: dict[str, ResourceSummary],
+):
     analysis = settings.get("analysis", {})
     is_sync = bool_sync(analysis["sync"])
     if not is_sync:
         return
     local_settings = settings[analysis['sync']]
+    (first, result_file), *others = result_files.items()
     client = Client(local_settings["endpoint"], get_token())
-    client.save_analyzer_result(local_settings["workflow_id"], return_code, errlines, result_file)
+    output_dir = _output_dir(settings)
+    artifacts = collect_artifacts(output_dir)
+    if not client.publish_analyzer_artifacts(
+        local_settings["workflow_id"], return_code, errlines, result_file, output_dir, artifacts, resources=resources
+    ):
+        # a server without the artifact store keeps a single result page per workflow
+        if others:
+            message = (
+                f"the server takes one result page, only the one of analyzer {first} is uploaded, "
+                f"not those of {', '.join(name for name, _ in others)}"
+            )
+            logger.error(message)
+            errlines = [message, *errlines]
+        client.save_analyzer_result(
+            local_settings["workflow_id"],
+            return_code,
+            errlines,
+            result_file,
+            _result_data_files(result_file),
+            resources,
+        )
     logger.info("Saved analyzer result to server.")
 
 
-def _run(settings: dict[str, Any]) -> tuple[int, list[str], str]:
+def _output_dir(settings: dict[str, Any]) -> Path:
+    analysis: dict[str, Any] = settings.get("analysis", {})
+    return Path(os.getcwd()) / cast(str, analysis.get("output_dir", "analyzer_output"))
+
+
+def _result_data_files(result_file: str) -> list[str]:
+    """The data files of a split report, written by the analyzer next to its result page."""
+    data_dir = Path(result_file).parent / PLOT_DATA_DIR
+    if not data_dir.is_dir():
+        return []
+    return sorted(path.as_posix() for path in data_dir.iterdir() if path.is_file() and not path.name.startswith("."))
+
+
+def _experiment_id(settings: dict[str, Any]) -> tuple[str, Client | None]:
+    """The experiment of the workflow on the server and a client for it, `("", None)` without sync."""
+    coinfer = settings.get("coinfer", {})
+    if not bool_sync(settings.get("analysis", {})["sync"]) or not coinfer.get("workflow_id"):
+        return "", None
+    client = Client(coinfer["endpoint"], get_token())
+    wf_rsp = client.get_object(coinfer["workflow_id"])
+    return wf_rsp["experiment_id"], client
+
+
+def _mcmc_data_path(settings: dict[str, Any], exp_id: str) -> Path:
+    mcmc_data_dir = Path(os.getcwd()) / settings["sampling"]['mcmc_data'].get("directory", "mcmcdata")
+    return mcmc_data_dir / exp_id if exp_id else mcmc_data_dir
+
+
+def _prune_data_files(outputdir: Path, before: float):
+    """Remove the data files of split reports not written again by the last analyzer run, which started at `before`."""
+    data_dir = outputdir / PLOT_DATA_DIR
+    if not data_dir.is_dir():
+        return
+    for path in data_dir.iterdir():
+        # with some slack for filesystems storing coarse mtimes
+        if path.is_file() and path.stat().st_mtime < before - 2:
+            path.unlink(missing_ok=True)
+
+
+def _sync_tree(src: Path, dst: Path) -> int:
+    """Copy the files of `src` to `dst` which differ, returns the number of copied files.
+
+    Files with the same size and mtime as their copy are not read, others are compared by content. Unchanged files
+    are left untouched, so repeated runs do not write to the (possibly network) filesystem and keep the bytecode
+    caches of the copies valid. Like `copytree(dirs_exist_ok=True)`, files missing from `src` are kept.
+    """
+    copied = 0
+    for src_dir, dirnames, filenames in os.walk(src):
+        dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+        dst_dir = dst / Path(src_dir).relative_to(src)
+        dst_dir.mkdir(parents=True, exist_ok=True)
+        for name in filenames:
+            src_file, dst_file = Path(src_dir, name), dst_dir / name
+            src_stat = src_file.stat()
+            try:
+                dst_stat = dst_file.stat()
+            except FileNotFoundError:
+                dst_stat = None
+            if dst_stat is not None and dst_stat.st_size == src_stat.st_size:
+                if dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                    continue
+                if filecmp.cmp(src_file, dst_file, shallow=False):
+                    # same content, the mtime makes the next comparison cheap
+                    shutil.copystat(src_file, dst_file)
+                    continue
+            # replaced in one step, an analyzer importing the package meanwhile sees the old or the new file
+            tmp_file = dst_dir / f".{name}.tmp"
+            shutil.copy2(src_file, tmp_file)
+            os.replace(tmp_file, dst_file)
+            copied += 1
+    logger.debug("synced %s to %s, %d files copied", src, dst, copied)
+    return copied
+
+
+class _Analyzer(NamedTuple):
+    name: str
+    working_dir: Path
+    output_dir: Path
+    # written by `save_result` with the path of the result page
+    result_path_file: Path
+
+
+def _analyzers(settings: dict[str, Any]) -> list[_Analyzer]:
+    """The analyzers of the workflow: the entries of `analysis.analyzers`, by default the one in `analyzer/`.
+
+    An entry is the directory of an analyzer, or `{directory: ..., name: ...}` with a name other than the directory
+    name. Listed analyzers write to the sub directory `<name>` of the output dir.
+    """
+    workflow_dir = Path(os.getcwd())
+    outputdir = _output_dir(settings)
+    entries: list[str | dict[str, str]] = settings.get("analysis", {}).get("analyzers") or []
+    if not entries:
+        result_path_file = workflow_dir / "tmp" / "analyze_result_path"
+        return [_Analyzer("analyzer", workflow_dir / "analyzer", outputdir, result_path_file)]
+    analyzers: list[_Analyzer] = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"directory": entry}
+        working_dir = workflow_dir / entry["directory"]
+        name = str(entry.get("name") or working_dir.name)
+        if not name or name.startswith(".") or "/" in name:
+            raise ValueError(f"invalid analyzer name: {name!r}")
+        result_path_file = workflow_dir / "tmp" / f"analyze_result_path.{name}"
+        analyzers.append(_Analyzer(name, working_dir, outputdir / name, result_path_file))
+    names = [analyzer.name for analyzer in analyzers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"analyzer names are not unique: {names}")
+    return analyzers
+
+
+def _max_concurrency(analysis: dict[str, Any], num_analyzers: int) -> int:
+    max_concurrency = analysis.get("max_concurrency") or os.environ.get("COINFER_ANALYZER_CONCURRENCY")
+    return max(1, min(int(max_concurrency or os.cpu_count() or 1), num_analyzers))
+
+
+def _shared_envs(settings: dict[str, Any], exp_id: str, concurrency: int) -> dict[str, str]:
+    """Environment of analyzers run side by side: one copy of the posterior for all, and a share of the CPUs each.
+
+    The experiment is downloaded once here into the experiment cache, which the analyzers then open as is. Local
+    MCMC data is converted by the first analyzer into the cache while the others wait for it.
+    """
+    envs: dict[str, str] = {}
+    if not bool_sync(settings["analysis"]["sync"]):
+        envs["COINFER_SHARED_POSTERIOR"] = "TRUE"
+    elif exp_id:
+        from . import prefetch_experiment
+
+        start = time.time()
+        if prefetch_experiment(settings["coinfer"]["endpoint"], get_token(), exp_id):
+            logger.info("fetched experiment %s for the analyzers in %.1fs", exp_id, time.time() - start)
+            envs["COINFER_SHARED_POSTERIOR"] = "TRUE"
+        else:
+            logger.warning("experiment cache disabled, every analyzer downloads experiment %s", exp_id)
+    workers = str(max(1, (os.cpu_count() or 1) // concurrency))
+    for name in ("COINFER_DECODE_WORKERS", "COINFER_PLOT_WORKERS"):
+        if name not in os.environ:
+            envs[name] = workers
+    return envs
+
+
+def _run(settings: dict[str, Any]) -> tuple[int, list[str], dict[str, str], dict[str, ResourceSummary]]:
+    """Run the analyzers, several of them concurrently.
+
+    Returns the return code, stderr lines, and the result page and resource figures of every analyzer by name, in
+    the order of the analyzers, leaving out those that saved none. With several analyzers, the return code is the
+    first non zero one and the stderr lines are prefixed by the analyzer name.
+    """
     workflow_dir = Path(os.getcwd())
     analysis: dict[str, Any] = settings.get("analysis", {})
-    outputdir = workflow_dir / cast(str, analysis.get("output_dir", "analyzer_output"))
+    outputdir = _output_dir(settings)
     os.makedirs(outputdir, exist_ok=True)
     coinfer = settings.get("coinfer", {})
-    sampling = settings["sampling"]
     is_sync = bool_sync(analysis["sync"])
 
-    working_dir = Path(workflow_dir / "analyzer")
-    if not working_dir.exists():
-        raise ValueError("No analyzer found. Attach an analyzer before call this command")
+    analyzers = _analyzers(settings)
+    for analyzer in analyzers:
+        if not analyzer.working_dir.exists():
+            raise ValueError(
+                f"No analyzer found in {analyzer.working_dir.name}. Attach an analyzer before call this command"
+            )
 
-    if is_sync and coinfer.get("workflow_id"):
-        client = Client(coinfer["endpoint"], get_token())
-        wf_id = coinfer["workflow_id"]
-        wf_rsp = client.get_object(wf_id)
-        exp_id = wf_rsp["experiment_id"]
-        client.post_object(wf_id, {"analyzer_result": '{"status": "running"}'})
-    else:
-        exp_id = ""
-
-    if exp_id:
-        mcmc_data_path = workflow_dir / sampling['mcmc_data'].get("directory", "mcmcdata") / exp_id
-    else:
-        mcmc_data_path = workflow_dir / sampling['mcmc_data'].get("directory", "mcmcdata")
+    exp_id, client = _experiment_id(settings)
+    if client is not None:
+        client.post_object(coinfer["workflow_id"], {"analyzer_result": '{"status": "running"}'})
+    mcmc_data_path = _mcmc_data_path(settings, exp_id)
     envs: dict[str, str] = os.environ | {
         "COINFER_ANALYSIS_SYNC": "TRUE" if is_sync else "FALSE",
         "WORKFLOW_ID": coinfer.get("workflow_id", ""),
@@ -80,7 +350,6 @@ def _run(settings: dict[str, Any]) -> tuple[int, list[str], str]:
         "COINFER_AUTH_TOKEN": get_token(),
         "WORKFLOW_DIR": workflow_dir.as_posix(),
         "COINFER_MCMC_DATA_PATH": mcmc_data_path.as_posix(),
-        "COINFER_ANALYZE_OUTPUT_DIR": outputdir.as_posix(),
     }
 
     input_param_file = outputdir / "input_params"
@@ -93,7 +362,43 @@ def _run(settings: dict[str, Any]) -> tuple[int, list[str], str]:
             ftmp,
         )
 
-    metadata = json.loads(Path("analyzer", ".metadata").read_text())
+    if len(analyzers) == 1:
+        results = [_run_analyzer(analyzers[0], envs, input_param_file)]
+        return_code, errlines, _, _ = results[0]
+        return return_code, errlines, _result_files(analyzers, results), _resources(analyzers, results)
+    concurrency = _max_concurrency(analysis, len(analyzers))
+    envs |= _shared_envs(settings, exp_id, concurrency)
+    logger.info("run %d analyzers, %d at a time", len(analyzers), concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(_run_analyzer, analyzers, repeat(envs), repeat(input_param_file), repeat(True)))
+    return_code = next((return_code for return_code, _, _, _ in results if return_code), 0)
+    errlines = [f"[{analyzer.name}] {line}" for analyzer, (_, lines, _, _) in zip(analyzers, results) for line in lines]
+    return return_code, errlines, _result_files(analyzers, results), _resources(analyzers, results)
+
+
+def _result_files(
+    analyzers: list[_Analyzer], results: list[tuple[int, list[str], str, ResourceSummary | None]]
+) -> dict[str, str]:
+    return {analyzer.name: result_file for analyzer, (_, _, result_file, _) in zip(analyzers, results) if result_file}
+
+
+def _resources(
+    analyzers: list[_Analyzer], results: list[tuple[int, list[str], str, ResourceSummary | None]]
+) -> dict[str, ResourceSummary]:
+    return {analyzer.name: resources for analyzer, (_, _, _, resources) in zip(analyzers, results) if resources}
+
+
+def _run_analyzer(
+    analyzer: _Analyzer, envs: dict[str, str], input_param_file: Path, labelled: bool = False
+) -> tuple[int, list[str], str, ResourceSummary | None]:
+    workflow_dir = Path(os.getcwd())
+    os.makedirs(analyzer.output_dir, exist_ok=True)
+    envs = envs | {
+        "COINFER_ANALYZE_OUTPUT_DIR": analyzer.output_dir.as_posix(),
+        "COINFER_ANALYZE_RESULT_PATH_FILE": analyzer.result_path_file.as_posix(),
+    }
+
+    metadata = json.loads(Path(analyzer.working_dir, ".metadata").read_text())
     entrance_file = metadata['entrance_file']
     lang = 'python' if entrance_file.endswith('.py') else 'julia'
 
@@ -110,17 +415,36 @@ def _run(settings: dict[str, Any]) -> tuple[int, list[str], str]:
         raise NotImplementedError(f"Unsupported language: {lang}")
 
     logger.debug('envs=%s', envs)
-    shutil.copytree(f'{workflow_dir}/client/Coinfer.py/Coinfer', working_dir / "Coinfer", dirs_exist_ok=True)
-    return_code, _, errlines = _run_command(cmd, env=envs, cwd=working_dir)
+    _sync_tree(Path(workflow_dir, "client", "Coinfer.py", "Coinfer"), analyzer.working_dir / "Coinfer")
+    # a result left by a previous run is not taken for the one of this run
+    analyzer.result_path_file.unlink(missing_ok=True)
+    started = time.time()
+    label = analyzer.name if labelled else ""
+    monitor = ResourceMonitor(analyzer.output_dir / RESOURCES_FILE)
+    return_code, _, errlines = _run_command(cmd, env=envs, cwd=analyzer.working_dir, label=label, monitor=monitor)
+    resources = monitor.summary()
+    if resources:
+        logger.info(
+            "Analyzer %s: peak RSS %d MiB, CPU %.0f%% peak %.0f%% average, %d threads",
+            analyzer.name,
+            resources["rss_bytes_peak"] >> 20,
+            resources["cpu_percent_peak"],
+            resources["cpu_percent_avg"],
+            resources["num_threads_peak"],
+        )
     if return_code != 0:
-        logger.error("Analyzer failed with return code %d", return_code)
-        return return_code, errlines, ""
+        logger.error("Analyzer %s failed with return code %d", analyzer.name, return_code)
+        return return_code, errlines, "", resources
+    # the previous result page, still readable during the run, used the older data files
+    _prune_data_files(analyzer.output_dir, started)
 
-    tmp_dir = Path(workflow_dir, "tmp")
-    analyze_result_path = Path("analyzer", Path(tmp_dir, "analyze_result_path").read_text().strip())
+    if not analyzer.result_path_file.is_file():
+        logger.error("Analyzer %s saved no result", analyzer.name)
+        return return_code, errlines, "", resources
+    analyze_result_path = Path(analyzer.working_dir, analyzer.result_path_file.read_text().strip())
     logger.info("Analyzer result saved to %s", analyze_result_path)
 
-    return return_code, errlines, analyze_result_path.as_posix()
+    return return_code, errlines, analyze_result_path.as_posix(), resources
 
 
 def _read_stream(stream: IO[str], callback: Callable[[str], None]):
@@ -129,9 +453,16 @@ def _read_stream(stream: IO[str], callback: Callable[[str], None]):
     stream.close()
 
 
-def _run_command(command: list[str], env: dict[str, str], cwd: str | Path):
+def _run_command(
+    command: list[str], env: dict[str, str], cwd: str | Path, label: str = "", monitor: ResourceMonitor | None = None
+):
+    """Run `command`, logging its output as it comes (prefixed by `label`), returns the code and output lines.
+
+    `monitor` samples the resources used by the process tree while it runs.
+    """
     logger.debug('run cmd: %s, cwd=%s', command, cwd)
-    proc = subprocess.Popen(
+    prefix = f"{label} " if label else ""
+    proc = warm_worker.popen(command, env=env, cwd=cwd) or subprocess.Popen(
         command,
         bufsize=1,
         stdout=subprocess.PIPE,
@@ -145,11 +476,11 @@ def _run_command(command: list[str], env: dict[str, str], cwd: str | Path):
     stderr_lines: list[str] = []
 
     def handle_stdout(line: str):
-        logger.info("stdout> %s", line)
+        logger.info("%sstdout> %s", prefix, line)
         stdout_lines.append(line)
 
     def handle_stderr(line: str):
-        logger.warning("stderr> %s", line)
+        logger.warning("%sstderr> %s", prefix, line)
         stderr_lines.append(line)
 
     stdout_thread = threading.Thread(target=_read_stream, args=(proc.stdout, handle_stdout))
@@ -157,9 +488,15 @@ def _run_command(command: list[str], env: dict[str, str], cwd: str | Path):
 
     stdout_thread.start()
     stderr_thread.start()
+    if monitor is not None:
+        monitor.start(proc.pid)
 
     logger.debug('before communication')
-    proc.wait(timeout=PROCESS_WAIT_TIMEOUT_SECONDS)
+    try:
+        proc.wait(timeout=PROCESS_WAIT_TIMEOUT_SECONDS)
+    finally:
+        if monitor is not None:
+            monitor.stop()
     logger.debug('after communication')
 
     stdout_thread.join()
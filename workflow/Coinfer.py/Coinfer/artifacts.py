@@ -0,0 +1,73 @@
+"""Content-addressed artifacts of an analyzer run: the files of the analyzer output dir, identified by their sha256.
+
+The hashes are cached in `<output_dir>/.artifact_hashes.json` by path, size and mtime, so files left unchanged by
+a rerun are not read again. Hidden files (caches, temporary files) and the `input_params` written by the analyze
+command are not artifacts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TypedDict
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_HASHES_FILE = ".artifact_hashes.json"
+_EXCLUDED = {"input_params"}
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class Artifact(TypedDict):
+    sha256: str
+    size: int
+
+
+class _CachedHash(Artifact):
+    mtime_ns: int
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        while chunk := fin.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_hashes(hashes_file: Path) -> dict[str, _CachedHash]:
+    try:
+        return json.loads(hashes_file.read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        logger.warning("broken artifact hashes: %s", hashes_file)
+        return {}
+
+
+def collect_artifacts(output_dir: Path) -> dict[str, Artifact]:
+    """`{path relative to output_dir: artifact}` of every artifact in `output_dir`."""
+    output_dir = Path(output_dir)
+    hashes_file = output_dir / ARTIFACT_HASHES_FILE
+    cached = _load_hashes(hashes_file)
+    hashes: dict[str, _CachedHash] = {}
+    num_hashed = 0
+    for path in sorted(output_dir.rglob("*")):
+        name = path.relative_to(output_dir).as_posix()
+        if name in _EXCLUDED or any(part.startswith(".") for part in path.relative_to(output_dir).parts):
+            continue
+        if not path.is_file():
+            continue
+        stat = path.stat()
+        entry = cached.get(name)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            entry = {"sha256": hash_file(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            num_hashed += 1
+        hashes[name] = entry
+    if hashes != cached:
+        tmp_file = output_dir / f"{ARTIFACT_HASHES_FILE}.tmp"
+        tmp_file.write_text(json.dumps(hashes))
+        os.replace(tmp_file, hashes_file)
+    logger.debug("%d artifacts in %s, %d hashed", len(hashes), output_dir, num_hashed)
+    return {name: {"sha256": entry["sha256"], "size": entry["size"]} for name, entry in hashes.items()}
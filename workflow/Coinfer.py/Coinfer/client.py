@@ -4,10 +4,16 @@ import json
 import logging
 import os
 import urllib.parse
+import uuid
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Any, Required, TypedDict
 
-from .logged_requests import requests, requests_lib
+from .artifacts import Artifact
+from .logged_requests import CheckResponseSubject, requests, requests_lib
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -34,6 +40,49 @@ class LogDataDict(TypedDict):
     iteration: ChainIterMap
 
 
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+# the answers of servers without an endpoint, e.g. older ones which only take the analyzer result as JSON
+_UNSUPPORTED_STATUS_CODES = (404, 405, 415, 501)
+# endpoints known to answer that to the streaming upload and to the artifact upload, not asked again by this process
+_json_upload_endpoints: set[str] = set()
+_no_artifacts_endpoints: set[str] = set()
+_ARTIFACT_UPLOAD_WORKERS = 8
+
+# (field name, file name, content type, a callable returning the content chunks)
+_MultipartPart = tuple[str, str, str, Callable[[], Iterable[bytes]]]
+
+
+def _file_chunks(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as fin:
+        while chunk := fin.read(_UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+def _gzip_chunks(path: Path) -> Iterator[bytes]:
+    # wbits 31: a gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in _file_chunks(path):
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+def _multipart_chunks(boundary: str, parts: list[_MultipartPart]) -> Iterator[bytes]:
+    for name, filename, content_type, chunks in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{urllib.parse.quote(filename, safe="/")}"'
+        yield f"--{boundary}\r\nContent-Disposition: {disposition}\r\nContent-Type: {content_type}\r\n\r\n".encode()
+        yield from chunks()
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def experiment_status(exp_data: dict[str, Any]) -> str:
+    """The run status of an experiment as returned by `Client.get_experiment`, `""` when unknown."""
+    return exp_data.get("status") or exp_data.get("meta", {}).get("run_info", {}).get("status", "")
+
+
 class Client:
     session = requests
     run_info: RunInfoData
@@ -236,6 +285,148 @@ class Client:
         return_code: int,
         errlines: list[str],
         result_file: str,
+        result_files: list[str] | None = None,
+        resources: dict[str, Any] | None = None,
+    ):
+        """Upload the analyzer result page, with `result_files` (the data files of a split report) if any.
+
+        The page is gzip compressed while it is streamed from disk in a chunked multipart body. Servers without the
+        streaming endpoint get the JSON form, with the base64 encoded content of the files. `resources` are the
+        resource figures of the run (`resource_monitor.ResourceSummary` by analyzer name).
+        """
+        if self.endpoints not in _json_upload_endpoints:
+            resp = self._stream_analyzer_result(
+                workflow_id, return_code, errlines, result_file, result_files or [], resources
+            )
+            if resp is None or resp.status_code not in _UNSUPPORTED_STATUS_CODES:
+                self.response_data(resp)
+                return
+            logger.info("server has no streaming upload (%d), send the analyzer result as JSON", resp.status_code)
+            _json_upload_endpoints.add(self.endpoints)
+        self._post_analyzer_result(workflow_id, return_code, errlines, result_file, result_files or [], resources)
+
+    def publish_analyzer_artifacts(
+        self,
+        workflow_id: str,
+        return_code: int,
+        errlines: list[str],
+        result_file: str,
+        output_dir: Path,
+        artifacts: dict[str, Artifact],
+        max_workers: int | None = None,
+        resources: dict[str, Any] | None = None,
+    ) -> bool:
+        """Publish the artifacts of an analyzer run (see `artifacts.collect_artifacts`) by content hash.
+
+        Only the artifacts the server does not have yet are uploaded, concurrently and streamed from disk, then the
+        manifest `{path: artifact}` naming `result_file` as the result page replaces the one of the previous run.
+        Returns False, without uploading anything, when the server has no artifact store.
+        """
+        if self.endpoints in _no_artifacts_endpoints:
+            return False
+        try:
+            result = Path(result_file).resolve().relative_to(Path(output_dir).resolve()).as_posix()
+        except ValueError:
+            logger.warning("analyzer result %s is not in %s, not published as artifacts", result_file, output_dir)
+            return False
+
+        url = self.endpoint("api", f"/object/{workflow_id}/artifacts/missing")
+        hashes = sorted({artifact["sha256"] for artifact in artifacts.values()})
+        resp = self.session.post(
+            url, headers=self.headers_with_auth(), json={"hashes": hashes}, check_subjects=CheckResponseSubject.TIMEOUT
+        )
+        if resp is not None and resp.status_code in _UNSUPPORTED_STATUS_CODES:
+            logger.info("server has no artifact store (%d)", resp.status_code)
+            _no_artifacts_endpoints.add(self.endpoints)
+            return False
+        missing = set(self.response_data(resp).get("missing", []))
+
+        uploads = {
+            artifact["sha256"]: Path(output_dir, name)
+            for name, artifact in artifacts.items()
+            if artifact["sha256"] in missing
+        }
+        if uploads:
+            if max_workers is None:
+                max_workers = int(os.environ.get("COINFER_UPLOAD_WORKERS", _ARTIFACT_UPLOAD_WORKERS))
+            max_workers = max(1, min(max_workers, len(uploads)))
+            self.session.set_pool_size(max_workers)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(partial(self._upload_artifact, workflow_id), uploads.keys(), uploads.values()))
+        logger.info(
+            "uploaded %d of %d artifacts, %d bytes",
+            len(uploads),
+            len(hashes),
+            sum(path.stat().st_size for path in uploads.values()),
+        )
+
+        url = self.endpoint("api", f"/object/{workflow_id}/artifacts")
+        body: dict[str, Any] = {
+            "payload": {
+                "object_type": "workflow.analyzer_artifacts",
+                "return_code": return_code,
+                "errlines": errlines,
+                "result": result,
+                "artifacts": artifacts,
+            }
+        }
+        if resources:
+            body["payload"]["resources"] = resources
+        resp = self.session.post(url, headers=self.headers_with_auth(), json=body)
+        self.response_data(resp)
+        return True
+
+    def _upload_artifact(self, workflow_id: str, sha256: str, path: Path):
+        url = self.endpoint("api", f"/object/{workflow_id}/artifacts/{sha256}")
+        headers = self.headers_with_auth()
+        headers["Content-Type"] = "application/octet-stream"
+        resp = self.session.put(url, headers=headers, data=_file_chunks(path))
+        self.response_data(resp)
+
+    def _stream_analyzer_result(
+        self,
+        workflow_id: str,
+        return_code: int,
+        errlines: list[str],
+        result_file: str,
+        result_files: list[str],
+        resources: dict[str, Any] | None,
+    ) -> requests_lib.Response | None:
+        url = self.endpoint("api", f"/object/{workflow_id}/analyzer_result")
+        payload: dict[str, Any] = {
+            "object_type": "workflow.analyzer_result",
+            "return_code": return_code,
+            "errlines": errlines,
+            "result_encoding": "gzip",
+        }
+        if resources:
+            payload["resources"] = resources
+        parts: list[_MultipartPart] = [("payload", "", "application/json", lambda: [json.dumps(payload).encode()])]
+        result_path = Path(result_file)
+        if result_path.exists():
+            parts.append(("result", result_path.name, "application/gzip", partial(_gzip_chunks, result_path)))
+        for path in result_files:
+            name = Path(path).relative_to(result_path.parent).as_posix()
+            parts.append(("result_files", name, "application/octet-stream", partial(_file_chunks, Path(path))))
+        boundary = uuid.uuid4().hex
+        headers = self.headers_with_auth()
+        headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        # a generator body is sent with `Transfer-Encoding: chunked`
+        return self.session.post(
+            url,
+            headers=headers,
+            data=_multipart_chunks(boundary, parts),
+            check_subjects=CheckResponseSubject.TIMEOUT,
+        )
+
+    def _post_analyzer_result(
+        self,
+        workflow_id: str,
+        return_code: int,
+        errlines: list[str],
+        result_file: str,
+        result_files: list[str],
+        resources: dict[str, Any] | None,
     ):
         url = self.endpoint("api", f"/object/{workflow_id}")
         headers = self.headers_with_auth()
@@ -252,6 +443,15 @@ class Client:
                 "result": result,
             }
         }
+        if resources:
+            body["payload"]["resources"] = resources
+        if result_files:
+            # stored as is: they are compressed already
+            result_dir = Path(result_file).parent
+            body["payload"]["result_files"] = {
+                Path(path).relative_to(result_dir).as_posix(): base64.b64encode(Path(path).read_bytes()).decode()
+                for path in result_files
+            }
         resp = self.session.post(url, headers=headers, json=body)
         self.response_data(resp)
 
@@ -51,6 +51,9 @@ def gen_batch_id():
     return base62(cast(int, uuid.uuid1().int))
 
 
+# written by the sampler into the MCMC data directory with its final status when it exits
+SAMPLING_STATUS_FILE = ".sampling_status"
+
 NEED_LOGIN_PROMPT = """
 You are not logged in. Please run `inv login` first.
 Or you can change to 'sync: off' in workflow.yaml to disable sync with cloud.
@@ -1,13 +1,24 @@
+import io
 import logging
+import re
+from collections.abc import Iterable
 from pathlib import Path
-from typing import Any, cast
+from typing import Any, NamedTuple, cast
 
 import arviz as az
 import numpy as np
 import pandas as pd
+import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+from .draw_store import DRAW_STORE_SUFFIX, DrawStoreReader, iter_draw_store_files
 
 logger = logging.getLogger(__name__)
 
+# `a[1]`, `a[1,2]`, `a[1, 2]`
+_INDEXED_VAR_PATTERN = re.compile(r"^(?P<base>[^\[\]]+)\[(?P<index>\s*-?\d+\s*(?:,\s*-?\d+\s*)*)\]$")
+
 
 def _guess_type(value: str) -> type:
     if value.isdigit() or (value.startswith("-") and value[1:].isdigit()):
@@ -23,7 +34,158 @@ def _guess_type(value: str) -> type:
     return str
 
 
-def convert_csv_to_idata(mcmcdata_dir: Path) -> dict[str, az.InferenceData]:
+def _convert_values(var_values: pd.Series) -> np.ndarray:
+    first_value = var_values.iloc[0]
+    dtype = _guess_type(first_value)
+
+    if dtype is bool:
+        values = var_values.map({'true': True, 'false': False, 'True': True, 'False': False}).values
+    else:
+        values = var_values.astype(dtype).values
+    return cast(np.ndarray, values)
+
+
+def _parse_indexed_name(var_name: str) -> tuple[str, tuple[int, ...]] | None:
+    matched = _INDEXED_VAR_PATTERN.match(var_name)
+    if not matched:
+        return None
+    return matched["base"], tuple(int(i) for i in matched["index"].split(","))
+
+
+class _IndexedGroup(NamedTuple):
+    base: str
+    # index <==> member var name
+    members: dict[tuple[int, ...], str]
+    dims: list[str]
+    coords: list[np.ndarray]
+    # position of every member inside the index axes, in the order of `members`
+    positions: list[tuple[int, ...]]
+
+    @property
+    def index_shape(self) -> tuple[int, ...]:
+        return tuple(len(coord) for coord in self.coords)
+
+    @property
+    def is_complete(self) -> bool:
+        return len(self.members) == np.prod(self.index_shape)
+
+
+def _indexed_groups(var_names: Iterable[str]) -> list[_IndexedGroup]:
+    var_names = list(var_names)
+    indexed: dict[str, dict[tuple[int, ...], str]] = {}
+    for var_name in var_names:
+        parsed = _parse_indexed_name(var_name)
+        if parsed is None:
+            continue
+        base, index = parsed
+        indexed.setdefault(base, {})[index] = var_name
+
+    groups: list[_IndexedGroup] = []
+    plain_names = set(var_names)
+    for base, members in indexed.items():
+        ndims = {len(index) for index in members}
+        if base in plain_names or len(ndims) != 1:
+            # a plain var with the same name or inconsistent index rank, keep them as scalars
+            continue
+        ndim = ndims.pop()
+        dim_coords = [np.unique([index[i] for index in members]) for i in range(ndim)]
+        lookup = [{coord: pos for pos, coord in enumerate(dim_coord)} for dim_coord in dim_coords]
+        positions = [tuple(lookup[i][index[i]] for i in range(ndim)) for index in members]
+        groups.append(_IndexedGroup(base, members, [f"{base}_dim_{i}" for i in range(ndim)], dim_coords, positions))
+    return groups
+
+
+def group_indexed_vars(
+    data: dict[str, np.ndarray],
+) -> tuple[dict[str, np.ndarray], dict[str, list[str]], dict[str, np.ndarray]]:
+    """Assemble scalar vars named like `a[1]`, `a[2]`, ... into one array var `a`.
+
+    All values in `data` must share the same shape, the index axes are appended after it.
+    Returns the new data, the generated dims of every grouped var and the coords of those dims.
+    Index positions that never appear are filled with NaN.
+    """
+    grouped: dict[str, np.ndarray] = {}
+    extra_dims: dict[str, list[str]] = {}
+    coords: dict[str, np.ndarray] = {}
+    consumed: set[str] = set()
+    for group in _indexed_groups(data):
+        member_values = [data[name] for name in group.members.values()]
+        shape = (*member_values[0].shape, *group.index_shape)
+        dtype = np.result_type(*member_values)
+        if group.is_complete:
+            values = np.empty(shape, dtype=dtype)
+        else:
+            values = np.full(shape, np.nan, dtype=np.result_type(dtype, np.float64))
+        for position, member_value in zip(group.positions, member_values):
+            values[(..., *position)] = member_value
+
+        grouped[group.base] = values
+        extra_dims[group.base] = group.dims
+        coords.update(zip(group.dims, group.coords))
+        consumed.update(group.members.values())
+
+    new_data = {name: values for name, values in data.items() if name not in consumed}
+    new_data.update(grouped)
+    return new_data, extra_dims, coords
+
+
+def _indexed_shape(shape: tuple[int, ...], key: tuple[int | slice, ...]) -> tuple[int, ...]:
+    return tuple(len(range(*k.indices(n))) for k, n in zip(key, shape) if isinstance(k, slice))
+
+
+class _LazyIndexedGroupArray(BackendArray):
+    """Stacks the members of an indexed group on demand, only the members selected by an indexing are read."""
+
+    def __init__(self, group: _IndexedGroup, members: list[xr.Variable]):
+        self.group = group
+        self.members = members
+        self.lead_ndim = members[0].ndim
+        self.shape = (*members[0].shape, *group.index_shape)
+        dtype = np.result_type(*(member.dtype for member in members))
+        self.dtype = dtype if group.is_complete else np.result_type(dtype, np.float64)
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC, self._raw_getitem)
+
+    def _raw_getitem(self, key: tuple[int | slice, ...]) -> np.ndarray:
+        lead_key, index_key = key[: self.lead_ndim], key[self.lead_ndim :]
+        index_shape = self.group.index_shape
+        selected = [set(range(n)[k]) if isinstance(k, slice) else {k % n} for k, n in zip(index_key, index_shape)]
+        shape = (*_indexed_shape(self.shape[: self.lead_ndim], lead_key), *index_shape)
+        values = np.empty(shape, self.dtype) if self.group.is_complete else np.full(shape, np.nan, self.dtype)
+        for position, member in zip(self.group.positions, self.members):
+            if all(pos in sel for pos, sel in zip(position, selected)):
+                values[(..., *position)] = member[lead_key].values
+        return values[(..., *index_key)]
+
+
+def group_indexed_posterior(idata: az.InferenceData, lazy: bool = False) -> az.InferenceData:
+    """Replace the `a[1]`, `a[2]`, ... vars in `idata.posterior` by multidimensional vars, in place.
+
+    With `lazy`, the grouped vars are backed by the (lazily loaded) member vars and nothing is read here.
+    """
+    posterior = idata.posterior
+    scalar_names = [str(name) for name in posterior.data_vars if posterior[name].dims == ("chain", "draw")]
+    groups = _indexed_groups(scalar_names)
+    if not groups:
+        return idata
+    new_vars: dict[str, xr.Variable] = {}
+    for group in groups:
+        dims = ("chain", "draw", *group.dims)
+        if lazy:
+            members = [posterior[name].variable for name in group.members.values()]
+            lazy_array = indexing.LazilyIndexedArray(_LazyIndexedGroupArray(group, members))
+            new_vars[group.base] = xr.Variable(dims, lazy_array)
+        else:
+            grouped, _, _ = group_indexed_vars({name: posterior[name].values for name in group.members.values()})
+            new_vars[group.base] = xr.Variable(dims, grouped[group.base])
+    consumed = [name for group in groups for name in group.members.values()]
+    coords = {dim: coord for group in groups for dim, coord in zip(group.dims, group.coords)}
+    idata.posterior = posterior.drop_vars(consumed).assign_coords(coords).assign(new_vars)
+    return idata
+
+
+def convert_csv_to_idata(mcmcdata_dir: Path, group_indexed: bool = False) -> dict[str, az.InferenceData]:
     dataframes: list[pd.DataFrame] = []
     for item in mcmcdata_dir.iterdir():
         if item.suffix != ".csv":
@@ -42,25 +204,130 @@ def convert_csv_to_idata(mcmcdata_dir: Path) -> dict[str, az.InferenceData]:
         total_iteration = 0
         for var_name in var_names:
             var_data: pd.DataFrame = cast(pd.DataFrame, chain_df[chain_df['var_name'] == var_name])
-            first_value = var_data['var_value'].iloc[0]
-            dtype = _guess_type(first_value)
-
-            if dtype is bool:
-                values = var_data['var_value'].map({'true': True, 'false': False, 'True': True, 'False': False}).values
-            else:
-                values = var_data['var_value'].astype(dtype).values
-            data_dict[cast(str, var_name)] = cast(np.ndarray, values)
+            data_dict[cast(str, var_name)] = _convert_values(var_data['var_value'])
         lenset = set(len(v) for v in data_dict.values())
         if len(lenset) != 1:
             raise ValueError(
                 f"values should have the same length: { {name: len(val) for name, val in data_dict.items()} }"
             )
         total_iteration = lenset.pop()
+        chain_name = cast(str, chain_name)
+        idatas[chain_name] = _chain_to_idata(chain_name, data_dict, total_iteration, group_indexed)
+    return idatas
 
-        coords: dict[str, Any] = {'chain': [chain_name], 'draw': np.arange(total_iteration)}
-        dims = {var_name: ['chain', 'draw'] for var_name in var_names}
-        idata = az.from_dict(  # type: ignore
-            posterior=data_dict, coords=coords, dims=dims
-        )
-        idatas[cast(str, chain_name)] = idata
+
+def _chain_to_idata(
+    chain_name: str, data_dict: dict[str, np.ndarray], total_iteration: int, group_indexed: bool
+) -> az.InferenceData:
+    coords: dict[str, Any] = {'chain': [chain_name], 'draw': np.arange(total_iteration)}
+    extra_dims: dict[str, list[str]] = {}
+    if group_indexed:
+        data_dict, extra_dims, extra_coords = group_indexed_vars(data_dict)
+        coords.update(extra_coords)
+    dims = {var_name: ['chain', 'draw', *extra_dims.get(var_name, [])] for var_name in data_dict}
+    return az.from_dict(  # type: ignore
+        posterior={var_name: values[np.newaxis] for var_name, values in data_dict.items()},
+        coords=coords,
+        dims=dims,
+    )
+
+
+def convert_draw_store_to_idata(mcmcdata_dir: Path, group_indexed: bool = False) -> dict[str, az.InferenceData]:
+    """Same as `convert_csv_to_idata`, but reads the `.draws` files written by `draw_store.DrawStoreWriter`."""
+    idatas: dict[str, az.InferenceData] = {}
+    for item in iter_draw_store_files(mcmcdata_dir):
+        logger.debug("%s", item)
+        reader = DrawStoreReader(item)
+        iterations, data_dict = reader.to_table()
+        idatas[reader.chain_name] = _chain_to_idata(reader.chain_name, data_dict, len(iterations), group_indexed)
     return idatas
+
+
+def has_draw_store(mcmcdata_dir: Path) -> bool:
+    return mcmcdata_dir.is_dir() and bool(iter_draw_store_files(mcmcdata_dir))
+
+
+def append_draws(idata: az.InferenceData, new_idata: az.InferenceData) -> None:
+    """Append the draws of `new_idata` to every group of `idata` having a `draw` dim, in place."""
+    for group in new_idata.groups():
+        new_dataset = new_idata[group]
+        if "draw" not in new_dataset.dims:
+            continue
+        if group in idata.groups():
+            setattr(idata, group, xr.concat([idata[group], new_dataset], dim="draw"))
+        else:
+            idata.add_groups({group: new_dataset})
+
+
+class McmcDataTailer:
+    """Reads what was appended to the local MCMC data files (`.csv` and `.draws`) since the previous `poll()`.
+
+    The csv rows of the last iteration of a chain are held back until every var of the chain has a value in it,
+    draw store segments only ever hold whole iterations.
+    """
+
+    def __init__(self, mcmcdata_dir: Path):
+        self.mcmcdata_dir = mcmcdata_dir
+        # file name <==> bytes (csv) or segments (draw store) already read
+        self._offsets: dict[str, int] = {}
+        self._readers: dict[str, DrawStoreReader] = {}
+        # file name <==> rows of an iteration not completely written yet
+        self._pending: dict[str, pd.DataFrame] = {}
+        # (file name, chain name) <==> vars of the chain, known from the iterations followed by another one
+        self._vars: dict[tuple[str, str], set[str]] = {}
+
+    def _read_csv(self, item: Path) -> pd.DataFrame:
+        offset = self._offsets.get(item.name, 0)
+        with open(item, "rb") as fin:
+            fin.seek(offset)
+            chunk = fin.read()
+        # a partially written trailing line is read on the next poll
+        end = chunk.rfind(b"\n") + 1
+        self._offsets[item.name] = offset + end
+        if not end:
+            return pd.DataFrame(columns=['chain_name', 'var_name', 'draw', 'var_value'])
+        return pd.read_csv(  # type: ignore
+            io.BytesIO(chunk[:end]),
+            names=['chain_name', 'var_name', 'draw', 'var_value'],
+            dtype={'chain_name': str, 'var_name': str, 'var_value': str},
+        )
+
+    def _read_draw_store(self, item: Path) -> tuple[str, np.ndarray, dict[str, np.ndarray]]:
+        if item.name not in self._readers:
+            self._readers[item.name] = DrawStoreReader(item)
+        reader = self._readers[item.name]
+        reader.refresh()
+        # segments only hold whole iterations, nothing has to be held back
+        start = self._offsets.get(item.name, 0)
+        self._offsets[item.name] = len(reader.segments)
+        return reader.chain_name, *reader.to_table(start)
+
+    def poll(self) -> dict[str, tuple[np.ndarray, dict[str, np.ndarray]]]:
+        """New complete iterations as `{chain_name: (iterations, {var_name: values})}`."""
+        new_data: dict[str, tuple[np.ndarray, dict[str, np.ndarray]]] = {}
+        for item in sorted(self.mcmcdata_dir.iterdir()):
+            if item.suffix == DRAW_STORE_SUFFIX:
+                chain_name, iterations, data = self._read_draw_store(item)
+                if len(iterations):
+                    new_data[chain_name] = (iterations, data)
+                continue
+            if item.suffix != ".csv":
+                continue
+            rows = self._read_csv(item)
+            if item.name in self._pending:
+                rows = pd.concat([self._pending.pop(item.name), rows])
+            for chain_name, chain_rows in rows.groupby('chain_name', sort=False):  # type: ignore
+                wide = chain_rows.pivot(index='draw', columns='var_name', values='var_value').sort_index()
+                # the sampler writes the iterations in order, an iteration followed by another one is complete
+                is_last = chain_rows['draw'] == wide.index[-1]
+                chain_vars = self._vars.setdefault((item.name, cast(str, chain_name)), set())
+                chain_vars.update(chain_rows.loc[~is_last, 'var_name'])
+                if not chain_vars or not chain_vars <= set(chain_rows.loc[is_last, 'var_name']):
+                    last_rows = chain_rows[is_last]
+                    self._pending[item.name] = pd.concat([self._pending.get(item.name, last_rows[:0]), last_rows])
+                    wide = wide.iloc[:-1].dropna(axis=1, how='all')
+                if wide.empty:
+                    continue
+                data = {name: _convert_values(wide[name]) for name in wide.columns}
+                new_data[cast(str, chain_name)] = (wide.index.to_numpy(), data)
+        return new_data
@@ -0,0 +1,158 @@
+import logging
+import os
+import re
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import arviz as az
+import numpy as np
+import pandas as pd
+
+from .convert_csv_to_idata import group_indexed_vars
+
+logger = logging.getLogger(__name__)
+
+# sampler columns written by CmdStan, renamed to the arviz conventions
+STAN_SAMPLE_STATS = {
+    "lp__": "lp",
+    "accept_stat__": "acceptance_rate",
+    "stepsize__": "step_size",
+    "treedepth__": "tree_depth",
+    "n_leapfrog__": "n_steps",
+    "divergent__": "diverging",
+    "energy__": "energy",
+}
+
+# internal columns written by Turing's `MCMCChains`, renamed to the arviz conventions
+TURING_SAMPLE_STATS = {
+    "lp": "lp",
+    "n_steps": "n_steps",
+    "is_accept": "is_accept",
+    "acceptance_rate": "acceptance_rate",
+    "log_density": "log_density",
+    "hamiltonian_energy": "energy",
+    "hamiltonian_energy_error": "energy_error",
+    "max_hamiltonian_energy_error": "max_energy_error",
+    "tree_depth": "tree_depth",
+    "numerical_error": "diverging",
+    "step_size": "step_size",
+    "nom_step_size": "nom_step_size",
+}
+
+# `mu.1`, `theta.1.2`
+_STAN_INDEXED_VAR_PATTERN = re.compile(r"^(?P<base>.+?)(?P<index>(?:\.\d+)+)$")
+
+
+def _stan_name_to_bracket(name: str) -> str:
+    matched = _STAN_INDEXED_VAR_PATTERN.match(name)
+    if not matched:
+        return name
+    return f"{matched['base']}[{','.join(matched['index'][1:].split('.'))}]"
+
+
+def _read_stan_header(path: Path) -> dict[str, str]:
+    config: dict[str, str] = {}
+    with open(path) as fin:
+        for line in fin:
+            if not line.startswith("#"):
+                break
+            key, sep, value = line[1:].partition("=")
+            if sep:
+                config.setdefault(key.strip(), value.replace("(Default)", "").strip())
+    return config
+
+
+def _read_wide_csv(path: Path) -> pd.DataFrame:
+    # the C parser skips the `#` comment blocks (header, adaptation info and timing) on its own
+    return pd.read_csv(path, comment="#", engine="c", skip_blank_lines=True)  # type: ignore
+
+
+def _split_columns(
+    df: pd.DataFrame, stats_mapping: dict[str, str], group_indexed: bool
+) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], dict[str, list[str]], dict[str, np.ndarray]]:
+    posterior: dict[str, np.ndarray] = {}
+    sample_stats: dict[str, np.ndarray] = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column in stats_mapping:
+            stat_name = stats_mapping[column]
+            if stat_name in ("diverging", "is_accept"):
+                values = values.astype(bool)
+            sample_stats[stat_name] = values
+        else:
+            posterior[column] = values
+    extra_dims: dict[str, list[str]] = {}
+    coords: dict[str, np.ndarray] = {}
+    if group_indexed:
+        posterior, extra_dims, coords = group_indexed_vars(posterior)
+    return posterior, sample_stats, extra_dims, coords
+
+
+def _to_idata(
+    chain_name: str,
+    df: pd.DataFrame,
+    stats_mapping: dict[str, str],
+    num_warmup: int,
+    group_indexed: bool,
+) -> az.InferenceData:
+    posterior, sample_stats, extra_dims, extra_coords = _split_columns(df, stats_mapping, group_indexed)
+    dims = {name: ['chain', 'draw', *extra_dims.get(name, [])] for name in posterior}
+    coords: dict[str, Any] = {'chain': [chain_name], **extra_coords}
+
+    def _chain_axis(data: dict[str, np.ndarray], sl: slice) -> dict[str, np.ndarray]:
+        return {name: values[np.newaxis, sl] for name, values in data.items()}
+
+    warmup = slice(0, num_warmup)
+    kept = slice(num_warmup, None)
+    kwargs: dict[str, Any] = {}
+    if num_warmup:
+        kwargs = {
+            "warmup_posterior": _chain_axis(posterior, warmup),
+            "warmup_sample_stats": _chain_axis(sample_stats, warmup),
+            "save_warmup": True,
+        }
+    return az.from_dict(  # type: ignore
+        posterior=_chain_axis(posterior, kept),
+        sample_stats=_chain_axis(sample_stats, kept),
+        coords=coords,
+        dims=dims,
+        **kwargs,
+    )
+
+
+def _load_stan_chain(path: Path, group_indexed: bool) -> tuple[str, az.InferenceData]:
+    config = _read_stan_header(path)
+    df = _read_wide_csv(path)
+    df.columns = [_stan_name_to_bracket(name) for name in df.columns]
+    save_warmup = config.get("save_warmup", "false") in ("true", "1")
+    num_warmup = int(config.get("num_warmup", "0")) if save_warmup else 0
+    # CmdStan names per-chain outputs `<name>_<chain_id>.csv`
+    chain_name = path.stem.rsplit("_", 1)[-1] if "_" in path.stem else config.get("id", path.stem)
+    logger.debug("%s: chain=%s, num_warmup=%s, shape=%s", path, chain_name, num_warmup, df.shape)
+    return chain_name, _to_idata(chain_name, df, STAN_SAMPLE_STATS, num_warmup, group_indexed)
+
+
+def load_stan_csv(
+    paths: Iterable[Path], group_indexed: bool = False, max_workers: int | None = None
+) -> dict[str, az.InferenceData]:
+    """Load CmdStan output files, one file per chain, into `{chain_name: InferenceData}`."""
+    paths = sorted(Path(path) for path in paths)
+    # the C parser releases the GIL while tokenizing, more threads than cores only adds contention
+    max_workers = max_workers or max(1, min(len(paths), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = list(executor.map(lambda path: _load_stan_chain(path, group_indexed), paths))
+    if not loaded:
+        raise RuntimeError("no stan csv files found")
+    return dict(loaded)
+
+
+def load_turing_csv(path: Path, group_indexed: bool = False) -> dict[str, az.InferenceData]:
+    """Load a wide `iteration,chain,<params...>,<internals...>` CSV exported from `MCMCChains`."""
+    df = _read_wide_csv(Path(path))
+    idatas: dict[str, az.InferenceData] = {}
+    for chain, chain_df in df.groupby("chain", sort=True):  # type: ignore
+        chain_df = chain_df.sort_values("iteration").drop(columns=["iteration", "chain"])
+        idatas[str(chain)] = _to_idata(str(chain), chain_df, TURING_SAMPLE_STATS, 0, group_indexed)
+    return idatas
@@ -0,0 +1,131 @@
+"""Shape-preserving decimation of long lines (trace plots) before they are embedded in a report, opt-in.
+
+- `minmax`: the first, min, max and last point of every bucket (M4). At one bucket per pixel column or more the
+  drawn line is the same as with all points, and it is fully vectorized.
+- `lttb`: Largest-Triangle-Three-Buckets, one point per bucket keeping the overall shape of the line with fewer
+  points, the drawn line is not the same.
+
+Only lines keep their look: markers drawn from a decimated source lose their points too, see `downsample_lines`.
+"""
+
+import logging
+from typing import Any, Literal
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DownsampleMethod = Literal["minmax", "lttb"]
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Sorted indices of the first, min, max and last point of `max_points // 4` equal buckets."""
+    size = len(y)
+    num_buckets = max(1, max_points // 4)
+    if size <= max_points:
+        return np.arange(size)
+    bucket_size = -(-size // num_buckets)
+    num_buckets = -(-size // bucket_size)
+    # pad with the last value, an argmin/argmax falling in the padding is the last point
+    buckets = np.pad(y, (0, num_buckets * bucket_size - size), mode="edge").reshape(num_buckets, bucket_size)
+    starts = np.arange(num_buckets) * bucket_size
+    indices = np.concatenate(
+        [
+            starts,
+            starts + buckets.argmin(axis=1),
+            starts + buckets.argmax(axis=1),
+            np.minimum(starts + bucket_size - 1, size - 1),
+        ]
+    )
+    return np.unique(np.minimum(indices, size - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Sorted indices of the Largest-Triangle-Three-Buckets selection of `max_points` points."""
+    size = len(x)
+    if size <= max_points or max_points < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # `max_points - 2` buckets between the first and the last point, which are always kept
+    edges = np.linspace(1, size - 1, max_points - 1).astype(int)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[: size - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[: size - 1], edges[:-1]) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # twice the area of the triangles (a, candidate, average of the next bucket)
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_lines(model: Any, max_points: int, method: DownsampleMethod = "minmax") -> int:
+    """Decimate, in place, the data sources of the `Line` glyphs under `model` longer than `max_points`.
+
+    Markers drawn at the vertices of a line (arviz trace plots) are decimated with it: the line still passes
+    through the dropped points, but their markers are no longer drawn, so the markers do not look the same. A
+    source also used by any other glyph, with a view filter or with an unsorted x is left alone. Returns the number
+    of decimated sources.
+    """
+    from bokeh.models import Circle, ColumnDataSource, GlyphRenderer, Line
+    from bokeh.models.glyphs import Marker
+
+    line_fields: dict[str, tuple[Any, set[tuple[str, str]]]] = {}
+    marker_fields: dict[str, set[tuple[str, str]]] = {}
+    excluded: set[str] = set()
+    for renderer in model.select({"type": GlyphRenderer}):
+        source = renderer.data_source
+        if not isinstance(source, ColumnDataSource):
+            continue
+        glyph = renderer.glyph
+        x_field, y_field = getattr(glyph, "x", None), getattr(glyph, "y", None)
+        if (
+            not isinstance(x_field, str)
+            or not isinstance(y_field, str)
+            or type(renderer.view.filter).__name__ != "AllIndices"
+        ):
+            excluded.add(source.id)
+        elif isinstance(glyph, Line):
+            line_fields.setdefault(source.id, (source, set()))[1].add((x_field, y_field))
+        elif isinstance(glyph, (Circle, Marker)):
+            marker_fields.setdefault(source.id, set()).add((x_field, y_field))
+        else:
+            excluded.add(source.id)
+
+    num_downsampled = 0
+    for source_id, (source, fields) in line_fields.items():
+        if source_id in excluded or not marker_fields.get(source_id, set()) <= fields:
+            continue
+        data = source.data
+        lengths = {len(values) for values in data.values()}
+        if len(lengths) != 1 or lengths.pop() <= max_points:
+            continue
+        index_sets = []
+        for x_field, y_field in sorted(fields):
+            x = np.asarray(data[x_field], dtype=float)
+            y = np.asarray(data[y_field], dtype=float)
+            if np.isnan(y).any() or np.isnan(x).any() or (np.diff(x) < 0).any():
+                break
+            if method == "lttb":
+                index_sets.append(lttb_indices(x, y, max_points))
+            else:
+                index_sets.append(minmax_indices(y, max_points))
+        else:
+            indices = np.unique(np.concatenate(index_sets))
+            source.data = {
+                name: values[indices] if isinstance(values, np.ndarray) else [values[i] for i in indices.tolist()]
+                for name, values in data.items()
+            }
+            num_downsampled += 1
+    if num_downsampled:
+        logger.debug("downsampled %d line sources to %d points", num_downsampled, max_points)
+    return num_downsampled
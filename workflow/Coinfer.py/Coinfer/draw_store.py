@@ -0,0 +1,319 @@
+"""Append-only columnar draw store, an alternative to the long `chain_name,var_name,iteration,var_value` CSV.
+
+Every chain is stored in three files next to each other in `mcmcdata/<exp_id>`:
+
+- `<chain>.draws`: a small JSON header followed by segments. A segment holds a run of whole iterations as one
+  contiguous column per var, in the var's own dtype (`<f8`, `<i8` or `|b1`), plus a column of iteration numbers.
+  Columns are 8-byte aligned and readable zero-copy with `np.memmap`.
+- `<chain>.draws.index`: one JSON line per segment, `{"draws": n, "iteration": offset, "columns": [[code, dtype,
+  offset], ...]}`. A segment is only visible to readers once its line is complete, its columns are written first.
+- `<chain>.draws.vars`: the vars dictionary, one `<var_name>\\t<kind>` per line, the line number is the code.
+  `kind` is `f`, `i` or `b`. A var missing from some iterations of a segment is stored as `<f8` with NaN there.
+
+The sampler (`Coinfer.jl`) writes the long CSV, draw stores only come from `csv_to_draw_store` or from
+`DrawStoreWriter` in Python samplers.
+"""
+
+import csv
+import json
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import quote
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DRAW_STORE_SUFFIX = ".draws"
+VARS_SUFFIX = ".vars"
+INDEX_SUFFIX = ".index"
+KIND_DTYPES = {"b": np.dtype("|b1"), "i": np.dtype("<i8"), "f": np.dtype("<f8")}
+
+_MAGIC = b"CFDRAWS2"
+_HEADER_ALIGN = 64
+_COLUMN_ALIGN = 8
+# iterations buffered by `DrawStoreWriter.append` before they are written as one segment
+_SEGMENT_DRAWS = 100
+
+
+class Segment(NamedTuple):
+    draws: int
+    iteration_offset: int
+    # var code <==> (dtype, offset)
+    columns: dict[int, tuple[np.dtype, int]]
+
+
+def _value_kind(value: Any) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "b"
+    if isinstance(value, (int, np.integer)):
+        return "i"
+    return "f"
+
+
+def _array_kind(values: np.ndarray) -> str:
+    if values.dtype.kind == "b":
+        return "b"
+    if values.dtype.kind in "iu":
+        return "i"
+    return "f"
+
+
+def _csv_value(value: str) -> int | float | bool:
+    if value.isdigit() or (value.startswith("-") and value[1:].isdigit()):
+        return int(value)
+    lower_val = value.lower()
+    if lower_val in ["true", "false"]:
+        return lower_val == "true"
+    return float(value)
+
+
+def _encode_header(chain_name: str) -> bytes:
+    header = json.dumps({"chain_name": chain_name}).encode()
+    size = len(_MAGIC) + 4 + len(header)
+    padding = -size % _HEADER_ALIGN
+    return _MAGIC + (len(header) + padding).to_bytes(4, "little") + header + b" " * padding
+
+
+def draw_store_path(directory: Path, chain_name: str) -> Path:
+    return Path(directory, quote(chain_name, safe="") + DRAW_STORE_SUFFIX)
+
+
+class DrawStoreWriter:
+    """Append draws of one chain to `<directory>/<chain>.draws`, reopening an existing store keeps appending.
+
+    `append` buffers iterations and writes them as one segment every `segment_draws` iterations and on
+    `flush()`/`close()`; `append_columns` writes a segment straight away.
+    """
+
+    def __init__(self, directory: Path, chain_name: str, segment_draws: int = _SEGMENT_DRAWS):
+        self.path = draw_store_path(directory, chain_name)
+        self.chain_name = chain_name
+        self.segment_draws = segment_draws
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.var_codes: dict[str, int] = {}
+        vars_path = Path(f"{self.path}{VARS_SUFFIX}")
+        if vars_path.is_file():
+            for code, line in enumerate(vars_path.read_text().splitlines()):
+                self.var_codes[line.rsplit("\t", 1)[0]] = code
+        if not self.path.is_file():
+            self.path.write_bytes(_encode_header(chain_name))
+        # appended to until `close`
+        self._fvars = open(vars_path, "a")  # noqa: SIM115
+        self._findex = open(f"{self.path}{INDEX_SUFFIX}", "a")  # noqa: SIM115
+        self._fdraws = open(self.path, "ab")  # noqa: SIM115
+        self._iterations: list[int] = []
+        # var code <==> values of the buffered iterations, None where the var was not given
+        self._buffer: dict[int, list[Any]] = {}
+
+    def var_code(self, var_name: str, kind: str) -> int:
+        code = self.var_codes.get(var_name)
+        if code is None:
+            code = self.var_codes[var_name] = len(self.var_codes)
+            self._fvars.write(f"{var_name}\t{kind}\n")
+        return code
+
+    def append(self, iteration: int, data: Iterable[tuple[str, Any]]):
+        """Append the values of all vars at one iteration."""
+        row = len(self._iterations)
+        self._iterations.append(iteration)
+        for var_name, value in data:
+            column = self._buffer.setdefault(self.var_code(var_name, _value_kind(value)), [])
+            column.extend([None] * (row - len(column)))
+            column.append(value)
+        if len(self._iterations) >= self.segment_draws:
+            self.flush()
+
+    def append_columns(self, iterations: np.ndarray, columns: dict[str, np.ndarray]):
+        """Append whole iterations at once, `columns` has one value per iteration for every var."""
+        self.flush()
+        codes: dict[int, np.ndarray] = {}
+        for var_name, values in columns.items():
+            values = np.asarray(values)
+            codes[self.var_code(var_name, _array_kind(values))] = values
+        self._write_segment(np.asarray(iterations), codes)
+
+    def flush(self):
+        if not self._iterations:
+            return
+        num_draws = len(self._iterations)
+        columns: dict[int, np.ndarray] = {}
+        for code, column in self._buffer.items():
+            column.extend([None] * (num_draws - len(column)))
+            if any(value is None for value in column):
+                columns[code] = np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+            else:
+                columns[code] = np.array(column)
+        self._write_segment(np.array(self._iterations), columns)
+        self._iterations = []
+        self._buffer = {}
+
+    def _write_segment(self, iterations: np.ndarray, columns: dict[int, np.ndarray]):
+        if not len(iterations):
+            return
+        offset = self._fdraws.seek(0, 2)
+        chunks = [b"\0" * (-offset % _COLUMN_ALIGN)]
+        offset += len(chunks[0])
+        entry: dict[str, Any] = {"draws": len(iterations), "iteration": offset, "columns": []}
+        for code, values in [(-1, iterations.astype("<i8")), *columns.items()]:
+            if len(values) != len(iterations):
+                raise ValueError(f"{len(values)} values for {len(iterations)} iterations")
+            if code >= 0:
+                dtype = KIND_DTYPES[_array_kind(values)]
+                entry["columns"].append([code, dtype.str, offset])
+                values = values.astype(dtype, copy=False)
+            data = values.tobytes()
+            chunks.append(data + b"\0" * (-len(data) % _COLUMN_ALIGN))
+            offset += len(chunks[-1])
+        # the dictionary and the columns must be on disk before the index line referencing them
+        self._fvars.flush()
+        self._fdraws.write(b"".join(chunks))
+        self._fdraws.flush()
+        self._findex.write(json.dumps(entry) + "\n")
+        self._findex.flush()
+
+    def close(self):
+        self.flush()
+        self._fvars.close()
+        self._findex.close()
+        self._fdraws.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_: object):
+        self.close()
+
+
+class DrawStoreReader:
+    """Read-only, zero-copy view of a `.draws` file; call `refresh()` to see segments appended since opening."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.index_path = Path(f"{self.path}{INDEX_SUFFIX}")
+        with open(self.path, "rb") as fin:
+            magic = fin.read(len(_MAGIC))
+            if magic != _MAGIC:
+                raise ValueError(f"not a draw store: {self.path}")
+            header_len = int.from_bytes(fin.read(4), "little")
+            header = json.loads(fin.read(header_len))
+        self.chain_name: str = header["chain_name"]
+        self.var_names: list[str] = []
+        self.var_kinds: list[str] = []
+        self.segments: list[Segment] = []
+        self._index_offset = 0
+        self._data: np.ndarray = np.empty(0, dtype=np.uint8)
+        self.refresh()
+
+    def refresh(self):
+        var_names: list[str] = []
+        var_kinds: list[str] = []
+        vars_path = Path(f"{self.path}{VARS_SUFFIX}")
+        if vars_path.is_file():
+            for line in vars_path.read_text().splitlines():
+                var_name, kind = line.rsplit("\t", 1)
+                var_names.append(var_name)
+                var_kinds.append(kind)
+        self.var_names, self.var_kinds = var_names, var_kinds
+
+        if not self.index_path.is_file():
+            return
+        with open(self.index_path, "rb") as fin:
+            fin.seek(self._index_offset)
+            chunk = fin.read()
+        # a partially written trailing line is read on the next refresh
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return
+        self._index_offset += end
+        for line in chunk[:end].splitlines():
+            entry = json.loads(line)
+            columns = {code: (np.dtype(dtype), offset) for code, dtype, offset in entry["columns"]}
+            self.segments.append(Segment(entry["draws"], entry["iteration"], columns))
+        self._data = np.asarray(np.memmap(self.path, dtype=np.uint8, mode="r"))
+
+    def __len__(self) -> int:
+        return sum(segment.draws for segment in self.segments)
+
+    def _view(self, dtype: np.dtype, offset: int, count: int) -> np.ndarray:
+        return self._data[offset : offset + count * dtype.itemsize].view(dtype)
+
+    def iterations(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Iteration numbers of the segments `start:stop`."""
+        views = [self._view(np.dtype("<i8"), s.iteration_offset, s.draws) for s in self.segments[start:stop]]
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views) if views else np.empty(0, dtype=np.int64)
+
+    def column(self, code: int, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Values of a var in the segments `start:stop`, NaN where the var is missing.
+
+        The view of a single segment is zero-copy, several segments are concatenated.
+        """
+        views = []
+        for segment in self.segments[start:stop]:
+            if code in segment.columns:
+                views.append(self._view(*segment.columns[code], segment.draws))
+            else:
+                views.append(np.full(segment.draws, np.nan))
+        if len(views) == 1:
+            return views[0]
+        return self.decode(code, np.concatenate(views)) if views else np.empty(0)
+
+    def decode(self, code: int, values: np.ndarray) -> np.ndarray:
+        """Cast values upcast to float64 (by a var missing from some segments) back to the kind of the var."""
+        if values.dtype.kind != "f" or np.isnan(values).any():
+            return values
+        kind = self.var_kinds[code]
+        if kind == "b":
+            return values != 0
+        if kind == "i":
+            return values.astype(np.int64)
+        return values
+
+    def to_table(self, start: int = 0, stop: int | None = None) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """`(iterations, {var_name: values})` of the segments `start:stop`, one value per iteration."""
+        present = sorted({code for segment in self.segments[start:stop] for code in segment.columns})
+        data = {self.var_names[code]: self.column(code, start, stop) for code in present}
+        return self.iterations(start, stop), data
+
+
+def iter_draw_store_files(directory: Path) -> list[Path]:
+    return sorted(item for item in Path(directory).iterdir() if item.suffix == DRAW_STORE_SUFFIX)
+
+
+def csv_to_draw_store(csv_file: Path, directory: Path) -> list[Path]:
+    """Append the rows of a long-format MCMC CSV file to the draw stores of its chains."""
+    # chain name <==> iteration <==> [(var name, value)]
+    rows: dict[str, dict[int, list[tuple[str, Any]]]] = {}
+    with open(csv_file, newline="") as fin:
+        for chain_name, var_name, iteration, var_value in csv.reader(fin):
+            rows.setdefault(chain_name, {}).setdefault(int(iteration), []).append((var_name, _csv_value(var_value)))
+    paths: list[Path] = []
+    for chain_name, iterations in rows.items():
+        with DrawStoreWriter(directory, chain_name, segment_draws=max(len(iterations), 1)) as writer:
+            for iteration, data in iterations.items():
+                writer.append(iteration, data)
+        paths.append(writer.path)
+    return paths
+
+
+def draw_store_to_csv(store_file: Path, csv_file: Path):
+    """Write a draw store back as a long-format MCMC CSV file, the format `Coinfer.jl` writes."""
+    reader = DrawStoreReader(store_file)
+    formatters = {"b": lambda v: "true" if v else "false", "i": lambda v: int(v), "f": lambda v: v}
+    with open(csv_file, "w", newline="") as fout:
+        writer = csv.writer(fout)
+        for index in range(len(reader.segments)):
+            iterations, data = reader.to_table(index, index + 1)
+            codes = {name: code for code, name in enumerate(reader.var_names)}
+            columns = [(name, reader.var_kinds[codes[name]], values.tolist()) for name, values in data.items()]
+            for row, iteration in enumerate(iterations.tolist()):
+                for var_name, kind, values in columns:
+                    # NaN stands for a var missing at this iteration, unless the var is a float
+                    if kind != "f" and values[row] != values[row]:
+                        continue
+                    writer.writerow([reader.chain_name, var_name, iteration, formatters[kind](values[row])])
+    logger.info("Converted %s to %s", store_file, csv_file)
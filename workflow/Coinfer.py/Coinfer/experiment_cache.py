@@ -0,0 +1,266 @@
+"""On-disk cache of downloaded experiment data, keyed by experiment id.
+
+Layout of the cache directory:
+
+- `<experiment_id>/*.nc`: the netCDF files of every chain, as extracted from `get-arviz-data`.
+- `<experiment_id>/meta.json`: the `ETag`/`Last-Modified` of the download, the experiment status at download
+  time when the server sent neither, the entry size and the last access time used for LRU eviction.
+- `.<experiment_id>.lock`: taken exclusively to download, update or evict the entry, shared while its files are
+  read. Data loaded lazily keeps the shared lock until the experiment is closed, see `ExperimentCache.hold`.
+
+The cache is per user and per node (`~/.cache/coinfer/experiments`), a cached entry is only served after the
+server accepted a conditional request for it with the credentials of the caller.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import IO, TypedDict
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# experiments in these states will not produce new draws
+FINISHED_STATUSES = ("SAMPLE_FIN",)
+DEFAULT_MAX_BYTES = 10 * 1024**3
+
+_META_FILE = "meta.json"
+
+
+class _HeldLock:
+    """The file holding the shared lock of lazily loaded data, and the number of its holders in the process."""
+
+    def __init__(self, flock: IO[str]):
+        self.flock = flock
+        self.holders = 0
+
+
+# lock file <==> its held lock, one per entry and process: a second `flock` of the same process on another file
+# description would wait for the first one
+_held_locks: dict[Path, _HeldLock] = {}
+_held_locks_mutex = threading.Lock()
+
+
+class CacheEntry(TypedDict, total=False):
+    etag: str
+    last_modified: str
+    status: str
+    size: int
+    last_access: float
+
+
+def _default_cache_dir() -> Path:
+    if cache_dir := os.environ.get("COINFER_EXPERIMENT_CACHE_DIR"):
+        return Path(cache_dir)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache", "coinfer", "experiments")
+
+
+def _flock(flock: IO[str], operation: int, experiment_id: str):
+    assert fcntl
+    try:
+        fcntl.flock(flock, operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info("waiting for the cache entry of experiment %s, in use by another process", experiment_id)
+        fcntl.flock(flock, operation)
+
+
+def _release(lock_file: Path, held: _HeldLock):
+    with _held_locks_mutex:
+        held.holders -= 1
+        if held.holders == 0:
+            del _held_locks[lock_file]
+            # closing the last file description of the lock releases it
+            held.flock.close()
+
+
+def _dir_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+
+class ExperimentCache:
+    def __init__(self, cache_dir: Path | None = None, max_bytes: int | None = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else _default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("COINFER_EXPERIMENT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        # a budget of 0 disables the cache
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def entry_dir(self, experiment_id: str) -> Path:
+        return self.cache_dir / experiment_id
+
+    def get(self, experiment_id: str) -> CacheEntry | None:
+        if not self.enabled:
+            return None
+        meta_file = self.entry_dir(experiment_id) / _META_FILE
+        if not meta_file.is_file():
+            return None
+        try:
+            return json.loads(meta_file.read_text())
+        except (OSError, json.JSONDecodeError):
+            logger.warning("broken experiment cache entry: %s", meta_file)
+            return None
+
+    def nc_files(self, experiment_id: str) -> list[Path]:
+        return sorted(self.entry_dir(experiment_id).glob("*.nc"))
+
+    def touch(self, experiment_id: str):
+        entry = self.get(experiment_id)
+        if entry is not None:
+            entry["last_access"] = time.time()
+            self._write_meta(self.entry_dir(experiment_id), entry)
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry | None) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _lock_file(self, experiment_id: str) -> Path:
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        return self.cache_dir / f".{experiment_id}.lock"
+
+    @contextlib.contextmanager
+    def lock(self, experiment_id: str, shared: bool = False) -> Iterator[None]:
+        """Hold the lock of an entry, `shared` to only read its files."""
+        if not self.enabled or fcntl is None:
+            yield
+            return
+        lock_file = self._lock_file(experiment_id)
+        with _held_locks_mutex:
+            held = _held_locks.get(lock_file)
+            if held:
+                # not released while in use here
+                held.holders += 1
+        flock = held.flock if held else open(lock_file, "a")  # noqa: SIM115, closed below
+        try:
+            _flock(flock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX, experiment_id)
+            yield
+        finally:
+            if held:
+                # back to the lock of the lazily loaded data
+                fcntl.flock(flock, fcntl.LOCK_SH)
+                _release(lock_file, held)
+            else:
+                fcntl.flock(flock, fcntl.LOCK_UN)
+                flock.close()
+
+    def hold(self, experiment_id: str) -> Callable[[], None]:
+        """Keep a shared lock on an entry for data read lazily from its files, until the returned callable is called.
+
+        The entry is then neither updated nor evicted by other processes. Releasing twice is harmless.
+        """
+        if not self.enabled or fcntl is None:
+            return lambda: None
+        lock_file = self._lock_file(experiment_id)
+        with _held_locks_mutex:
+            held = _held_locks.get(lock_file)
+            if held:
+                held.holders += 1
+        if held is None:
+            # waited for outside the mutex, the entry may be downloaded by another process meanwhile
+            flock = open(lock_file, "a")  # noqa: SIM115, closed by the last release
+            _flock(flock, fcntl.LOCK_SH, experiment_id)
+            with _held_locks_mutex:
+                held = _held_locks.get(lock_file)
+                if held:
+                    # another thread took it meanwhile
+                    flock.close()
+                else:
+                    held = _held_locks[lock_file] = _HeldLock(flock)
+                held.holders += 1
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                _release(lock_file, held)
+
+        return release
+
+    @contextlib.contextmanager
+    def staging(self, experiment_id: str) -> Iterator[Path]:
+        """A scratch directory for a download, on the same filesystem as the cache so `commit` is a rename."""
+        if self.enabled:
+            self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            parent = self.cache_dir.as_posix()
+        else:
+            parent = None
+        staging_dir = Path(tempfile.mkdtemp(prefix=f".{experiment_id}-", dir=parent))
+        try:
+            yield staging_dir
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def commit(self, experiment_id: str, staging_dir: Path, entry: CacheEntry):
+        if not self.enabled:
+            return
+        entry["size"] = _dir_size(staging_dir)
+        entry["last_access"] = time.time()
+        self._write_meta(staging_dir, entry)
+        target = self.entry_dir(experiment_id)
+        if target.exists():
+            shutil.rmtree(target)
+        os.rename(staging_dir, target)
+        logger.info("cached experiment %s (%d bytes) in %s", experiment_id, entry["size"], target)
+        self.evict(keep=experiment_id)
+
+    def evict(self, keep: str = ""):
+        """Remove the least recently used entries over the size budget, except those being read or written."""
+        entries: list[tuple[float, int, str]] = []
+        for item in self.cache_dir.iterdir():
+            if not item.is_dir() or item.name.startswith("."):
+                continue
+            entry = self.get(item.name)
+            if entry is None:
+                continue
+            entries.append((entry.get("last_access", 0.0), entry.get("size", 0), item.name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, experiment_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if experiment_id == keep:
+                continue
+            if self._try_remove(experiment_id):
+                logger.info("evicted experiment %s (%d bytes) from cache", experiment_id, size)
+                total -= size
+
+    def _try_remove(self, experiment_id: str) -> bool:
+        if fcntl is None:
+            shutil.rmtree(self.entry_dir(experiment_id), ignore_errors=True)
+            return True
+        with open(self._lock_file(experiment_id), "a") as flock:
+            try:
+                fcntl.flock(flock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.debug("experiment %s is in use, not evicted", experiment_id)
+                return False
+            try:
+                shutil.rmtree(self.entry_dir(experiment_id), ignore_errors=True)
+            finally:
+                fcntl.flock(flock, fcntl.LOCK_UN)
+        return True
+
+    @staticmethod
+    def _write_meta(entry_dir: Path, entry: CacheEntry):
+        tmp_file = entry_dir / f".{_META_FILE}.tmp"
+        tmp_file.write_text(json.dumps(entry))
+        os.replace(tmp_file, entry_dir / _META_FILE)
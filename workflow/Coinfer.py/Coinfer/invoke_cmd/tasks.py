@@ -40,14 +40,22 @@ def sample(c):
     sample_impl()
 
 
-@task(aliases=['analyse', 'analysis', 'analyzer', 'analyser'])
-def analyze(c):
+@task(
+    aliases=['analyse', 'analysis', 'analyzer', 'analyser'],
+    help={
+        'watch': 'Run the analyzer again whenever new MCMC data arrives, until the sampling is finished.',
+        'debounce': 'With --watch, seconds without new data before running.',
+        'min_interval': 'With --watch, minimum seconds between the starts of two runs.',
+        'max_wait': 'With --watch, maximum seconds a change waits for its run while new data keeps arriving.',
+    },
+)
+def analyze(c, watch: bool = False, debounce: float = 5.0, min_interval: float = 30.0, max_wait: float = 60.0):
     """Run the analyze script on the MCMC data."""
     sys.path.append('client/Coinfer.py/')
 
     from Coinfer.analyze_cmd_impl import analyze as analyze_impl
 
-    analyze_impl()
+    analyze_impl(watch=watch, debounce=debounce, min_interval=min_interval, max_wait=max_wait)
 
 
 @task(aliases=['auth'], help={'token': 'The token you want to set.'})
@@ -60,6 +68,16 @@ def login(c, token: str = ""):
     login_impl(token)
 
 
+@task
+def worker(c):
+    """Start a warm worker: data.py and the analyzer then run in forks of it, with their heavy imports done."""
+    sys.path.append('client/Coinfer.py/')
+
+    from Coinfer.warm_worker import worker as worker_impl
+
+    worker_impl()
+
+
 @task
 def clean(c):
     """Clean up the generated data."""
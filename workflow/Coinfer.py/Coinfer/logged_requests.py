@@ -2,7 +2,9 @@ import json
 import logging
 import random
 import string
+import threading
 import time
+from collections.abc import Iterable
 from enum import Flag, auto
 from typing import Any, TypedDict, Unpack
 
@@ -49,7 +51,7 @@ class _DoParamType(TypedDict, total=False):
     headers: dict[str, str]
     json: dict[str, Any]
     timeout: float | int
-    data: dict[str, Any] | str
+    data: dict[str, Any] | str | Iterable[bytes]
     params: dict[str, Any]
     stream: bool
 
@@ -57,8 +59,34 @@ class _DoParamType(TypedDict, total=False):
 class Req:
     def __init__(self):
         self.session = requests_lib.Session()
-        self.errmsg = ""
-        self.reqid = ""
+        # the session is shared by threads (prefetch, concurrent downloads), the result of the last request is not
+        self._local = threading.local()
+        self._pool_maxsize = requests_lib.adapters.DEFAULT_POOLSIZE
+
+    @property
+    def errmsg(self) -> str:
+        return getattr(self._local, "errmsg", "")
+
+    @errmsg.setter
+    def errmsg(self, errmsg: str):
+        self._local.errmsg = errmsg
+
+    @property
+    def reqid(self) -> str:
+        return getattr(self._local, "reqid", "")
+
+    @reqid.setter
+    def reqid(self, reqid: str):
+        self._local.reqid = reqid
+
+    def set_pool_size(self, pool_maxsize: int):
+        """Keep up to `pool_maxsize` connections per host, for that many concurrent requests."""
+        if pool_maxsize <= self._pool_maxsize:
+            return
+        self._pool_maxsize = pool_maxsize
+        adapter = requests_lib.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def get(self, *args: str, **kwargs: Unpack[_DoParamType]):
         return self._do("get", *args, **kwargs)
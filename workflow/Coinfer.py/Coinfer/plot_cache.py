@@ -0,0 +1,145 @@
+"""On-disk cache of serialized plots (`json_item` output), so rerunning an analyzer only rebuilds changed figures.
+
+A plot is cached when the analyzer gives it a key, the data and parameters the figure is built from:
+`(plot_func, chain, var_name, figure, key)`. The entry is named by a hash of the plot function name, chain, var,
+the fingerprint of the key, the render options and the bokeh version. Entries are plain JSON files in
+`<COINFER_ANALYZE_OUTPUT_DIR>/.plot_cache`, the least recently used ones are evicted beyond the byte budget.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024**3
+PLOT_CACHE_DIR = ".plot_cache"
+
+# bumped when the cached content changes for the same key
+_FORMAT_VERSION = 1
+
+
+def _update(digest: "hashlib._Hash", value: Any):
+    # every value is prefixed by a type tag, so different structures never hash the same
+    if value is None or isinstance(value, (bool, int, float, complex, np.generic)):
+        digest.update(f"s{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, str):
+        digest.update(f"u{len(value)}:".encode())
+        digest.update(value.encode())
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        digest.update(f"b{len(value)}:".encode())
+        digest.update(value)
+    elif isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            _update(digest, value.tolist())
+            return
+        digest.update(f"a{value.dtype.str}{value.shape}:".encode())
+        digest.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, Mapping):
+        digest.update(f"m{len(value)}:".encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"l{len(value)}:".encode())
+        for item in value:
+            _update(digest, item)
+    elif hasattr(value, "to_numpy"):  # pandas and xarray objects
+        _update(digest, value.to_numpy())
+    else:
+        raise TypeError(f"cannot fingerprint a plot key of type {type(value).__name__}")
+
+
+def fingerprint(value: Any) -> str:
+    """Hash of a plot key: arrays (by content), mappings, sequences, strings and numbers, nested."""
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, value)
+    return digest.hexdigest()
+
+
+def _default_cache_dir() -> Path | None:
+    if output_dir := os.environ.get("COINFER_ANALYZE_OUTPUT_DIR"):
+        return Path(output_dir, PLOT_CACHE_DIR)
+    return None
+
+
+class PlotCache:
+    def __init__(self, cache_dir: Path | None = None, max_bytes: int | None = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else _default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("COINFER_PLOT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        # a budget of 0 disables the cache
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None and self.max_bytes > 0
+
+    def key(self, plot: tuple[Any, ...], options: tuple[Any, ...]) -> str | None:
+        """The cache key of a `(plot_func, chain, var_name, figure, key)` tuple, None if it is not cached."""
+        if not self.enabled or len(plot) < 5 or plot[4] is None:
+            return None
+        from bokeh import __version__ as bokeh_version
+
+        plot_func, chain, var_name, _, key = plot[:5]
+        return fingerprint((_FORMAT_VERSION, bokeh_version, plot_func, chain, var_name, options, key))
+
+    def _path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / f"{key}.json"
+
+    def contains(self, key: str | None) -> bool:
+        return key is not None and self._path(key).is_file()
+
+    def get(self, key: str | None) -> Any | None:
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            plot_json = json.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("broken plot cache entry: %s", path)
+            return None
+        # the access time used for eviction, `atime` is often not updated
+        os.utime(path)
+        return plot_json
+
+    def put(self, key: str | None, plot_json: Any):
+        if key is None:
+            return
+        assert self.cache_dir is not None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "w") as fout:
+                json.dump(plot_json, fout)
+            os.replace(tmp_name, self._path(key))
+        finally:
+            Path(tmp_name).unlink(missing_ok=True)
+
+    def evict(self):
+        if not self.enabled or not self.cache_dir.is_dir():
+            return
+        entries: list[tuple[float, int, Path]] = []
+        for item in self.cache_dir.glob("*.json"):
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, item))
+        total = sum(size for _, size, _ in entries)
+        for _, size, item in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            item.unlink(missing_ok=True)
+            total -= size
+        logger.debug("plot cache: %d entries, %d bytes", len(entries), total)
@@ -0,0 +1,128 @@
+"""Compact encodings of bokeh `json_item` output for embedding in analyzer reports.
+
+Bokeh serializes numpy columns as `{"type": "ndarray", "array": {"type": "bytes", "data": <base64>}, ...}`.
+`pack_buffers` moves those bytes out of the JSON into one binary blob per plot (`data` becomes
+`[offset, length, itemsize]` into the blob), which can be gzip compressed as raw bytes instead of as base64 text.
+For compression the bytes of every array are shuffled first: byte 0 of all items, then byte 1 and so on, which
+puts the slowly varying sign/exponent bytes of floats next to each other (evenly spaced axes shrink ~100x).
+The report script puts the bytes back before handing the item to `Bokeh.embed.embed_item`.
+
+Split reports keep the plot JSON out of the page: `write_plot_group` writes the items of one plot group as a gzip
+compressed JSON object in `PLOT_DATA_DIR` next to the page, fetched when a plot of the group is scrolled into view.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+# the data files of split reports, relative to the report page
+PLOT_DATA_DIR = "plot_data"
+
+
+def binary_columns(model: Any):
+    """Turn numeric list columns of the data sources under `model` into numpy arrays, bokeh sends those as bytes."""
+    from bokeh.models import ColumnDataSource
+
+    for source in model.select({"type": ColumnDataSource}):
+        updates: dict[str, np.ndarray] = {}
+        for name, values in source.data.items():
+            if not isinstance(values, (list, tuple)) or not values:
+                continue
+            try:
+                array = np.asarray(values)
+            except ValueError:  # ragged, e.g. `multi_line` xs
+                continue
+            if array.ndim == 1 and array.dtype.kind in "iuf":
+                updates[name] = array
+        if updates:
+            source.data.update(updates)
+
+
+def _shuffle(raw: bytes, itemsize: int) -> bytes:
+    if itemsize <= 1 or len(raw) % itemsize:
+        return raw
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def pack_buffers(plot_json: Any, shuffle: bool = False) -> tuple[Any, bytes]:
+    """Replace the base64 `bytes` payloads of `plot_json` (in place) by `[offset, length, itemsize]` into the blob.
+
+    `itemsize` is 1 for bytes stored as is, otherwise the bytes are shuffled by items of that size.
+    """
+    chunks: list[bytes] = []
+    offset = 0
+
+    def _pack(node: dict[str, Any], itemsize: int):
+        nonlocal offset
+        raw = base64.b64decode(node["data"])
+        if not shuffle or len(raw) % itemsize:
+            itemsize = 1
+        node["data"] = [offset, len(raw), itemsize]
+        chunks.append(_shuffle(raw, itemsize))
+        offset += len(raw)
+
+    def _walk(node: Any, itemsize: int):
+        if isinstance(node, (list, tuple)):  # map entries are `(key, value)` tuples
+            for child in node:
+                _walk(child, 1)
+        elif isinstance(node, dict):
+            if node.get("type") == "bytes" and isinstance(node.get("data"), str):
+                _pack(node, itemsize)
+                return
+            # `ndarray` and `typed_array` carry the dtype of their `array` child
+            child_itemsize = np.dtype(node["dtype"]).itemsize if isinstance(node.get("dtype"), str) else 1
+            for key, child in node.items():
+                _walk(child, child_itemsize if key == "array" else 1)
+
+    _walk(plot_json, 1)
+    return plot_json, b"".join(chunks)
+
+
+def script_json(plot_json: Any) -> str:
+    """JSON text safe inside `<script type="application/json">`, read back with `textContent` and `JSON.parse`."""
+    # `<` only occurs inside JSON strings, where the escape is equivalent
+    return json.dumps(plot_json).replace("<", "\\u003c")
+
+
+def encode_blob(blob: bytes, compress: bool) -> tuple[str, str]:
+    """Base64 text of the blob and its encoding (`gzip` or `identity`)."""
+    if compress:
+        return base64.b64encode(gzip.compress(blob, compresslevel=6)).decode(), "gzip"
+    return base64.b64encode(blob).decode(), "identity"
+
+
+def write_plot_group(directory: Path, items: Iterable[tuple[str, Any]]) -> str:
+    """Write `(plot_id, item)` pairs as the gzip compressed JSON object `{plot_id: item, ...}` in `directory`.
+
+    The items are compressed one at a time as they come. The file is named by the hash of its content, so the data
+    files of several pages never overwrite each other. Returns the file name.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fout, gzip.GzipFile(fileobj=fout, mode="wb", compresslevel=6, mtime=0) as gz:
+            separator = "{"
+            for plot_id, item in items:
+                chunk = f"{separator}{json.dumps(plot_id)}:{json.dumps(item)}".encode()
+                digest.update(chunk)
+                gz.write(chunk)
+                separator = ","
+            chunk = b"{}" if separator == "{" else b"}"
+            digest.update(chunk)
+            gz.write(chunk)
+        filename = f"{digest.hexdigest()[:32]}.json.gz"
+        # served next to the page, `mkstemp` creates it readable by the owner only
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, directory / filename)
+    finally:
+        Path(tmp_name).unlink(missing_ok=True)
+    return filename
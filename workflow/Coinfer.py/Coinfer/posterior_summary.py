@@ -0,0 +1,176 @@
+"""Batched posterior summary, the statistics of `arviz.summary` computed for all parameters at once.
+
+Every function takes the draws as a `(chain, draw, param)` array and returns one value per param.
+The algorithms follow arviz (rank-normalized split R-hat and bulk/tail ESS of Vehtari et al. 2021,
+Geyer's initial monotone sequence on FFT autocovariances), so the results match `arviz.summary` to
+floating point tolerance. Parameters are processed in column blocks to bound the memory of the FFT.
+"""
+
+import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.special import ndtri
+from scipy.stats import rankdata
+
+# number of float64 elements of the padded FFT input processed at a time
+_BLOCK_ELEMENTS = 1 << 24
+
+
+def _split_chains(ary: np.ndarray) -> np.ndarray:
+    half = ary.shape[1] // 2
+    return np.concatenate([ary[:, :half], ary[:, ary.shape[1] - half :]], axis=0)
+
+
+def _z_scale(ary: np.ndarray) -> np.ndarray:
+    n_chain, n_draw, n_param = ary.shape
+    flat = ary.reshape(n_chain * n_draw, n_param)
+    rank = rankdata(flat, method="average", axis=0)
+    # Blom's fractional offset c = 3/8
+    return ndtri((rank - 3 / 8) / (flat.shape[0] + 1 / 4)).reshape(ary.shape)
+
+
+def _autocov(ary: np.ndarray) -> np.ndarray:
+    n_draw = ary.shape[1]
+    centered = ary - ary.mean(axis=1, keepdims=True)
+    freq = rfft(centered, n=next_fast_len(2 * n_draw), axis=1, workers=-1)
+    freq *= np.conjugate(freq)
+    return irfft(freq, axis=1, n=next_fast_len(2 * n_draw), workers=-1)[:, :n_draw] / n_draw
+
+
+def _ess_block(ary: np.ndarray) -> np.ndarray:
+    n_chain, n_draw, n_param = ary.shape
+    acov = _autocov(ary)
+    mean_var = acov[:, 0].mean(axis=0) * n_draw / (n_draw - 1.0)
+    var_plus = mean_var * (n_draw - 1.0) / n_draw
+    if n_chain > 1:
+        var_plus = var_plus + ary.mean(axis=1).var(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = 1.0 - (mean_var - acov.mean(axis=0)) / var_plus
+    rho[0] = 1.0
+
+    # Geyer's initial positive sequence stops at the first non-positive sum of an (even, odd) lag pair
+    n_pairs = n_draw // 2
+    pair_sums = rho[0 : 2 * n_pairs : 2] + rho[1 : 2 * n_pairs : 2]
+    stop = pair_sums <= 0
+    stop[max(0, -(-(n_draw - 4) // 2)) :] = True
+    last_pair = np.argmax(stop, axis=0)
+    columns = np.arange(n_param)
+    # the initial monotone sequence is a running minimum of the pair sums
+    monotone = np.minimum.accumulate(pair_sums, axis=0)
+    kept = np.arange(n_pairs)[:, np.newaxis] < last_pair
+    last_even = rho[2 * last_pair, columns]
+    last_even = np.where((last_even > 0) | (pair_sums[last_pair, columns] >= 0), last_even, 0.0)
+    tau = -1.0 + 2.0 * np.where(kept, monotone, 0.0).sum(axis=0) + last_even
+
+    size = n_chain * n_draw
+    ess = size / np.maximum(tau, 1 / np.log10(size))
+    ess[np.isnan(rho).any(axis=0)] = np.nan
+    # constant draws
+    ess[np.ptp(ary, axis=(0, 1)) < np.finfo(float).resolution] = size
+    return ess
+
+
+def ess(ary: np.ndarray) -> np.ndarray:
+    """Effective sample size of every param, `(chain, draw, param)` -> `(param,)`."""
+    ary = np.asarray(ary, dtype=float)
+    n_chain, n_draw, n_param = ary.shape
+    block = max(1, _BLOCK_ELEMENTS // (n_chain * next_fast_len(2 * n_draw)))
+    result = np.empty(n_param)
+    for start in range(0, n_param, block):
+        result[start : start + block] = _ess_block(ary[:, :, start : start + block])
+    return result
+
+
+def _rhat(ary: np.ndarray) -> np.ndarray:
+    n_draw = ary.shape[1]
+    between_chain_variance = n_draw * ary.mean(axis=1).var(axis=0, ddof=1)
+    within_chain_variance = ary.var(axis=1, ddof=1).mean(axis=0)
+    return np.sqrt((between_chain_variance / within_chain_variance + n_draw - 1) / n_draw)
+
+
+def quantile(ordered: np.ndarray, probs: list[float] | tuple[float, ...]) -> np.ndarray:
+    """R type 7 quantiles of sorted `(sample, param)` draws, computed the way arviz (`mquantiles`) does.
+
+    The interpolation is not the one of `np.quantile`, the last bit differs and with tied draws (rejected
+    proposals) that changes which draws fall below the quantile of `ess_tail`.
+    """
+    size = ordered.shape[0]
+    aleph = size * np.asarray(probs, dtype=float) + (1 - np.asarray(probs, dtype=float))
+    k = np.floor(aleph.clip(1, size - 1)).astype(int)
+    gamma = (aleph - k).clip(0, 1)[:, np.newaxis]
+    return (1.0 - gamma) * ordered[k - 1] + gamma * ordered[k]
+
+
+def hdi(ordered: np.ndarray, hdi_prob: float) -> tuple[np.ndarray, np.ndarray]:
+    """Narrowest interval holding `hdi_prob` of the sorted `(sample, param)` draws."""
+    size = ordered.shape[0]
+    interval_idx_inc = int(np.floor(hdi_prob * size))
+    if interval_idx_inc >= size:
+        raise ValueError("too few draws for the hdi interval")
+    widths = ordered[interval_idx_inc:] - ordered[: size - interval_idx_inc]
+    lower_idx = np.argmin(widths, axis=0)
+    columns = np.arange(ordered.shape[1])
+    return ordered[lower_idx, columns], ordered[lower_idx + interval_idx_inc, columns]
+
+
+def summarize(ary: np.ndarray, hdi_prob: float = 0.94, quantiles: tuple[float, ...] = ()) -> dict[str, np.ndarray]:
+    """`arviz.summary` columns (plus optional quantiles) for a `(chain, draw, param)` array, unrounded."""
+    ary = np.asarray(ary, dtype=float)
+    n_chain, n_draw, n_param = ary.shape
+    flat = ary.reshape(n_chain * n_draw, n_param)
+    alpha = 1 - hdi_prob
+    result: dict[str, np.ndarray] = {"mean": flat.mean(axis=0), "sd": flat.std(axis=0, ddof=1)}
+    ordered = np.sort(flat, axis=0)
+    lower, higher = hdi(ordered, hdi_prob)
+    result[f"hdi_{100 * alpha / 2:g}%"] = lower
+    result[f"hdi_{100 * (1 - alpha / 2):g}%"] = higher
+    for q, values in zip(quantiles, quantile(ordered, quantiles)):
+        result[f"q_{100 * q:g}%"] = values
+
+    diagnostics = ("mcse_mean", "mcse_sd", "ess_bulk", "ess_tail", "r_hat")
+    for name in diagnostics:
+        result[name] = np.full(n_param, np.nan)
+    # like arviz, params with NaN draws get no diagnostics
+    valid = ~np.isnan(flat).any(axis=0)
+    if n_draw < 4 or not valid.any():
+        return result
+    diagnostics_values = _diagnostics(ary[:, :, valid], ordered[:, valid], result["mean"][valid], result["sd"][valid])
+    for name, values in diagnostics_values.items():
+        result[name][valid] = values
+    return result
+
+
+def _diagnostics(ary: np.ndarray, ordered: np.ndarray, mean: np.ndarray, sd: np.ndarray) -> dict[str, np.ndarray]:
+    n_chain, n_draw, n_param = ary.shape
+    flat = ary.reshape(n_chain * n_draw, n_param)
+    result: dict[str, np.ndarray] = {}
+    sims_c2 = (flat - mean) ** 2
+    evar = sims_c2.mean(axis=0)
+    split = _split_chains(ary)
+    z_split = _z_scale(split)
+    q05, q95 = quantile(ordered, [0.05, 0.95])
+    # one batched ESS call for every diagnostic, stacked along the param axis
+    ess_all = ess(
+        np.concatenate(
+            [
+                split,
+                _split_chains(sims_c2.reshape(ary.shape)),
+                z_split,
+                _split_chains(ary <= q05),
+                _split_chains(ary <= q95),
+            ],
+            axis=2,
+        )
+    ).reshape(5, n_param)
+    ess_mean, ess_sims, ess_bulk, ess_q05, ess_q95 = ess_all
+
+    result["mcse_mean"] = np.sqrt(sd**2 / ess_mean)
+    varvar = ((sims_c2**2).mean(axis=0) - evar**2) / ess_sims
+    result["mcse_sd"] = np.sqrt(varvar / evar / 4)
+    result["ess_bulk"] = ess_bulk
+    result["ess_tail"] = np.minimum(ess_q05, ess_q95)
+    if n_chain > 1:
+        folded = _z_scale(_split_chains(np.abs(ary - np.median(flat, axis=0))))
+        result["r_hat"] = np.maximum(_rhat(z_split), _rhat(folded))
+    else:
+        result["r_hat"] = np.full(n_param, np.nan)
+    return result
@@ -0,0 +1,241 @@
+"""Sampling of the CPU, memory, threads and I/O of a process tree from `/proc`, to size the sampler and analyzer tasks.
+
+`ResourceMonitor.start(pid)` reads, every `COINFER_RESOURCE_SAMPLE_SECONDS` (default 1, 0 disables it) seconds,
+`/proc/<pid>/stat` and `/proc/<pid>/io` of the process and of all its descendants, and appends one JSON line per
+sample to its output file (`resources.jsonl` next to the outputs of the run):
+
+    {"t": 12.0, "cpu_percent": 180.5, "rss_bytes": ..., "num_threads": 14, "num_processes": 2,
+     "read_bytes": ..., "write_bytes": ...}
+
+`cpu_percent` is relative to one CPU, I/O bytes are cumulative: everything the processes read and wrote (files,
+pipes and sockets), including the processes which have exited since. `summary()` gives the peak and average
+figures of the run. Without `/proc` (macOS) nothing is recorded.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TypedDict
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_FILE = "resources.jsonl"
+# warn when the tree gets this close to the memory limit of the container
+_MEMORY_WARNING_RATIO = 0.9
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class ResourceSample(TypedDict):
+    t: float
+    cpu_percent: float
+    rss_bytes: int
+    num_threads: int
+    num_processes: int
+    read_bytes: int
+    write_bytes: int
+
+
+class ResourceSummary(TypedDict):
+    duration_seconds: float
+    num_samples: int
+    num_cpus: int
+    memory_limit_bytes: int
+    cpu_seconds: float
+    cpu_percent_peak: float
+    cpu_percent_avg: float
+    rss_bytes_peak: int
+    rss_bytes_avg: int
+    num_threads_peak: int
+    read_bytes: int
+    write_bytes: int
+
+
+class _ProcStat(TypedDict):
+    ppid: int
+    cpu_ticks: int
+    num_threads: int
+    rss_bytes: int
+
+
+def _read_stat(pid: int) -> tuple[int, _ProcStat] | None:
+    """`(start time, stat)` of the process, None if it is gone. The start time tells a reused pid apart."""
+    try:
+        raw = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # the command name is in parentheses and may contain anything, the fields after it start at field 3
+    fields = raw[raw.rfind(")") + 2 :].split()
+    stat: _ProcStat = {
+        "ppid": int(fields[1]),
+        "cpu_ticks": int(fields[11]) + int(fields[12]),
+        "num_threads": int(fields[17]),
+        "rss_bytes": int(fields[21]) * _PAGE_SIZE,
+    }
+    return int(fields[19]), stat
+
+
+def _read_io(pid: int) -> tuple[int, int]:
+    """Bytes read and written by the process, `(0, 0)` when `/proc/<pid>/io` is not readable."""
+    try:
+        lines = Path(f"/proc/{pid}/io").read_text().splitlines()
+    except OSError:
+        return 0, 0
+    counters = dict(line.split(": ", 1) for line in lines if ": " in line)
+    return int(counters.get("rchar", 0)), int(counters.get("wchar", 0))
+
+
+def _process_tree(root: int) -> list[int]:
+    children: dict[int, list[int]] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        stat = _read_stat(int(entry.name))
+        if stat is not None:
+            children.setdefault(stat[1]["ppid"], []).append(int(entry.name))
+    tree = [root]
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+    return tree
+
+
+def memory_limit() -> int:
+    """The memory limit of the cgroup (the container), else the memory of the host, 0 if unknown."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = Path(path).read_text().strip()
+        except OSError:
+            continue
+        # no limit: `max` in cgroup v2, a huge number in v1
+        if value.isdigit() and int(value) < 2**60:
+            return int(value)
+    try:
+        for line in Path("/proc/meminfo").read_text().splitlines():
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class ResourceMonitor:
+    def __init__(self, output_file: Path, interval: float | None = None):
+        self.output_file = Path(output_file)
+        if interval is None:
+            interval = float(os.environ.get("COINFER_RESOURCE_SAMPLE_SECONDS", "1"))
+        self.interval = interval
+        self.samples: list[ResourceSample] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # per `(pid, start time)`: the last cpu ticks and I/O counters seen
+        self._counters: dict[tuple[int, int], tuple[int, int, int]] = {}
+        self._cpu_ticks = 0
+        self._read_bytes = 0
+        self._write_bytes = 0
+        self._memory_limit = 0
+        self._started = 0.0
+        self._stopped = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and os.path.isdir("/proc")
+
+    def start(self, pid: int):
+        if not self.enabled or not pid:
+            return
+        self._memory_limit = memory_limit()
+        self._started = time.monotonic()
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, args=(pid,), name="coinfer-resource-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._stopped = time.monotonic()
+
+    def _run(self, pid: int):
+        warned = False
+        last = time.monotonic()
+        with open(self.output_file, "w") as fout:
+            while True:
+                stopping = self._stop.wait(self.interval)
+                now = time.monotonic()
+                sample = self._sample(pid, now - self._started, now - last)
+                last = now
+                if sample is not None:
+                    self.samples.append(sample)
+                    fout.write(json.dumps(sample) + "\n")
+                    # a task killed for its memory leaves the samples up to then
+                    fout.flush()
+                    limit = self._memory_limit * _MEMORY_WARNING_RATIO
+                    if not warned and limit and sample["rss_bytes"] > limit:
+                        logger.warning(
+                            "process %d uses %d MiB, close to the memory limit of %d MiB",
+                            pid,
+                            sample["rss_bytes"] >> 20,
+                            self._memory_limit >> 20,
+                        )
+                        warned = True
+                if stopping or sample is None:
+                    return
+
+    def _sample(self, pid: int, elapsed: float, period: float) -> ResourceSample | None:
+        """One sample of the tree under `pid`, None once the tree is gone."""
+        cpu_ticks = rss_bytes = num_threads = 0
+        counters: dict[tuple[int, int], tuple[int, int, int]] = {}
+        for tree_pid in _process_tree(pid):
+            stat = _read_stat(tree_pid)
+            if stat is None:
+                continue
+            start_time, proc_stat = stat
+            read_bytes, write_bytes = _read_io(tree_pid)
+            key = (tree_pid, start_time)
+            prev_ticks, prev_read, prev_write = self._counters.get(key, (0, 0, 0))
+            # accumulated by difference, the counters of the processes which exit are not lost
+            cpu_ticks += proc_stat["cpu_ticks"] - prev_ticks
+            self._read_bytes += max(0, read_bytes - prev_read)
+            self._write_bytes += max(0, write_bytes - prev_write)
+            counters[key] = (proc_stat["cpu_ticks"], read_bytes, write_bytes)
+            rss_bytes += proc_stat["rss_bytes"]
+            num_threads += proc_stat["num_threads"]
+        self._counters = counters
+        if not counters:
+            return None
+        self._cpu_ticks += cpu_ticks
+        return {
+            "t": round(elapsed, 3),
+            "cpu_percent": round(100.0 * cpu_ticks / _CLOCK_TICKS / period, 1) if period > 0 else 0.0,
+            "rss_bytes": rss_bytes,
+            "num_threads": num_threads,
+            "num_processes": len(counters),
+            "read_bytes": self._read_bytes,
+            "write_bytes": self._write_bytes,
+        }
+
+    def summary(self) -> ResourceSummary | None:
+        """Peak and average figures of the samples, None if nothing was recorded."""
+        if not self.samples:
+            return None
+        num_samples = len(self.samples)
+        return {
+            "duration_seconds": round((self._stopped or time.monotonic()) - self._started, 3),
+            "num_samples": num_samples,
+            "num_cpus": os.cpu_count() or 1,
+            "memory_limit_bytes": self._memory_limit,
+            "cpu_seconds": round(self._cpu_ticks / _CLOCK_TICKS, 2),
+            "cpu_percent_peak": max(sample["cpu_percent"] for sample in self.samples),
+            "cpu_percent_avg": round(sum(sample["cpu_percent"] for sample in self.samples) / num_samples, 1),
+            "rss_bytes_peak": max(sample["rss_bytes"] for sample in self.samples),
+            "rss_bytes_avg": sum(sample["rss_bytes"] for sample in self.samples) // num_samples,
+            "num_threads_peak": max(sample["num_threads"] for sample in self.samples),
+            "read_bytes": self._read_bytes,
+            "write_bytes": self._write_bytes,
+        }
@@ -13,7 +13,9 @@ from typing import Any, Callable
 import yaml
 
 from .client import ChainIterMap, ChainVarData, Client, RunInfoData
-from .client_common import NEED_LOGIN_PROMPT, bool_sync, gen_batch_id, get_token
+from .client_common import NEED_LOGIN_PROMPT, SAMPLING_STATUS_FILE, bool_sync, gen_batch_id, get_token
+from .draw_store import DRAW_STORE_SUFFIX, DrawStoreReader
+from .resource_monitor import RESOURCES_FILE, ResourceMonitor, ResourceSummary
 
 INTERVAL = int(os.environ.get("COINFER_DATA_SENDING_INTERVAL", "3"))
 
@@ -188,7 +190,11 @@ def _run_model(
     status = run_handler.run_in_process(cmd, envs, workflowdir / "model", mcmc_data_path, client, group_name)
     if is_sync:
         assert client
-        client.update_experiment(exp_id, {"status": status})
+        data: dict[str, Any] = {"status": status}
+        if run_handler.resources:
+            # merged into the run info of the experiment by `update_experiment`
+            data["meta"] = {"run_info": {"resources": run_handler.resources}}
+        client.update_experiment(exp_id, data)
         client.sendmsg(group_name, {"action": "experiment:finish"})
     return status
 
@@ -221,6 +227,8 @@ class ModelRunHandler:
         self.batch_id = batch_id
         self.run_id = run_id
         self.is_sync = is_sync
+        # peak and average figures of the last run, see `resource_monitor`
+        self.resources: ResourceSummary | None = None
 
     def run_in_process(
         self,
@@ -233,6 +241,9 @@ class ModelRunHandler:
     ):
         logger.info("Running sampling, sampling data will be saved to: %s", mcmc_data_path)
         logger.debug("sampling params: %s, %s", cmd, _mask_envs(envs))
+        # the status of a previous run is not taken for the one of this run
+        status_file = mcmc_data_path / SAMPLING_STATUS_FILE
+        status_file.unlink(missing_ok=True)
         popen = subprocess.Popen(
             cmd,
             bufsize=1,
@@ -242,6 +253,9 @@ class ModelRunHandler:
             universal_newlines=True,
             cwd=model_path,
         )
+        # the time series is written next to the MCMC data
+        monitor = ResourceMonitor(mcmc_data_path / RESOURCES_FILE)
+        monitor.start(popen.pid)
         if self.is_sync:
             sampling_finished_evt = threading.Event()
             thd = PropagatingThread(
@@ -255,8 +269,20 @@ class ModelRunHandler:
             if client and not os.environ.get("JULIA_DEBUG"):
                 client.sendmsg(group_name, {"action": "experiment:output", "data": stdout_line})
         popen.stdout.close()
-        return_code = popen.wait()
+        try:
+            return_code = popen.wait()
+        finally:
+            monitor.stop()
         logger.debug("sampling process exit with code: %s", return_code)
+        self.resources = monitor.summary()
+        if self.resources:
+            logger.info(
+                "sampling used peak RSS %d MiB, CPU %.0f%% peak %.0f%% average, %d threads",
+                self.resources["rss_bytes_peak"] >> 20,
+                self.resources["cpu_percent_peak"],
+                self.resources["cpu_percent_avg"],
+                self.resources["num_threads_peak"],
+            )
         if self.is_sync:
             assert sampling_finished_evt  # type: ignore
             assert thd  # type: ignore
@@ -277,6 +303,9 @@ class ModelRunHandler:
             logger.info("Sampling data is saved to: %s", mcmc_data_path)
             if client:
                 client.call_after_sample_lambda(self.exp_id, self.batch_id, self.run_id)
+        # tells `analyze --watch` on the local data that no more draws will come
+        mcmc_data_path.mkdir(parents=True, exist_ok=True)
+        status_file.write_text(status)
         return status
 
     @staticmethod
@@ -326,6 +355,7 @@ class ModelRunHandler:
 
         chain_iter_map: ChainIterMap = {}
         full_chain_iter_map: ChainIterMap = {}
+        draw_store_readers: dict[str, DrawStoreReader] = {}
 
         while True:
             if sampling_finished_evt.is_set():
@@ -346,6 +376,13 @@ class ModelRunHandler:
                 break
 
             for mcmc_data_file in sorted(mcmc_data_path.iterdir()):
+                if mcmc_data_file.suffix == DRAW_STORE_SUFFIX:
+                    if mcmc_data_file.name not in draw_store_readers:
+                        draw_store_readers[mcmc_data_file.name] = DrawStoreReader(mcmc_data_file)
+                    self._handle_draw_store(
+                        draw_store_readers[mcmc_data_file.name], already_handled, full_log_data, full_chain_iter_map
+                    )
+                    continue
                 if mcmc_data_file.suffix != ".csv":
                     continue
 
@@ -413,6 +450,35 @@ class ModelRunHandler:
             json.dump(already_handled, f)
         logger.debug("done syncing MCMC data")
 
+    @classmethod
+    def _handle_draw_store(
+        cls,
+        reader: DrawStoreReader,
+        already_handled: dict[str, tuple[float, int]],
+        full_log_data: ChainVarData,
+        full_chain_iter_map: ChainIterMap,
+    ):
+        # same bookkeeping as the csv files: (index_file_size, last_handled_segment_number)
+        if not reader.index_path.is_file():
+            return
+        fsize = reader.index_path.stat().st_size
+        handled_data = already_handled.get(reader.path.name, (0.0, 0))
+        if fsize <= handled_data[0]:
+            return
+        reader.refresh()
+        if len(reader.segments) <= handled_data[1]:
+            return
+
+        logger.debug("handling draw store: %s %s", reader.path.name, handled_data)
+        iterations, data = reader.to_table(handled_data[1])
+        if (iterations[1:] < iterations[:-1]).any():
+            raise RuntimeError(f"iteration_number is not sorted in {reader.path.name}")
+        # segments only hold whole iterations, they go straight to the data to send
+        log_data: ChainVarData = {reader.chain_name: {name: values.tolist() for name, values in data.items()}}
+        chain_iter_map: ChainIterMap = {reader.chain_name: (int(iterations[0]), int(iterations[-1]))}
+        cls._merge_full_data(log_data, full_log_data, chain_iter_map, full_chain_iter_map)
+        already_handled[reader.path.name] = (fsize, len(reader.segments))
+
     @staticmethod
     def _guess_type(value: str) -> Callable[[str], int | float | bool | str]:
         if value.isdigit() or (value.startswith("-") and value[1:].isdigit()):
@@ -429,6 +495,8 @@ class ModelRunHandler:
 
 
 def _run_data_script(settings: dict[str, Any], rootdir: Path, client: Client | None, group_name: str):
+    from . import warm_worker
+
     extra_envs: dict[str, str] = {
         "PYTHONPATH": Path(rootdir, "client", "Coinfer.py").as_posix(),
         "WORKFLOW_ID": settings.get("coinfer", {}).get("workflow_id", ""),
@@ -438,8 +506,10 @@ def _run_data_script(settings: dict[str, Any], rootdir: Path, client: Client | N
     if EFS_DIR := os.environ.get("EFS_DIR"):
         extra_envs["UV_CACHE_DIR"] = f"{EFS_DIR}/uv_cache"
 
-    popen = subprocess.Popen(
-        ["uv", "run", "--script", "data.py"],
+    cmd = ["uv", "run", "--script", "data.py"]
+    # the warm worker declines it unless its environment has the inline dependencies of data.py
+    popen = warm_worker.popen(cmd, env=os.environ | extra_envs, stderr_to_stdout=True) or subprocess.Popen(
+        cmd,
         bufsize=1,
         env=os.environ | extra_envs,
         stdout=subprocess.PIPE,
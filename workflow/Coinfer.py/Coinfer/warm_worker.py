@@ -0,0 +1,431 @@
+"""Opt-in warm worker: a long-lived interpreter with the heavy modules imported, running Python scripts in forks.
+
+`inv worker` starts it on the unix socket `tmp/warm_worker.sock` of the workflow (`COINFER_WARM_WORKER_SOCKET`).
+While it runs, `popen` hands `uv run [--script] <file.py> ...` commands to it instead of starting an interpreter:
+the worker forks, and the child takes the environment, working directory, arguments and output pipes of the
+request and runs the script as `__main__`, with numpy, pandas, arviz and bokeh already imported. For other commands,
+or without a worker, `popen` returns None and the caller starts the process as usual.
+
+The worker runs in one environment (the one of the `analyzer/` project), the dependencies of the scripts are not
+installed per script. It declines the `uv run` commands uv would run in another environment, and `popen` returns
+None: scripts with inline metadata (PEP 723 `# /// script`) or run with `--script` unless the worker's environment
+satisfies their `requires-python` and `dependencies`, and the other scripts when the nearest `pyproject.toml` of
+their working directory is not the one of the worker's project, as for the analyzers listed in the workflow.
+"""
+
+import argparse
+import atexit
+import importlib
+import importlib.metadata
+import json
+import logging
+import os
+import platform
+import re
+import runpy
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tomllib
+import traceback
+from pathlib import Path
+from typing import IO, Any, NoReturn
+
+logger = logging.getLogger(__name__)
+
+WARM_WORKER_SOCKET = "warm_worker.sock"
+DEFAULT_PRELOAD = ("numpy", "pandas", "scipy.stats", "xarray", "arviz", "bokeh.plotting", "bokeh.embed")
+
+# the length of the request, sent with the file descriptors of the output pipes
+_HEADER_SIZE = 8
+# https://packaging.python.org/en/latest/specifications/inline-script-metadata/
+_SCRIPT_METADATA = re.compile(r"(?m)^# /// script\s*$\s(?P<content>(^#(| .*)$\s)+)^# ///$")
+
+
+def socket_path() -> Path:
+    if path := os.environ.get("COINFER_WARM_WORKER_SOCKET"):
+        return Path(path)
+    return Path(os.getcwd(), "tmp", WARM_WORKER_SOCKET)
+
+
+def _script_argv(command: list[str]) -> list[str] | None:
+    """`[script, *args]` of a command running a Python script, None for other commands."""
+    if command[:2] == ["uv", "run"]:
+        argv = command[2:]
+        if argv[:1] == ["--script"]:
+            argv = argv[1:]
+    elif command[:1] in (["python"], ["python3"], [sys.executable]):
+        argv = command[1:]
+    else:
+        return None
+    if not argv or not argv[0].endswith(".py"):
+        return None
+    return argv
+
+
+class WarmProcess:
+    """The `subprocess.Popen` interface used by the callers, for a script run by the warm worker."""
+
+    def __init__(self, args: list[str], conn: socket.socket, stdout: IO[str], stderr: IO[str] | None):
+        self.args = args
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        self._conn = conn
+        # the messages are read with `select`, a timed out read of a socket file would make it unusable
+        self._buffer = b""
+        message = self._read_message(None) or {}
+        self.pid = message.get("pid", 0)
+        # why the worker did not run the script, it is then run as usual
+        self.declined: str = message.get("declined", "")
+
+    def _read_message(self, timeout: float | None) -> dict[str, Any] | None:
+        """The next message of the worker, `{}` if the connection is closed, None if nothing came in `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._conn], [], [], remaining)
+            if not ready:
+                return None
+            chunk = self._conn.recv(4096)
+            if not chunk:
+                self._buffer = b""
+                return {}
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return json.loads(line)
+
+    def wait(self, timeout: float | None = None) -> int:
+        if self.returncode is not None:
+            return self.returncode
+        message = self._read_message(timeout)
+        if message is None:
+            raise subprocess.TimeoutExpired(self.args, timeout or 0)
+        if "returncode" not in message:
+            logger.warning("warm worker child %d exited without a return code", self.pid)
+        self.returncode = int(message.get("returncode", -1))
+        self.close()
+        return self.returncode
+
+    def close(self):
+        self._conn.close()
+
+    def poll(self) -> int | None:
+        try:
+            return self.wait(0.0)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def kill(self):
+        if self.pid and self.returncode is None:
+            os.kill(self.pid, 9)
+
+
+def popen(
+    command: list[str], env: dict[str, str], cwd: str | Path | None = None, stderr_to_stdout: bool = False
+) -> WarmProcess | None:
+    """Run `command` in a fork of the warm worker if it is a Python script and a worker is listening."""
+    argv = _script_argv(command)
+    path = socket_path()
+    if argv is None or not path.exists():
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path.as_posix())
+    except OSError:
+        logger.debug("no warm worker listening on %s", path)
+        conn.close()
+        return None
+
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = (None, stdout_w) if stderr_to_stdout else os.pipe()
+    request = json.dumps(
+        {
+            "argv": argv,
+            "env": env,
+            "cwd": Path(cwd or os.getcwd()).absolute().as_posix(),
+            # `uv run` installs the dependencies of the script or its project, the worker must have them
+            "check_requirements": command[0] == "uv",
+            "script": command[2:3] == ["--script"],
+        }
+    ).encode()
+    try:
+        socket.send_fds(conn, [len(request).to_bytes(_HEADER_SIZE, "little")], [stdout_w, stderr_w])
+        conn.sendall(request)
+    except OSError:
+        logger.warning("warm worker on %s did not take the request", path, exc_info=True)
+        conn.close()
+        for fd in (stdout_r, stderr_r):
+            if fd is not None:
+                os.close(fd)
+        return None
+    finally:
+        # the child holds the write ends now, the pipes are at EOF when it exits
+        os.close(stdout_w)
+        if not stderr_to_stdout:
+            os.close(stderr_w)
+    # read by the caller like the pipes of a `Popen`, closed with the process
+    stdout = open(stdout_r, "r", errors="replace")  # noqa: SIM115
+    stderr = open(stderr_r, "r", errors="replace") if stderr_r is not None else None  # noqa: SIM115
+    proc = WarmProcess(command, conn, stdout, stderr)
+    if proc.declined:
+        logger.info("warm worker declined %s: %s", argv[0], proc.declined)
+        proc.close()
+        stdout.close()
+        if stderr is not None:
+            stderr.close()
+        return None
+    logger.info("run %s in the warm worker", argv[0])
+    return proc
+
+
+def _script_metadata(script: Path) -> dict[str, Any] | None:
+    """The inline metadata (PEP 723) of `script`, None without."""
+    try:
+        match = _SCRIPT_METADATA.search(script.read_text())
+    except (OSError, UnicodeDecodeError):
+        return None
+    if match is None:
+        return None
+    lines = match["content"].splitlines(keepends=True)
+    return tomllib.loads("".join(line[2:] if line.startswith("# ") else line[1:] for line in lines))
+
+
+def _project_dir(cwd: Path) -> Path | None:
+    """The project `uv run` uses in `cwd`: the nearest directory with a `pyproject.toml`."""
+    for directory in (cwd, *cwd.parents):
+        if (directory / "pyproject.toml").is_file():
+            return directory
+    return None
+
+
+def unsatisfied_requirements(script: Path) -> list[str]:
+    """The inline requirements (PEP 723) of `script` which this interpreter does not satisfy."""
+    metadata = _script_metadata(script)
+    if metadata is None:
+        return []
+    try:
+        from packaging.requirements import Requirement
+        from packaging.specifiers import SpecifierSet
+    except ImportError:
+        return ["packaging, to check the inline requirements"]
+
+    unsatisfied: list[str] = []
+    if (requires_python := metadata.get("requires-python")) and platform.python_version() not in SpecifierSet(
+        requires_python
+    ):
+        unsatisfied.append(f"python{requires_python}")
+    for dependency in metadata.get("dependencies", []):
+        requirement = Requirement(dependency)
+        if requirement.marker is not None and not requirement.marker.evaluate():
+            continue
+        try:
+            version = importlib.metadata.version(requirement.name)
+        except importlib.metadata.PackageNotFoundError:
+            unsatisfied.append(dependency)
+            continue
+        # the dependencies of extras are not looked up, such scripts run in their own environment
+        if requirement.extras or not requirement.specifier.contains(version, prereleases=True):
+            unsatisfied.append(dependency)
+    return unsatisfied
+
+
+def _preload(modules: list[str]):
+    start = time.time()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.warning("cannot preload %s", name)
+    logger.info("preloaded %s in %.1fs", ", ".join(modules), time.time() - start)
+
+
+def _reap():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not pid:
+            return
+
+
+def serve(path: Path | None = None, preload: list[str] | None = None, project: Path | None = None):
+    """Listen on the unix socket `path` and run every requested script in a fork, until interrupted.
+
+    `project` is the directory of the `pyproject.toml` of the worker's environment, None for a plain interpreter.
+    """
+    path = path or socket_path()
+    project = project.resolve() if project else None
+    if preload is None:
+        preload_env = os.environ.get("COINFER_WARM_WORKER_PRELOAD")
+        preload = preload_env.split(",") if preload_env else list(DEFAULT_PRELOAD)
+    _preload(preload)
+    # stopped by the process manager, the socket is removed on the way out
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path.as_posix())
+        os.chmod(path, 0o600)
+        server.listen()
+        # wake up regularly to reap the finished children
+        server.settimeout(1.0)
+        logger.info("warm worker listening on %s", path)
+        try:
+            while True:
+                _reap()
+                try:
+                    conn, _ = server.accept()
+                except TimeoutError:
+                    continue
+                with conn:
+                    _handle(server, conn, project)
+        except KeyboardInterrupt:
+            logger.info("warm worker stopped")
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def _handle(server: socket.socket, conn: socket.socket, project: Path | None):
+    header, fds, _, _ = socket.recv_fds(conn, _HEADER_SIZE, 2)
+    try:
+        size = int.from_bytes(header, "little")
+        payload = b""
+        while len(payload) < size:
+            chunk = conn.recv(size - len(payload))
+            if not chunk:
+                raise ConnectionError("request truncated")
+            payload += chunk
+        request = json.loads(payload)
+    except (ConnectionError, ValueError):
+        logger.exception("bad warm worker request")
+        for fd in fds:
+            os.close(fd)
+        return
+    if request.get("check_requirements") and (reason := _decline_reason(request, project)):
+        conn.sendall(json.dumps({"declined": reason}).encode() + b"\n")
+        for fd in fds:
+            os.close(fd)
+        return
+    # flushed, or the buffered output of the worker would be written again by the child
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        _child(server, conn, request, fds)
+    for fd in fds:
+        os.close(fd)
+    logger.info("forked %d for %s", pid, request["argv"][0])
+
+
+def _decline_reason(request: dict[str, Any], project: Path | None) -> str:
+    """Why the worker cannot run the `uv run` command of `request`, `""` when it can."""
+    cwd = Path(request["cwd"])
+    script = cwd / request["argv"][0]
+    # uv runs a script with inline metadata in an environment of its own, made from the metadata
+    if request.get("script") or _script_metadata(script) is not None:
+        unsatisfied = unsatisfied_requirements(script)
+        return f"requires {', '.join(unsatisfied)}" if unsatisfied else ""
+    script_project = _project_dir(cwd.resolve())
+    if script_project != project:
+        return f"runs in the project {script_project or 'of no pyproject.toml'}, the worker in {project or 'none'}"
+    return ""
+
+
+def _child(server: socket.socket, conn: socket.socket, request: dict[str, Any], fds: list[int]) -> NoReturn:
+    returncode = 1
+    try:
+        server.close()
+        conn.sendall(json.dumps({"pid": os.getpid()}).encode() + b"\n")
+        returncode = _run_script(request, fds)
+    except BaseException:  # noqa: BLE001, `os._exit` below would drop it unreported
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall(json.dumps({"returncode": returncode}).encode() + b"\n")
+        except (OSError, ValueError):
+            pass
+        os._exit(returncode)
+
+
+def _run_script(request: dict[str, Any], fds: list[int]) -> int:
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(fds[0], 1)
+    os.dup2(fds[1], 2)
+    for fd in {devnull, *fds}:
+        os.close(fd)
+    # the callers read the output line by line, as it comes
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    script, *args = request["argv"]
+    sys.argv = [script, *args]
+    python_path = [item for item in os.environ.get("PYTHONPATH", "").split(os.pathsep) if item]
+    sys.path[:] = [str(Path(script).absolute().parent), *python_path, *sys.path[1:]]
+    # the script imports its own copy of the package, the worker may have been started from another one
+    for name in [name for name in sys.modules if name == "Coinfer" or name.startswith("Coinfer.")]:
+        del sys.modules[name]
+    # let the script configure logging as in a new interpreter
+    logging.root.handlers.clear()
+    logging.root.setLevel(logging.WARNING)
+
+    try:
+        runpy.run_path(script, run_name="__main__")
+        returncode = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            returncode = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:  # noqa: BLE001, reported like the interpreter does for an uncaught exception
+        traceback.print_exc()
+        returncode = 1
+    # what the interpreter does before exiting
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and not thread.daemon:
+            thread.join()
+    atexit._run_exitfuncs()
+    return returncode
+
+
+def worker():
+    """Run the warm worker in the environment of the analyzer, in the foreground."""
+    workflow_dir = Path(os.getcwd())
+    env = os.environ | {"PYTHONPATH": Path(workflow_dir, "client", "Coinfer.py").as_posix()}
+    args = ["-m", "Coinfer.warm_worker", "--socket", socket_path().absolute().as_posix()]
+    if Path(workflow_dir, "analyzer", "pyproject.toml").is_file():
+        project = Path(workflow_dir, "analyzer").as_posix()
+        cmd = ["uv", "run", "--directory", "analyzer", "python", *args, "--project", project]
+    else:
+        cmd = [sys.executable, *args]
+    try:
+        subprocess.run(cmd, env=env, cwd=workflow_dir, check=False)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", type=Path, default=None)
+    parser.add_argument("--preload", default=None, help="comma separated modules to import")
+    parser.add_argument("--project", type=Path, default=None, help="the directory of the pyproject.toml in use")
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="{levelname} {filename}:{lineno} {message}", style="{")
+    serve(options.socket, options.preload.split(",") if options.preload else None, options.project)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# makes the `Coinfer` package importable from the tests without installing it
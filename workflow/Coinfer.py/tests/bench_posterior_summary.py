@@ -0,0 +1,42 @@
+"""Time `posterior_summary.summarize` against `arviz.summary` on the same draws, and check they agree.
+
+Run from `workflow/Coinfer.py` as
+`PYTHONPATH=. python tests/bench_posterior_summary.py [chains] [draws] [params]`,
+by default 4 chains of 1000 draws of 500 params. Not collected by pytest.
+"""
+
+import sys
+import time
+
+import arviz as az
+import numpy as np
+import pandas as pd
+
+from Coinfer.posterior_summary import summarize
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:4]]
+    num_chains, num_draws, num_params = sizes or [4, 1000, 500]
+    rng = np.random.default_rng(0)
+    ary = rng.normal(size=(num_chains, num_draws, num_params)).cumsum(axis=1) * 0.1
+    ary += rng.normal(size=ary.shape)
+    inference_data = az.from_dict(posterior={"theta": ary})
+
+    start = time.perf_counter()
+    expected = az.summary(inference_data, round_to="none")
+    arviz_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    result = pd.DataFrame(summarize(ary), index=expected.index)
+    batched_seconds = time.perf_counter() - start
+
+    deviation = (result - expected[result.columns]).abs().max().max()
+    print(f"{num_chains} chains x {num_draws} draws x {num_params} params")
+    print(f"arviz.summary  {arviz_seconds:8.3f}s")
+    speedup = arviz_seconds / batched_seconds
+    print(f"summarize      {batched_seconds:8.3f}s  ({speedup:.1f}x)")
+    print(f"max deviation  {deviation:.3g}")
+
+
+if __name__ == "__main__":
+    main()
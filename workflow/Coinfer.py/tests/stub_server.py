@@ -0,0 +1,225 @@
+"""A local stand-in for the Coinfer server endpoints used by `Coinfer.client` and `Coinfer.Experiment`, for tests.
+
+Serves the streaming analyzer result upload, the JSON one of older servers, the artifact store, the experiment
+objects and the `get-arviz-data` tarballs. Every request is recorded in `requests`, `unsupported` maps a route to
+the status code it answers instead, to play a server without it. Run it as `python stub_server.py <port>` to point
+a client at it by hand.
+"""
+
+import hashlib
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, NamedTuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# route name <==> pattern of the path
+ROUTES = {
+    "analyzer_result": re.compile(
+        r"^/api/object/(?P<object_id>[^/]+)/analyzer_result$"
+    ),
+    "artifacts_missing": re.compile(
+        r"^/api/object/(?P<object_id>[^/]+)/artifacts/missing$"
+    ),
+    "artifact": re.compile(
+        r"^/api/object/(?P<object_id>[^/]+)/artifacts/(?P<sha256>[0-9a-f]{64})$"
+    ),
+    "artifacts": re.compile(r"^/api/object/(?P<object_id>[^/]+)/artifacts$"),
+    "object": re.compile(r"^/api/object/(?P<object_id>[^/]+)$"),
+    "arviz_data": re.compile(r"^/sys/get-arviz-data$"),
+}
+
+
+class Request(NamedTuple):
+    method: str
+    route: str
+    headers: dict[str, str]
+    body: bytes
+    # sizes of the chunks of a `Transfer-Encoding: chunked` body, empty otherwise
+    chunks: list[int]
+    # the query string, one value a param
+    query: dict[str, str]
+
+
+class MultipartPart(NamedTuple):
+    name: str
+    filename: str
+    content_type: str
+    content: bytes
+
+
+class Response(NamedTuple):
+    status: int
+    # sent as JSON, or as is when bytes
+    data: Any = None
+    headers: dict[str, str] | None = None
+
+
+def parse_multipart(content_type: str, body: bytes) -> list[MultipartPart]:
+    boundary = re.search(r"boundary=([^;]+)", content_type)
+    assert boundary, content_type
+    delimiter = b"--" + boundary.group(1).encode()
+    parts = body.split(delimiter)
+    assert parts[0] == b"" and parts[-1] == b"--\r\n", "malformed multipart body"
+    result = []
+    for raw in parts[1:-1]:
+        head, content = raw[2:].split(b"\r\n\r\n", 1)
+        headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n"))
+        params = dict(re.findall(r'(\w+)="([^"]*)"', headers["Content-Disposition"]))
+        filename = unquote(params.get("filename", ""))
+        result.append(
+            MultipartPart(
+                params["name"], filename, headers["Content-Type"], content[:-2]
+            )
+        )
+    return result
+
+
+def _ok(data: Any = None) -> Response:
+    return Response(200, {"status": "ok", "data": data if data is not None else {}})
+
+
+class StubServer:
+    def __init__(self, port: int = 0):
+        self.requests: list[Request] = []
+        self.unsupported: dict[str, int] = {}
+        # sha256 <==> content of the uploaded artifacts
+        self.artifacts: dict[str, bytes] = {}
+        # object id <==> payload of the last analyzer result or artifact manifest
+        self.results: dict[str, dict[str, Any]] = {}
+        # experiment id <==> the object returned by `get_experiment`
+        self.experiments: dict[str, dict[str, Any]] = {}
+        # experiment id <==> the `get-arviz-data` tarball, and its ETag if any
+        self.arviz_data: dict[str, bytes] = {}
+        self.arviz_etags: dict[str, str] = {}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.endpoint = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def requests_to(self, route: str) -> list[Request]:
+        return [request for request in self.requests if request.route == route]
+
+    def _handle(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: bytes,
+        chunks: list[int],
+    ) -> Response:
+        path, query_string = urlsplit(url)[2:4]
+        for route, pattern in ROUTES.items():
+            if match := pattern.match(path):
+                break
+        else:
+            return Response(404, {"status": "error", "message": f"no route {path}"})
+        query = {name: values[0] for name, values in parse_qs(query_string).items()}
+        self.requests.append(Request(method, route, headers, body, chunks, query))
+        if route in self.unsupported:
+            return Response(self.unsupported[route])
+        object_id = match.groupdict().get("object_id", "")
+        if route == "analyzer_result" and method == "POST":
+            parts = parse_multipart(headers["Content-Type"], body)
+            payload = json.loads(parts[0].content)
+            payload["parts"] = parts[1:]
+            self.results[object_id] = payload
+        elif route == "object" and method == "POST":
+            self.results[object_id] = json.loads(body)["payload"]
+        elif route == "object" and method == "GET":
+            if object_id not in self.experiments:
+                return Response(200, {"status": "error", "message": "no such object"})
+            return _ok(self.experiments[object_id])
+        elif route == "arviz_data" and method == "GET":
+            return self._arviz_data(query["experiment_id"], headers)
+        elif route == "artifacts_missing" and method == "POST":
+            hashes = json.loads(body)["hashes"]
+            return _ok({"missing": [h for h in hashes if h not in self.artifacts]})
+        elif route == "artifact" and method == "PUT":
+            if hashlib.sha256(body).hexdigest() != match["sha256"]:
+                message = "content does not match its hash"
+                return Response(400, {"status": "error", "message": message})
+            self.artifacts[match["sha256"]] = body
+        elif route == "artifacts" and method == "POST":
+            payload = json.loads(body)["payload"]
+            missing = [
+                name
+                for name, artifact in payload["artifacts"].items()
+                if artifact["sha256"] not in self.artifacts
+            ]
+            if missing:
+                message = f"artifacts not uploaded: {missing}"
+                return Response(400, {"status": "error", "message": message})
+            self.results[object_id] = payload
+        else:
+            return Response(405)
+        return _ok()
+
+    def _arviz_data(self, experiment_id: str, headers: dict[str, str]) -> Response:
+        if experiment_id not in self.arviz_data:
+            return Response(404)
+        etag = self.arviz_etags.get(experiment_id, "")
+        if etag and headers.get("If-None-Match") == etag:
+            return Response(304, b"")
+        return Response(
+            200, self.arviz_data[experiment_id], {"ETag": etag} if etag else {}
+        )
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _read_body(self) -> tuple[bytes, list[int]]:
+                if self.headers.get("Transfer-Encoding") == "chunked":
+                    data, chunks = b"", []
+                    while size := int(self.rfile.readline().strip(), 16):
+                        data += self.rfile.read(size)
+                        chunks.append(size)
+                        self.rfile.readline()
+                    self.rfile.readline()
+                    return data, chunks
+                return self.rfile.read(int(self.headers.get("Content-Length", 0))), []
+
+            def _respond(self):
+                body, chunks = self._read_body()
+                response = server._handle(
+                    self.command, self.path, dict(self.headers), body, chunks
+                )
+                if isinstance(response.data, bytes):
+                    raw, content_type = response.data, "application/octet-stream"
+                else:
+                    raw = json.dumps(response.data).encode() if response.data else b""
+                    content_type = "application/json"
+                self.send_response(response.status)
+                self.send_header("Content-Type", content_type)
+                for name, value in (response.headers or {}).items():
+                    self.send_header(name, value)
+                if response.status != 304:
+                    self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, *_: Any):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    stub = StubServer(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print(f"serving on {stub.endpoint}", flush=True)
+    stub.httpd.serve_forever()
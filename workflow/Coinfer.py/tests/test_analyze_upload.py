@@ -0,0 +1,116 @@
+import base64
+import gzip
+import logging
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from stub_server import StubServer
+
+from Coinfer import analyze_cmd_impl
+from Coinfer import client as client_module
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[StubServer]:
+    monkeypatch.setattr(client_module, "_json_upload_endpoints", set())
+    monkeypatch.setattr(client_module, "_no_artifacts_endpoints", set())
+    monkeypatch.setattr(analyze_cmd_impl, "get_token", lambda: "token")
+    stub = StubServer().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def settings(
+    server: StubServer, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> dict[str, Any]:
+    monkeypatch.chdir(tmp_path)
+    for name in ("a", "b", "c"):
+        (tmp_path / "analyzer_output" / name).mkdir(parents=True)
+        (tmp_path / "analyzer_output" / name / "result.html").write_text(
+            f"<html>{name}</html>"
+        )
+    return {
+        "analysis": {"sync": "coinfer"},
+        "coinfer": {"endpoint": server.endpoint, "workflow_id": "wf1"},
+    }
+
+
+def _result_files(tmp_path: Path, names: list[str]) -> dict[str, str]:
+    return {
+        name: (tmp_path / "analyzer_output" / name / "result.html").as_posix()
+        for name in names
+    }
+
+
+def test_legacy_upload_names_the_results_left_out(
+    server: StubServer,
+    settings: dict[str, Any],
+    tmp_path: Path,
+    caplog: pytest.LogCaptureFixture,
+):
+    server.unsupported["artifacts_missing"] = 404
+    with caplog.at_level(logging.ERROR):
+        analyze_cmd_impl._save_analyzer_result(
+            settings, 0, ["warning"], _result_files(tmp_path, ["a", "b", "c"]), {}
+        )
+
+    result = server.results["wf1"]
+    (page,) = result["parts"]
+    assert gzip.decompress(page.content) == b"<html>a</html>"
+    message = "the server takes one result page, only the one of analyzer a is uploaded, not those of b, c"
+    assert result["errlines"] == [message, "warning"]
+    assert message in caplog.messages
+
+
+def test_legacy_upload_of_a_single_result(
+    server: StubServer, settings: dict[str, Any], tmp_path: Path
+):
+    server.unsupported["artifacts_missing"] = 404
+    server.unsupported["analyzer_result"] = 404
+    analyze_cmd_impl._save_analyzer_result(
+        settings, 0, ["warning"], _result_files(tmp_path, ["b"]), {}
+    )
+
+    result = server.results["wf1"]
+    assert gzip.decompress(base64.b64decode(result["result"])) == b"<html>b</html>"
+    assert result["errlines"] == ["warning"]
+
+
+def test_artifact_store_takes_every_result(
+    server: StubServer, settings: dict[str, Any], tmp_path: Path
+):
+    analyze_cmd_impl._save_analyzer_result(
+        settings, 0, [], _result_files(tmp_path, ["a", "b", "c"]), {}
+    )
+
+    manifest = server.results["wf1"]
+    assert manifest["result"] == "a/result.html"
+    assert set(manifest["artifacts"]) >= {
+        "a/result.html",
+        "b/result.html",
+        "c/result.html",
+    }
+    assert manifest["errlines"] == []
+
+
+def test_legacy_upload_sends_the_data_files_of_a_split_report(
+    server: StubServer, settings: dict[str, Any], tmp_path: Path
+):
+    server.unsupported["artifacts_missing"] = 404
+    data_dir = tmp_path / "analyzer_output" / "a" / "plot_data"
+    data_dir.mkdir()
+    (data_dir / "0123.json.gz").write_bytes(gzip.compress(b"{}"))
+    analyze_cmd_impl._save_analyzer_result(
+        settings, 0, [], _result_files(tmp_path, ["a"]), {}
+    )
+
+    page, data_file = server.results["wf1"]["parts"]
+    assert page.name == "result"
+    assert (data_file.name, data_file.filename) == (
+        "result_files",
+        "plot_data/0123.json.gz",
+    )
+    assert data_file.content == gzip.compress(b"{}")
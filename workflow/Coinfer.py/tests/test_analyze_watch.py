@@ -0,0 +1,94 @@
+import os
+from collections.abc import Callable
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from Coinfer import analyze_cmd_impl
+from Coinfer.client_common import SAMPLING_STATUS_FILE
+
+SETTINGS: dict[str, Any] = {"analysis": {"sync": "off"}, "sampling": {"mcmc_data": {}}}
+
+
+class _Watch:
+    """Drives `_watch` on a fake clock advancing one second a poll, with `polls[t]` as the poll result at second t."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, polls: list[Any]):
+        self.now = 0.0
+        self.runs: list[float] = []
+        clock = SimpleNamespace(monotonic=lambda: self.now, sleep=self._sleep)
+        monkeypatch.setattr(analyze_cmd_impl, "time", clock)
+        monkeypatch.setattr(analyze_cmd_impl, "WATCH_POLL_SECONDS", 1.0)
+        monkeypatch.setattr(
+            analyze_cmd_impl, "_change_poller", lambda _: self._poller(polls)
+        )
+        monkeypatch.setattr(
+            analyze_cmd_impl, "_analyze_once", lambda _: self.runs.append(self.now)
+        )
+
+    def _sleep(self, seconds: float):
+        self.now += seconds
+
+    def _poller(self, polls: list[Any]) -> Callable[[], tuple[Any, bool]]:
+        def poll() -> tuple[Any, bool]:
+            result = polls[min(int(self.now), len(polls) - 1)]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return poll
+
+
+def test_runs_while_the_data_keeps_changing(monkeypatch: pytest.MonkeyPatch):
+    # new data every second for 100 seconds, then the sampling is finished
+    polls = [(t, False) for t in range(100)] + [(100, True)]
+    watch = _Watch(monkeypatch, polls)
+    analyze_cmd_impl._watch(SETTINGS, debounce=5, min_interval=10, max_wait=30)
+    # every `max_wait` seconds while the data changes, once more after the last change
+    assert watch.runs == [30, 61, 92, 105]
+
+
+def test_runs_after_debounce_and_min_interval(monkeypatch: pytest.MonkeyPatch):
+    polls = [(0, False)] * 3 + [(1, False)] * 5 + [(1, True)]
+    watch = _Watch(monkeypatch, polls)
+    analyze_cmd_impl._watch(SETTINGS, debounce=2, min_interval=10, max_wait=60)
+    # the second change is debounced at 5, and waits for `min_interval` after the first run
+    assert watch.runs == [2, 12]
+
+
+def test_keeps_watching_after_a_failed_poll(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+):
+    polls = [
+        (0, False),
+        ConnectionError("server down"),
+        ConnectionError("server down"),
+        (1, False),
+        (1, True),
+    ]
+    watch = _Watch(monkeypatch, polls)
+    analyze_cmd_impl._watch(SETTINGS, debounce=0, min_interval=0, max_wait=60)
+    assert watch.runs == [0, 3]
+    assert caplog.text.count("poll the MCMC data failed") == 2
+
+
+def test_local_data_is_finished_by_the_sampling_status(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "mcmcdata"
+    data_dir.mkdir()
+    poll = analyze_cmd_impl._change_poller(SETTINGS)
+    (data_dir / "chain_1.csv").write_text("iteration,var,value\n")
+    fingerprint, finished = poll()
+    assert not finished
+
+    status_file = data_dir / SAMPLING_STATUS_FILE
+    status_file.write_text("SAMPLE_FIN")
+    assert poll() == (fingerprint, True)
+
+    # the status of a previous run, older than the data of this one
+    os.utime(status_file, ns=(0, 0))
+    assert poll() == (fingerprint, False)
@@ -0,0 +1,180 @@
+import base64
+import gzip
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+import requests
+from stub_server import StubServer
+
+from Coinfer import client as client_module
+from Coinfer.artifacts import collect_artifacts
+from Coinfer.client import Client
+
+
+@pytest.fixture
+def server() -> Iterator[StubServer]:
+    stub = StubServer().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def client(server: StubServer, monkeypatch: pytest.MonkeyPatch) -> Client:
+    # what a previous test learnt about the endpoints must not leak
+    monkeypatch.setattr(client_module, "_json_upload_endpoints", set())
+    monkeypatch.setattr(client_module, "_no_artifacts_endpoints", set())
+    return Client(server.endpoint, "token")
+
+
+@pytest.fixture
+def result_dir(tmp_path: Path) -> Path:
+    (tmp_path / "plot_data").mkdir()
+    (tmp_path / "result.html").write_text("<html>" + "x" * 5000 + "</html>")
+    (tmp_path / "plot_data" / "0.json.gz").write_bytes(os.urandom(3000))
+    return tmp_path
+
+
+def test_streamed_upload_is_chunked_and_gzipped(
+    server: StubServer,
+    client: Client,
+    result_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(client_module, "_UPLOAD_CHUNK_SIZE", 1024)
+    data_file = result_dir / "plot_data" / "0.json.gz"
+    client.save_analyzer_result(
+        "wf1",
+        0,
+        ["warning"],
+        (result_dir / "result.html").as_posix(),
+        [data_file.as_posix()],
+        {"a": {"rss": 1}},
+    )
+
+    (request,) = server.requests_to("analyzer_result")
+    assert request.headers["Transfer-Encoding"] == "chunked"
+    # the files are streamed in pieces of the chunk size, not read whole
+    assert max(request.chunks) <= 1024
+    assert len(request.chunks) > 3
+    result = server.results["wf1"]
+    assert result["return_code"] == 0
+    assert result["errlines"] == ["warning"]
+    assert result["resources"] == {"a": {"rss": 1}}
+    assert result["result_encoding"] == "gzip"
+    page, data = result["parts"]
+    assert (page.name, page.filename, page.content_type) == (
+        "result",
+        "result.html",
+        "application/gzip",
+    )
+    assert gzip.decompress(page.content) == (result_dir / "result.html").read_bytes()
+    assert (data.name, data.filename) == ("result_files", "plot_data/0.json.gz")
+    assert data.content == data_file.read_bytes()
+    assert not server.requests_to("object")
+
+
+@pytest.mark.parametrize("status_code", [404, 405, 415, 501])
+def test_json_fallback_on_servers_without_streaming(
+    server: StubServer, client: Client, result_dir: Path, status_code: int
+):
+    server.unsupported["analyzer_result"] = status_code
+    data_file = result_dir / "plot_data" / "0.json.gz"
+    client.save_analyzer_result(
+        "wf1", 1, [], (result_dir / "result.html").as_posix(), [data_file.as_posix()]
+    )
+
+    assert len(server.requests_to("analyzer_result")) == 1
+    result = server.results["wf1"]
+    assert result["return_code"] == 1
+    assert (
+        gzip.decompress(base64.b64decode(result["result"]))
+        == (result_dir / "result.html").read_bytes()
+    )
+    assert (
+        base64.b64decode(result["result_files"]["plot_data/0.json.gz"])
+        == data_file.read_bytes()
+    )
+
+    # the answer is remembered, the next upload goes straight to the JSON endpoint
+    client.save_analyzer_result("wf1", 0, [], (result_dir / "result.html").as_posix())
+    assert len(server.requests_to("analyzer_result")) == 1
+    assert len(server.requests_to("object")) == 2
+
+
+def test_streaming_error_is_not_a_fallback(
+    server: StubServer, client: Client, result_dir: Path
+):
+    server.unsupported["analyzer_result"] = 500
+    # the error page is not the JSON the client expects
+    with pytest.raises(requests.RequestException):
+        client.save_analyzer_result(
+            "wf1", 0, [], (result_dir / "result.html").as_posix()
+        )
+    assert not server.requests_to("object")
+
+
+def test_artifacts_upload_only_missing(
+    server: StubServer, client: Client, result_dir: Path
+):
+    result_file = (result_dir / "result.html").as_posix()
+    artifacts = collect_artifacts(result_dir)
+    assert client.publish_analyzer_artifacts(
+        "wf1", 0, [], result_file, result_dir, artifacts, resources={"a": {}}
+    )
+    assert len(server.requests_to("artifact")) == 2
+    manifest = server.results["wf1"]
+    assert manifest["result"] == "result.html"
+    assert manifest["artifacts"] == artifacts
+    assert manifest["resources"] == {"a": {}}
+
+    # a rerun changing only the page uploads only the page
+    (result_dir / "result.html").write_text("<html>changed</html>")
+    artifacts = collect_artifacts(result_dir)
+    assert client.publish_analyzer_artifacts(
+        "wf1", 0, [], result_file, result_dir, artifacts
+    )
+    uploads = server.requests_to("artifact")
+    assert len(uploads) == 3
+    assert uploads[-1].body == b"<html>changed</html>"
+    assert server.results["wf1"]["artifacts"] == artifacts
+
+    # nothing changed, nothing uploaded
+    assert client.publish_analyzer_artifacts(
+        "wf1", 0, [], result_file, result_dir, artifacts
+    )
+    assert len(server.requests_to("artifact")) == 3
+    assert len(server.requests_to("artifacts")) == 3
+
+
+@pytest.mark.parametrize("status_code", [404, 405, 415, 501])
+def test_servers_without_artifact_store(
+    server: StubServer, client: Client, result_dir: Path, status_code: int
+):
+    server.unsupported["artifacts_missing"] = status_code
+    result_file = (result_dir / "result.html").as_posix()
+    artifacts = collect_artifacts(result_dir)
+    assert not client.publish_analyzer_artifacts(
+        "wf1", 0, [], result_file, result_dir, artifacts
+    )
+    assert not server.requests_to("artifact")
+    assert not server.requests_to("artifacts")
+
+    # remembered, not asked again
+    assert not client.publish_analyzer_artifacts(
+        "wf1", 0, [], result_file, result_dir, artifacts
+    )
+    assert len(server.requests_to("artifacts_missing")) == 1
+
+
+def test_result_outside_output_dir_is_not_published(
+    server: StubServer, client: Client, tmp_path: Path
+):
+    (tmp_path / "out").mkdir()
+    (tmp_path / "page.html").write_text("<html></html>")
+    artifacts = collect_artifacts(tmp_path / "out")
+    assert not client.publish_analyzer_artifacts(
+        "wf1", 0, [], (tmp_path / "page.html").as_posix(), tmp_path / "out", artifacts
+    )
+    assert not server.requests
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import numpy as np
+
+from Coinfer.convert_csv_to_idata import McmcDataTailer
+
+
+def _append(path: Path, *rows: str):
+    with open(path, "a") as fout:
+        fout.writelines(f"{row}\n" for row in rows)
+
+
+def test_tailer_holds_back_partial_iteration(tmp_path: Path):
+    csv_file = tmp_path / "ch1.csv"
+    _append(
+        csv_file,
+        "ch1,a[1],1,0.1",
+        "ch1,a[2],1,0.2",
+        "ch1,b,1,1",
+        "ch1,a[1],2,0.3",
+        "ch1,a[2],2,0.4",
+        "ch1,b,2,2",
+    )
+    tailer = McmcDataTailer(tmp_path)
+    iterations, data = tailer.poll()["ch1"]
+    assert iterations.tolist() == [1, 2]
+    assert sorted(data) == ["a[1]", "a[2]", "b"]
+
+    # only a[1] of iteration 3 is written: nothing is complete
+    _append(csv_file, "ch1,a[1],3,0.7")
+    assert tailer.poll() == {}
+
+    _append(csv_file, "ch1,a[2],3,0.8", "ch1,b,3,3")
+    iterations, data = tailer.poll()["ch1"]
+    assert iterations.tolist() == [3]
+    np.testing.assert_array_equal(data["a[1]"], [0.7])
+    np.testing.assert_array_equal(data["a[2]"], [0.8])
+    np.testing.assert_array_equal(data["b"], [3])
+
+
+def test_tailer_holds_back_first_iteration_until_vars_are_known(tmp_path: Path):
+    csv_file = tmp_path / "ch1.csv"
+    _append(csv_file, "ch1,a,1,0.1")
+    tailer = McmcDataTailer(tmp_path)
+    # `b` of iteration 1 may still come
+    assert tailer.poll() == {}
+
+    _append(csv_file, "ch1,b,1,1.5", "ch1,a,2,0.2")
+    iterations, data = tailer.poll()["ch1"]
+    assert iterations.tolist() == [1]
+    assert sorted(data) == ["a", "b"]
+
+
+def test_tailer_waits_for_partial_line(tmp_path: Path):
+    csv_file = tmp_path / "ch1.csv"
+    _append(csv_file, "ch1,a,1,0.1", "ch1,a,2,0.2")
+    with open(csv_file, "a") as fout:
+        fout.write("ch1,a,3,0.")
+    tailer = McmcDataTailer(tmp_path)
+    assert tailer.poll()["ch1"][0].tolist() == [1, 2]
+
+    _append(csv_file, "3")
+    iterations, data = tailer.poll()["ch1"]
+    assert iterations.tolist() == [3]
+    np.testing.assert_array_equal(data["a"], [0.3])
@@ -0,0 +1,141 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from Coinfer import Experiment
+from Coinfer.convert_wide_csv_to_idata import load_stan_csv, load_turing_csv
+
+STAN_COLUMNS = (
+    "lp__,accept_stat__,stepsize__,treedepth__,n_leapfrog__,divergent__,energy__,"
+    "mu.1,mu.2,sigma"
+)
+
+
+def _write_stan_chain(
+    path: Path, chain: int, num_warmup: int, num_samples: int, save_warmup: bool
+):
+    header = [
+        "# model = mixture_model",
+        "# method = sample (Default)",
+        "#   sample",
+        f"#     num_samples = {num_samples}",
+        f"#     num_warmup = {num_warmup}",
+        f"#     save_warmup = {str(save_warmup).lower()}",
+        f"# id = {chain}",
+    ]
+    rows = []
+    for draw in range(num_warmup * save_warmup + num_samples):
+        value = chain * 100 + draw
+        divergent = int(draw % 3 == 0)
+        rows.append(f"-{value},0.9,0.5,3,7,{divergent},{value},{value},{-value},1.5")
+        if draw + 1 == num_warmup * save_warmup:
+            rows.append("# Adaptation terminated")
+            rows.append("# Step size = 0.5")
+    timing = ["#  Elapsed Time: 0.01 seconds (Warm-up)", "#"]
+    path.write_text("\n".join([*header, STAN_COLUMNS, *rows, *timing]) + "\n")
+
+
+def test_stan_chains_are_named_after_the_file_suffix(tmp_path: Path):
+    for chain in (1, 2, 10):
+        path = tmp_path / f"mixture-20250806105328_{chain}.csv"
+        _write_stan_chain(path, chain, 0, 4, save_warmup=False)
+    idatas = load_stan_csv(tmp_path.glob("*.csv"), max_workers=2)
+
+    assert sorted(idatas) == ["1", "10", "2"]
+    chain_10 = idatas["10"]
+    assert list(chain_10.posterior.chain.values) == ["10"]
+    assert set(chain_10.posterior.data_vars) == {"mu[1]", "mu[2]", "sigma"}
+    np.testing.assert_array_equal(
+        chain_10.posterior["mu[1]"].values[0], [1000, 1001, 1002, 1003]
+    )
+    assert "warmup_posterior" not in chain_10.groups()
+
+
+def test_stan_sample_stats_follow_the_arviz_names(tmp_path: Path):
+    path = tmp_path / "mixture_1.csv"
+    _write_stan_chain(path, 1, 0, 4, save_warmup=False)
+    sample_stats = load_stan_csv([path])["1"].sample_stats
+
+    assert set(sample_stats.data_vars) == {
+        "lp",
+        "acceptance_rate",
+        "step_size",
+        "tree_depth",
+        "n_steps",
+        "diverging",
+        "energy",
+    }
+    assert sample_stats["diverging"].dtype == bool
+    np.testing.assert_array_equal(
+        sample_stats["diverging"].values[0], [True, False, False, True]
+    )
+    np.testing.assert_array_equal(
+        sample_stats["lp"].values[0], [-100, -101, -102, -103]
+    )
+
+
+def test_stan_saved_warmup_is_split_off(tmp_path: Path):
+    path = tmp_path / "mixture_3.csv"
+    _write_stan_chain(path, 3, 2, 3, save_warmup=True)
+    idata = load_stan_csv([path])["3"]
+
+    np.testing.assert_array_equal(idata.warmup_posterior["sigma"].values.shape, (1, 2))
+    np.testing.assert_array_equal(idata.warmup_posterior["mu[1]"].values[0], [300, 301])
+    np.testing.assert_array_equal(idata.posterior["mu[1]"].values[0], [302, 303, 304])
+    np.testing.assert_array_equal(
+        idata.warmup_sample_stats["diverging"].values[0], [True, False]
+    )
+
+
+def test_stan_indexed_variables_are_grouped(tmp_path: Path):
+    path = tmp_path / "mixture_1.csv"
+    _write_stan_chain(path, 1, 0, 4, save_warmup=False)
+    posterior = load_stan_csv([path], group_indexed=True)["1"].posterior
+
+    assert posterior["mu"].shape == (1, 4, 2)
+    np.testing.assert_array_equal(
+        posterior["mu"].values[0, :, 1], [-100, -101, -102, -103]
+    )
+
+
+TURING_CSV = """\
+iteration,chain,m,s,lp,n_steps,is_accept,acceptance_rate,log_density,hamiltonian_energy,hamiltonian_energy_error,max_hamiltonian_energy_error,tree_depth,numerical_error,step_size,nom_step_size
+502,2,2.5,0.5,-10.0,3.0,1.0,0.6,-10.0,11.0,0.1,0.2,2.0,0.0,1.4,1.4
+501,1,0.5,1.5,-11.0,3.0,1.0,0.7,-11.0,12.0,0.1,0.2,2.0,1.0,1.4,1.4
+502,1,1.5,1.5,-12.0,7.0,0.0,0.8,-12.0,13.0,0.1,0.2,3.0,0.0,1.4,1.4
+501,2,2.0,0.5,-13.0,3.0,1.0,0.9,-13.0,14.0,0.1,0.2,2.0,0.0,1.4,1.4
+"""
+
+
+def test_turing_chains_and_sample_stats(tmp_path: Path):
+    path = tmp_path / "demo_chain.csv"
+    path.write_text(TURING_CSV)
+    idatas = load_turing_csv(path)
+
+    assert list(idatas) == ["1", "2"]
+    chain_1 = idatas["1"]
+    assert list(chain_1.posterior.chain.values) == ["1"]
+    assert set(chain_1.posterior.data_vars) == {"m", "s"}
+    # sorted by iteration within the chain
+    np.testing.assert_array_equal(chain_1.posterior["m"].values[0], [0.5, 1.5])
+    np.testing.assert_array_equal(idatas["2"].posterior["m"].values[0], [2.0, 2.5])
+
+    sample_stats = chain_1.sample_stats
+    assert {"energy", "energy_error", "diverging", "is_accept"} <= set(
+        sample_stats.data_vars
+    )
+    assert "hamiltonian_energy" not in sample_stats.data_vars
+    np.testing.assert_array_equal(sample_stats["diverging"].values[0], [True, False])
+    np.testing.assert_array_equal(sample_stats["is_accept"].values[0], [True, False])
+    np.testing.assert_array_equal(sample_stats["energy"].values[0], [12.0, 13.0])
+    # Turing exports the kept draws only
+    assert "warmup_posterior" not in chain_1.groups()
+
+
+@pytest.mark.parametrize("group_indexed", [False, True])
+def test_experiment_from_stan_csv(tmp_path: Path, group_indexed: bool):
+    for chain in (1, 2):
+        _write_stan_chain(tmp_path / f"mixture-1_{chain}.csv", chain, 0, 4, False)
+    xp = Experiment.from_stan_csv(sorted(tmp_path.glob("*.csv")), group_indexed)
+    assert xp.all_chains() == ["1", "2"]
@@ -0,0 +1,72 @@
+import io
+import tarfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import arviz as az
+import numpy as np
+import pytest
+
+import Coinfer
+
+
+def _executor_type(lazy: bool = False) -> type[Executor]:
+    with Coinfer._decode_executor(lazy) as executor:
+        return type(executor)
+
+
+def test_threads_by_default(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("COINFER_DECODE_PROCESSES", raising=False)
+    monkeypatch.setenv("COINFER_DECODE_WORKERS", "4")
+    assert _executor_type() is ThreadPoolExecutor
+
+
+def test_processes_on_demand(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_DECODE_PROCESSES", "TRUE")
+    monkeypatch.setenv("COINFER_DECODE_WORKERS", "4")
+    assert _executor_type() is ProcessPoolExecutor
+    # lazily opened files hold handles, they can't come back from another process
+    assert _executor_type(lazy=True) is ThreadPoolExecutor
+    # a single worker has nothing to gain from a process
+    monkeypatch.setenv("COINFER_DECODE_WORKERS", "1")
+    assert _executor_type() is ThreadPoolExecutor
+
+
+def test_no_processes_forked_from_a_prefetch_thread(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_DECODE_PROCESSES", "TRUE")
+    monkeypatch.setenv("COINFER_DECODE_WORKERS", "4")
+    types = []
+    thread = threading.Thread(target=lambda: types.append(_executor_type()))
+    thread.start()
+    thread.join()
+    assert types == [ThreadPoolExecutor]
+
+
+@pytest.mark.parametrize("processes", ["", "TRUE"])
+def test_chains_decode_the_same_in_threads_and_processes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, processes: str
+):
+    monkeypatch.setenv("COINFER_DECODE_PROCESSES", processes)
+    monkeypatch.setenv("COINFER_DECODE_WORKERS", "2")
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for i, chain in enumerate(["ch1", "ch2", "ch3"]):
+            nc_file = tmp_path / f"{chain}.nc"
+            posterior = {"mu": np.arange(5.0)[np.newaxis] + i}
+            az.from_dict(posterior=posterior, coords={"chain": [chain]}).to_netcdf(
+                nc_file
+            )
+            tar.add(nc_file, arcname=nc_file.name)
+    buffer.seek(0)
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    rsp = SimpleNamespace(raw=buffer)
+    inference_data = Coinfer._stream_inference_data(rsp, target_dir, False)
+
+    assert list(inference_data) == ["ch1", "ch2", "ch3"]
+    for i, chain in enumerate(inference_data):
+        np.testing.assert_array_equal(
+            inference_data[chain].posterior["mu"].values[0], np.arange(5.0) + i
+        )
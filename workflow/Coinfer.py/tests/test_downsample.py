@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+from Coinfer import _convert_plots_to_json
+from Coinfer.downsample import downsample_lines, lttb_indices, minmax_indices
+
+
+def _trace(num_points: int = 10_000):
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=num_points).cumsum()
+    fig = figure()
+    fig.line(np.arange(num_points), y)
+    return fig, y
+
+
+def test_off_by_default(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("COINFER_PLOT_MAX_POINTS", raising=False)
+    fig, y = _trace()
+    _convert_plots_to_json([("trace", "ch1", "mu", fig)], max_workers=1)
+    assert len(fig.renderers[0].data_source.data["y"]) == len(y)
+
+
+def test_opt_in(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_PLOT_MAX_POINTS", "400")
+    fig, y = _trace()
+    _convert_plots_to_json([("trace", "ch1", "mu", fig)], max_workers=1)
+    kept = fig.renderers[0].data_source.data["y"]
+    assert len(kept) <= 400
+    assert kept.min() == y.min() and kept.max() == y.max()
+
+
+def test_minmax_keeps_the_extremes_of_every_bucket():
+    y = np.random.default_rng(1).normal(size=1000)
+    indices = minmax_indices(y, 40)
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert (np.diff(indices) > 0).all()
+    for bucket in np.array_split(np.arange(1000), 10):
+        assert bucket[y[bucket].argmax()] in indices
+        assert bucket[y[bucket].argmin()] in indices
+
+
+def test_lttb_keeps_the_requested_number_of_points():
+    x = np.arange(1000.0)
+    y = np.sin(x / 50)
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+
+
+def test_sources_shared_with_other_glyphs_are_left_alone():
+    fig = figure()
+    x = np.arange(1000.0)
+    line = fig.line(x, np.sin(x))
+    fig.vbar(x="x", top="y", width=0.5, source=line.data_source)
+    assert downsample_lines(fig, 100) == 0
+    assert len(line.data_source.data["x"]) == 1000
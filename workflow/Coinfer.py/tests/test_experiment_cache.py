@@ -0,0 +1,120 @@
+import fcntl
+import gc
+import io
+import tarfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import arviz as az
+import numpy as np
+import pytest
+from stub_server import StubServer
+
+from Coinfer import Experiment
+
+
+@pytest.fixture
+def server(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[StubServer]:
+    monkeypatch.setenv("COINFER_SYNC", "TRUE")
+    monkeypatch.setenv("COINFER_EXPERIMENT_CACHE_DIR", (tmp_path / "cache").as_posix())
+    stub = StubServer().start()
+    nc_file = tmp_path / "ch1.nc"
+    posterior = {"mu": np.arange(5.0)[np.newaxis]}
+    az.from_dict(posterior=posterior, coords={"chain": ["ch1"]}).to_netcdf(nc_file)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        tar.add(nc_file, arcname=nc_file.name)
+    stub.arviz_data["exp1"] = buffer.getvalue()
+    yield stub
+    stub.stop()
+
+
+def _load(server: StubServer) -> np.ndarray:
+    inference_data = Experiment._download_inference_data(
+        server.endpoint, "token", "exp1", ""
+    )
+    return inference_data["ch1"].posterior["mu"].values[0]
+
+
+def test_revalidated_by_etag_without_status_requests(server: StubServer):
+    server.arviz_etags["exp1"] = '"v1"'
+    np.testing.assert_array_equal(_load(server), np.arange(5.0))
+    np.testing.assert_array_equal(_load(server), np.arange(5.0))
+    first, second = server.requests_to("arviz_data")
+    assert "If-None-Match" not in first.headers
+    assert second.headers["If-None-Match"] == '"v1"'
+    # only the first download asks for the status, in case the server sends no ETag
+    assert len(server.requests_to("object")) == 1
+
+
+def test_finished_experiment_without_validators_is_not_downloaded_again(
+    server: StubServer,
+):
+    server.experiments["exp1"] = {"status": "SAMPLE_FIN"}
+    np.testing.assert_array_equal(_load(server), np.arange(5.0))
+    np.testing.assert_array_equal(_load(server), np.arange(5.0))
+    assert len(server.requests_to("arviz_data")) == 1
+    # every load still asks for the status with the credentials of the caller
+    assert len(server.requests_to("object")) == 2
+
+
+def test_running_experiment_without_validators_is_downloaded_again(
+    server: StubServer,
+):
+    server.experiments["exp1"] = {"meta": {"run_info": {"status": "RUN"}}}
+    _load(server)
+    server.experiments["exp1"] = {"status": "SAMPLE_FIN"}
+    _load(server)
+    _load(server)
+    # downloaded while running, then once more as finished
+    assert len(server.requests_to("arviz_data")) == 2
+
+
+def test_denied_caller_does_not_get_the_cached_data(server: StubServer):
+    server.experiments["exp1"] = {"status": "SAMPLE_FIN"}
+    _load(server)
+    # the server now refuses the experiment to this caller
+    del server.experiments["exp1"]
+    server.unsupported["arviz_data"] = 403
+    with pytest.raises(RuntimeError):
+        _load(server)
+
+
+def _entry_is_free(tmp_path: Path) -> bool:
+    """Whether another process could take the lock of the entry to update or evict it."""
+    with open(tmp_path / "cache" / ".exp1.lock", "a") as flock:
+        try:
+            fcntl.flock(flock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        fcntl.flock(flock, fcntl.LOCK_UN)
+    return True
+
+
+def test_lazy_experiment_holds_its_entry_until_closed(
+    server: StubServer, tmp_path: Path
+):
+    server.arviz_etags["exp1"] = '"v1"'
+    with Experiment(server.endpoint, "token", "exp1", lazy=True) as xp:
+        other = Experiment(server.endpoint, "token", "exp1", lazy=True)
+        np.testing.assert_array_equal(xp.draws("mu")[0], np.arange(5.0))
+        assert not _entry_is_free(tmp_path)
+        other.close()
+        # still held by the first one
+        assert not _entry_is_free(tmp_path)
+    assert _entry_is_free(tmp_path)
+    # closing again is harmless
+    xp.close()
+
+
+def test_lazy_experiment_releases_its_entry_when_collected(
+    server: StubServer, tmp_path: Path
+):
+    server.arviz_etags["exp1"] = '"v1"'
+    # a logged error would keep the frames of the experiment in the captured logs
+    server.experiments["exp1"] = {"status": "RUN"}
+    xp = Experiment(server.endpoint, "token", "exp1", lazy=True)
+    assert not _entry_is_free(tmp_path)
+    del xp
+    gc.collect()
+    assert _entry_is_free(tmp_path)
@@ -0,0 +1,61 @@
+import arviz as az
+import numpy as np
+import pytest
+
+from Coinfer import Experiment
+
+
+def _experiment(num_draws: dict[str, int]) -> Experiment:
+    rng = np.random.default_rng(0)
+    inference_data = {
+        chain: az.from_dict(
+            posterior={
+                "mu": rng.normal(size=(1, n)),
+                "theta": rng.normal(size=(1, n, 3)),
+            }
+        )
+        for chain, n in num_draws.items()
+    }
+    return Experiment._from_inference_data("exp1", inference_data)
+
+
+@pytest.mark.parametrize("chains", [None, "c2", ["c1", "c3"]])
+@pytest.mark.parametrize("thin", [1, 3])
+def test_iter_draws_matches_draws(chains, thin):
+    xp = _experiment({"c1": 50, "c2": 47, "c3": 50})
+    batches = {
+        var: list(xp.iter_draws(var, batch=7, chains=chains, thin=thin))
+        for var in ("mu", "theta")
+    }
+    # no stacked copy of the whole var
+    assert not xp._draw_arrays
+    for var, var_batches in batches.items():
+        np.testing.assert_array_equal(
+            np.concatenate(var_batches, axis=1), xp.draws(var, chains, thin=thin)
+        )
+        assert all(batch.shape[1] <= 7 for batch in var_batches)
+
+
+def test_iter_draws_uses_kept_copy():
+    xp = _experiment({"c1": 20, "c2": 20})
+    values = xp.draws("mu")
+    batches = list(xp.iter_draws("mu", batch=8))
+    assert all(np.shares_memory(batch, values) for batch in batches)
+
+
+def test_draw_cache_budget(monkeypatch: pytest.MonkeyPatch):
+    xp = _experiment({"c1": 100, "c2": 100})
+    mu_bytes = xp.draws("mu").nbytes
+    monkeypatch.setenv("COINFER_DRAW_CACHE_BYTES", str(mu_bytes * 3))
+    xp._draw_arrays.clear()
+    xp.draws("mu")
+    # theta alone fits the budget, mu is dropped to make room
+    xp.draws("theta")
+    assert list(xp._draw_arrays) == ["theta"]
+
+    monkeypatch.setenv("COINFER_DRAW_CACHE_BYTES", "0")
+    xp._draw_arrays.clear()
+    np.testing.assert_array_equal(
+        xp.draws("mu", "c1")[0], xp.inference_data["c1"].posterior["mu"].values[0]
+    )
+    assert not xp._draw_arrays
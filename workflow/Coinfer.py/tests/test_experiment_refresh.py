@@ -0,0 +1,93 @@
+import io
+import json
+import tarfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import arviz as az
+import numpy as np
+import pytest
+from stub_server import StubServer
+
+from Coinfer import Experiment
+
+
+def _tarball(tmp_path: Path, chains: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for chain, values in chains.items():
+            nc_file = tmp_path / f"{chain}.nc"
+            az.from_dict(
+                posterior={"mu": values[np.newaxis]}, coords={"chain": [chain]}
+            ).to_netcdf(nc_file.as_posix())
+            tar.add(nc_file, arcname=nc_file.name)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[StubServer]:
+    monkeypatch.setenv("COINFER_SYNC", "TRUE")
+    stub = StubServer().start()
+    yield stub
+    stub.stop()
+
+
+def _iterations(server: StubServer) -> list[Any]:
+    """The `iteration` param of every `get-arviz-data` request."""
+    return [
+        json.loads(request.query["iteration"]) if "iteration" in request.query else None
+        for request in server.requests_to("arviz_data")
+    ]
+
+
+def _experiment(server: StubServer, values: np.ndarray) -> Experiment:
+    inference_data = {
+        "ch1": az.from_dict(
+            posterior={"mu": values[np.newaxis]}, coords={"chain": ["ch1"]}
+        )
+    }
+    xp = Experiment._from_inference_data("exp1", inference_data)
+    xp.server_endpoint = server.endpoint
+    return xp
+
+
+def test_refresh_appends_new_draws_numbered_from_zero(
+    server: StubServer, tmp_path: Path
+):
+    xp = _experiment(server, np.arange(5.0))
+    server.arviz_data["exp1"] = _tarball(tmp_path, {"ch1": np.arange(5.0, 8.0)})
+    assert xp.refresh() == {"ch1": 3}
+    # sampler iterations, not draw positions
+    assert _iterations(server) == [{"ch1": [1, 5]}]
+    posterior = xp.inference_data["ch1"].posterior
+    np.testing.assert_array_equal(posterior["draw"], np.arange(8))
+    np.testing.assert_array_equal(posterior["mu"].values[0], np.arange(8.0))
+
+    server.arviz_data["exp1"] = _tarball(tmp_path, {"ch1": np.arange(8.0, 10.0)})
+    assert xp.refresh() == {"ch1": 2}
+    assert _iterations(server)[-1] == {"ch1": [1, 8]}
+    np.testing.assert_array_equal(xp.draws("mu")[0], np.arange(10.0))
+
+
+def test_refresh_drops_draws_sent_again(server: StubServer, tmp_path: Path):
+    xp = _experiment(server, np.arange(5.0))
+    # a server ignoring `iteration` sends the whole chain
+    server.arviz_data["exp1"] = _tarball(tmp_path, {"ch1": np.arange(7.0)})
+    assert xp.refresh() == {"ch1": 2}
+    np.testing.assert_array_equal(
+        xp.inference_data["ch1"].posterior["draw"], np.arange(7)
+    )
+    np.testing.assert_array_equal(xp.draws("mu")[0], np.arange(7.0))
+    assert xp.refresh() == {"ch1": 0}
+    assert _iterations(server)[-1] == {"ch1": [1, 7]}
+
+
+def test_refresh_adds_new_chain(server: StubServer, tmp_path: Path):
+    xp = _experiment(server, np.arange(5.0))
+    server.arviz_data["exp1"] = _tarball(tmp_path, {"ch2": np.arange(3.0)})
+    assert xp.refresh() == {"ch2": 3}
+    assert xp.all_chains() == ["ch1", "ch2"]
+    np.testing.assert_array_equal(
+        xp.inference_data["ch2"].posterior["draw"], np.arange(3)
+    )
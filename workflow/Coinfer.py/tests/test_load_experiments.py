@@ -0,0 +1,103 @@
+import io
+import json
+import sys
+import tarfile
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import arviz as az
+import numpy as np
+import pytest
+from stub_server import StubServer
+
+import Coinfer
+from Coinfer.logged_requests import Req
+
+
+@pytest.fixture
+def server(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[StubServer]:
+    monkeypatch.setenv("COINFER_SYNC", "TRUE")
+    monkeypatch.setenv("COINFER_EXPERIMENT_CACHE_DIR", (tmp_path / "cache").as_posix())
+    monkeypatch.setattr(Coinfer, "get_token", lambda: "token")
+    stub = StubServer().start()
+    input_file = tmp_path / "input.json"
+    input_file.write_text(json.dumps({"coinfer_server_endpoint": stub.endpoint}))
+    monkeypatch.setattr(sys, "argv", ["analyzer.py", input_file.as_posix()])
+    yield stub
+    stub.stop()
+
+
+def _add_experiment(
+    server: StubServer, tmp_path: Path, experiment_id: str, posterior: dict
+):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for chain in ("ch1", "ch2"):
+            nc_file = tmp_path / f"{chain}.nc"
+            inference_data = az.from_dict(
+                posterior=posterior, coords={"chain": [chain]}
+            )
+            inference_data.to_netcdf(nc_file)
+            tar.add(nc_file, arcname=nc_file.name)
+    server.arviz_data[experiment_id] = buffer.getvalue()
+    server.experiments[experiment_id] = {"status": "SAMPLE_FIN"}
+
+
+def test_experiments_are_compared_on_their_common_vars(
+    server: StubServer, tmp_path: Path
+):
+    mu = np.arange(6.0).reshape(1, 6)
+    _add_experiment(server, tmp_path, "exp1", {"mu": mu, "sigma": mu})
+    # fewer draws, and a sigma of another shape
+    _add_experiment(
+        server, tmp_path, "exp2", {"mu": mu[:, :4] + 1, "sigma": np.ones((1, 4, 2))}
+    )
+    comparison = Coinfer.load_experiments(["exp1", "exp2", "exp1"], max_workers=2)
+
+    assert list(comparison.experiments) == ["exp1", "exp2"]
+    assert comparison.common_vars == ["mu"]
+    draws = comparison.draws("mu")
+    assert draws.shape == (2, 2, 4)
+    np.testing.assert_array_equal(draws[1, 0], [1, 2, 3, 4])
+    summary = comparison.summary()
+    assert list(summary.index) == [("exp1", "mu"), ("exp2", "mu")]
+
+
+def test_the_failed_experiment_is_named(server: StubServer, tmp_path: Path):
+    _add_experiment(server, tmp_path, "exp1", {"mu": np.zeros((1, 4))})
+    with pytest.raises(RuntimeError, match="load experiment missing failed"):
+        Coinfer.load_experiments(["exp1", "missing"])
+
+
+def test_request_results_are_per_thread(server: StubServer):
+    session = Req()
+    # both requests are sent before either thread reads the result of its own
+    barrier = threading.Barrier(2)
+    results: dict[str, tuple[str, str]] = {}
+
+    def _request(name: str, url: str):
+        session.get(url)
+        barrier.wait()
+        results[name] = (session.reqid, session.errmsg)
+
+    threads = [
+        threading.Thread(
+            target=_request, args=("ok", f"{server.endpoint}/api/object/exp1")
+        ),
+        threading.Thread(
+            target=_request, args=("failed", f"{server.endpoint}/api/nowhere")
+        ),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ok_reqid, ok_errmsg = results["ok"]
+    failed_reqid, failed_errmsg = results["failed"]
+    assert ok_errmsg == ""
+    assert failed_errmsg.startswith(f"[{failed_reqid}](http)invalid status_code")
+    # the only request the stub records is the routed one
+    (request,) = server.requests
+    assert request.headers["x-request-id"] == ok_reqid
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+from Coinfer import render_plots_to_html
+from Coinfer.plot_cache import PLOT_CACHE_DIR, fingerprint
+
+
+class _Figures:
+    """Plot tuples of figures built on demand, counting the builds."""
+
+    def __init__(self):
+        self.built: list[str] = []
+
+    def plot(self, var_name: str, draws: np.ndarray, *key: Any) -> tuple[Any, ...]:
+        def build():
+            self.built.append(var_name)
+            fig = figure()
+            fig.line(np.arange(len(draws)), draws)
+            return fig
+
+        return ("trace", "ch1", var_name, build, *key)
+
+
+@pytest.fixture
+def output_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setenv("COINFER_ANALYZE_OUTPUT_DIR", tmp_path.as_posix())
+    monkeypatch.delenv("COINFER_PLOT_CACHE_MAX_BYTES", raising=False)
+    return tmp_path
+
+
+def test_plots_with_an_unchanged_key_are_not_built_again(output_dir: Path):
+    mu, sigma = np.arange(50.0), np.ones(50)
+    figures = _Figures()
+    plots = [
+        figures.plot("mu", mu, (mu, {"kind": "trace"})),
+        figures.plot("sigma", sigma, (sigma, {"kind": "trace"})),
+        # without a key
+        figures.plot("tau", sigma),
+    ]
+    render_plots_to_html(plots, max_workers=1)
+    assert figures.built == ["mu", "sigma", "tau"]
+    assert len(list((output_dir / PLOT_CACHE_DIR).glob("*.json"))) == 2
+
+    figures.built.clear()
+    assert render_plots_to_html(plots, max_workers=1).count("<h4>") == 3
+    assert figures.built == ["tau"]
+
+    # new draws of mu, and another render option
+    figures.built.clear()
+    plots[0] = figures.plot("mu", mu + 1, (mu + 1, {"kind": "trace"}))
+    render_plots_to_html(plots, max_workers=1)
+    assert figures.built == ["mu", "tau"]
+    figures.built.clear()
+    render_plots_to_html(plots, binary=True, max_workers=1)
+    assert figures.built == ["mu", "sigma", "tau"]
+
+
+def test_cached_plot_is_the_built_one(output_dir: Path):
+    mu = np.arange(50.0)
+    figures = _Figures()
+    plots = [figures.plot("mu", mu, mu)]
+    built = render_plots_to_html(plots, max_workers=1)
+    assert render_plots_to_html(plots, max_workers=1) == built
+    assert figures.built == ["mu"]
+
+
+def test_no_cache_without_a_budget(output_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_PLOT_CACHE_MAX_BYTES", "0")
+    mu = np.arange(50.0)
+    figures = _Figures()
+    plots = [figures.plot("mu", mu, mu)]
+    render_plots_to_html(plots, max_workers=1)
+    render_plots_to_html(plots, max_workers=1)
+    assert figures.built == ["mu", "mu"]
+    assert not (output_dir / PLOT_CACHE_DIR).exists()
+
+
+def test_fingerprint_of_a_key():
+    assert fingerprint({"a": np.arange(3.0), "b": 1}) == fingerprint(
+        {"b": 1, "a": np.arange(3.0)}
+    )
+    assert fingerprint(np.arange(3.0)) != fingerprint(np.arange(3))
+    assert fingerprint(np.arange(3.0)) != fingerprint(np.arange(3.0).reshape(3, 1))
+    assert fingerprint(["ab", "c"]) != fingerprint(["a", "bc"])
+    with pytest.raises(TypeError):
+        fingerprint(object())
@@ -0,0 +1,143 @@
+import base64
+import copy
+import gzip
+import json
+import re
+from html import unescape
+from typing import Any
+
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+from Coinfer import _plot_to_json, render_plots_to_html
+from Coinfer.plot_encoding import encode_blob, pack_buffers
+
+
+def _figures() -> list[tuple[str, str, str, Any]]:
+    draws = figure()
+    draws.line(np.arange(200.0), np.random.default_rng(0).normal(size=200))
+    # a hand-built figure of list columns, sent as bytes once turned into arrays
+    counts = figure()
+    counts.scatter(list(range(50)), [i % 7 for i in range(50)])
+    return [("trace", "ch1", "mu", draws), ("hist", "", "", counts)]
+
+
+def _attach_buffers(node: Any, blob: bytes):
+    """What `coinferAttachBuffers` does in the page, back to the base64 payloads of `json_item`."""
+    if isinstance(node, list):
+        for child in node:
+            _attach_buffers(child, blob)
+    elif isinstance(node, dict):
+        if node.get("type") == "bytes" and isinstance(node.get("data"), list):
+            offset, length, itemsize = node["data"]
+            data = blob[offset : offset + length]
+            if itemsize > 1:
+                data = np.frombuffer(data, np.uint8).reshape(itemsize, -1).T.tobytes()
+            node["data"] = base64.b64encode(data).decode()
+            return
+        for child in node.values():
+            _attach_buffers(child, blob)
+
+
+def _embedded_items(html: str) -> dict[str, Any]:
+    items = {}
+    for plot_id, text in re.findall(
+        r'<script type="application/json" id="([^"]+)_data">(.*?)</script>', html
+    ):
+        item = json.loads(text)
+        buffers = re.search(
+            rf'id="{re.escape(plot_id)}_buffers" data-encoding="(\w+)">([^<]*)</script>',
+            html,
+        )
+        assert buffers, plot_id
+        blob = base64.b64decode(buffers[2])
+        if buffers[1] == "gzip":
+            blob = gzip.decompress(blob)
+        _attach_buffers(item, blob)
+        items[unescape(plot_id)] = item
+    return items
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_binary_page_gives_the_json_items(compress: bool):
+    plots = _figures()
+    html = render_plots_to_html(plots, binary=True, compress=compress, max_workers=1)
+
+    items = _embedded_items(html)
+    assert list(items) == ["trace_ch1_mu", "hist__"]
+    for plot_func, chain, var_name, fig in plots:
+        expected = json.loads(json.dumps(_plot_to_json(fig, binary=True)))
+        assert items[f"{plot_func}_{chain}_{var_name}"] == expected
+    assert html.count("coinferEmbedBinary(") == 3
+
+
+def test_list_columns_are_embedded_as_bytes():
+    html = render_plots_to_html(_figures()[1:], binary=True, max_workers=1)
+    item = json.loads(
+        re.search(
+            r'<script type="application/json" id="hist___data">(.*?)</script>', html
+        )[1]
+    )
+    text = json.dumps(item)
+    # no number of the columns is left in the JSON, only references into the blob
+    assert '"type": "bytes"' in text
+    assert "[0, 1, 2, 3" not in text
+
+
+def _ndarray(array: np.ndarray) -> dict[str, Any]:
+    data = base64.b64encode(array.tobytes()).decode()
+    return {
+        "type": "ndarray",
+        "array": {"type": "bytes", "data": data},
+        "shape": list(array.shape),
+        "dtype": array.dtype.name,
+        "order": "little",
+    }
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_pack_buffers_round_trip(shuffle: bool):
+    plot_json = {
+        "doc": {
+            "roots": [
+                {
+                    "type": "object",
+                    "name": "ColumnDataSource",
+                    "data": {
+                        "type": "map",
+                        "entries": [
+                            ["x", _ndarray(np.linspace(0.0, 1.0, 101))],
+                            ["y", _ndarray(np.arange(-50, 51, dtype=np.int32))],
+                        ],
+                    },
+                },
+                # not a whole number of items, stored as is
+                {"type": "bytes", "data": base64.b64encode(b"abc").decode()},
+            ]
+        }
+    }
+    expected = copy.deepcopy(plot_json)
+    packed, blob = pack_buffers(plot_json, shuffle=shuffle)
+
+    entries = packed["doc"]["roots"][0]["data"]["entries"]
+    itemsizes = [entry[1]["array"]["data"][2] for entry in entries]
+    assert itemsizes == ([8, 4] if shuffle else [1, 1])
+    assert packed["doc"]["roots"][1]["data"] == [808 + 404, 3, 1]
+    assert len(blob) == 808 + 404 + 3
+
+    for compress in (False, True):
+        text, encoding = encode_blob(blob, compress)
+        assert encoding == ("gzip" if compress else "identity")
+        raw = base64.b64decode(text)
+        decoded = copy.deepcopy(packed)
+        _attach_buffers(decoded, gzip.decompress(raw) if compress else raw)
+        assert decoded == expected
+
+
+def test_shuffled_blob_compresses_better():
+    plot_json = {"x": _ndarray(np.linspace(0.0, 1000.0, 10000))}
+    _, plain = pack_buffers(copy.deepcopy(plot_json))
+    _, shuffled = pack_buffers(copy.deepcopy(plot_json), shuffle=True)
+    plain_size = len(encode_blob(plain, compress=True)[0])
+    assert len(encode_blob(shuffled, compress=True)[0]) < plain_size / 2
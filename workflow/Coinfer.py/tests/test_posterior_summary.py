@@ -0,0 +1,82 @@
+import arviz as az
+import numpy as np
+import pandas as pd
+import pytest
+
+from Coinfer import Experiment
+from Coinfer.posterior_summary import summarize
+
+COLUMNS = [
+    "mean",
+    "sd",
+    "hdi_3%",
+    "hdi_97%",
+    "mcse_mean",
+    "mcse_sd",
+    "ess_bulk",
+    "ess_tail",
+    "r_hat",
+]
+
+
+def _draws(num_chains: int, num_draws: int, seed: int = 0) -> np.ndarray:
+    """`(chain, draw, param)` draws like those of a sampler: autocorrelated, shifted per chain, one with ties."""
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=(num_chains, num_draws, 4))
+    ary = np.empty_like(noise)
+    ary[:, 0] = noise[:, 0]
+    for draw in range(1, num_draws):
+        ary[:, draw] = 0.7 * ary[:, draw - 1] + noise[:, draw]
+    ary[:, :, 1] += np.arange(num_chains)[:, np.newaxis] * 0.3
+    ary[:, :, 2] = np.exp(ary[:, :, 2])
+    # rejected proposals repeat the previous draw
+    ary[:, :, 3] = np.round(ary[:, :, 3])
+    return ary
+
+
+def _arviz_summary(ary: np.ndarray) -> pd.DataFrame:
+    posterior = {f"p{i}": ary[:, :, i] for i in range(ary.shape[2])}
+    return az.summary(az.from_dict(posterior=posterior), round_to="none")
+
+
+@pytest.mark.parametrize("num_chains", [4, 1])
+def test_matches_arviz_summary(num_chains: int):
+    ary = _draws(num_chains, 500)
+    expected = _arviz_summary(ary)
+    result = pd.DataFrame(summarize(ary), index=expected.index)
+    assert list(result.columns) == COLUMNS
+    pd.testing.assert_frame_equal(result, expected[COLUMNS], rtol=1e-9, atol=1e-12)
+    if num_chains == 1:
+        assert result["r_hat"].isna().all()
+        assert result["ess_bulk"].notna().all()
+
+
+def test_nan_draws_get_no_diagnostics():
+    ary = _draws(2, 100)
+    ary[0, 5, 0] = np.nan
+    result = summarize(ary)
+    assert np.isnan(result["mean"][0])
+    assert np.isnan(result["ess_bulk"][0]) and np.isnan(result["r_hat"][0])
+    assert not np.isnan(result["ess_bulk"][1:]).any()
+
+
+def test_experiment_summary(monkeypatch: pytest.MonkeyPatch):
+    ary = _draws(3, 200)
+    inference_data = {
+        f"ch{chain}": az.from_dict(
+            posterior={
+                "mu": ary[chain : chain + 1, :, 0],
+                "theta": ary[chain : chain + 1, :, 1:],
+            },
+            coords={"chain": [f"ch{chain}"]},
+        )
+        for chain in range(3)
+    }
+    xp = Experiment._from_inference_data("exp1", inference_data)
+    table = xp.summary(quantiles=[0.5])
+    assert list(table.index) == ["mu", "theta[0]", "theta[1]", "theta[2]"]
+    expected = _arviz_summary(ary)
+    np.testing.assert_allclose(
+        table[COLUMNS].to_numpy(), expected[COLUMNS].to_numpy(), rtol=1e-9
+    )
+    np.testing.assert_allclose(table["q_50%"], np.median(ary.reshape(-1, 4), axis=0))
@@ -0,0 +1,61 @@
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import Coinfer
+
+
+@pytest.fixture
+def downloads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    """Runs `current_experiment` as an analyzer, its download waits for `state["release"]` and records its thread."""
+    input_file = tmp_path / "input.json"
+    input_file.write_text(
+        json.dumps(
+            {"coinfer_server_endpoint": "http://server", "experiment_id": "exp1"}
+        )
+    )
+    monkeypatch.setattr(sys, "argv", ["analyzer.py", input_file.as_posix()])
+    monkeypatch.setattr(Coinfer, "get_token", lambda: "token")
+    monkeypatch.delenv("COINFER_ANALYZE_OUTPUT_DIR", raising=False)
+    state: dict[str, Any] = {"release": threading.Event(), "threads": [], "error": None}
+
+    def _download(*_: Any) -> dict[str, Any]:
+        state["threads"].append(threading.current_thread())
+        assert state["release"].wait(10)
+        if state["error"]:
+            raise state["error"]
+        return {"ch1": "data"}
+
+    monkeypatch.setattr(Coinfer.Experiment, "_download_inference_data", _download)
+    return state
+
+
+def test_no_prefetch_by_default(downloads: dict[str, Any]):
+    downloads["release"].set()
+    xp = Coinfer.current_experiment()
+    assert downloads["threads"] == [threading.main_thread()]
+    assert xp.inference_data == {"ch1": "data"}
+
+
+def test_analyzers_prefetch(
+    downloads: dict[str, Any], monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setenv("COINFER_ANALYZE_OUTPUT_DIR", tmp_path.as_posix())
+    # returns while the download is still running
+    xp = Coinfer.current_experiment()
+    downloads["release"].set()
+    assert xp.inference_data == {"ch1": "data"}
+    (thread,) = downloads["threads"]
+    assert thread.name == "coinfer-prefetch" and thread.daemon
+
+
+def test_prefetch_error_is_raised_on_access(downloads: dict[str, Any]):
+    downloads["error"] = RuntimeError("get inference data failed: 403")
+    xp = Coinfer.current_experiment(prefetch=True)
+    downloads["release"].set()
+    with pytest.raises(RuntimeError, match="403"):
+        _ = xp.inference_data
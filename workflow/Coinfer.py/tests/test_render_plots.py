@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+import Coinfer
+from Coinfer import (
+    _convert_plots_to_json,
+    _plot_workers,
+    iter_plots_html,
+    render_plots_to_html,
+    save_result,
+)
+
+
+def _plots(num_plots: int) -> list[tuple]:
+    plots = []
+    for index in range(num_plots):
+        fig = figure()
+        fig.line(np.arange(50.0), np.arange(50.0) * index)
+        plots.append(("trace", "ch1", f"theta[{index}]", fig))
+    return plots
+
+
+def test_plot_workers(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_PLOT_WORKERS", "4")
+    # by default a pool only pays off for enough plots
+    assert _plot_workers(3, None) == 1
+    assert _plot_workers(8, None) == 2
+    assert _plot_workers(100, None) == 4
+    # asked for explicitly
+    assert _plot_workers(2, 2) == 2
+    assert _plot_workers(100, 1) == 1
+
+
+def test_small_reports_are_serialized_without_a_pool(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a pool was started")
+
+    monkeypatch.setenv("COINFER_PLOT_WORKERS", "4")
+    monkeypatch.setattr(Coinfer, "ProcessPoolExecutor", no_pool)
+    result = _convert_plots_to_json(_plots(3))
+    assert [plot[:3] for plot in result] == [plot[:3] for plot in _plots(3)]
+
+
+def test_pool_gives_the_serial_result(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("COINFER_PLOT_WORKERS", "2")
+    plots = _plots(8)
+    assert _plot_workers(len(plots), None) == 2
+    assert _convert_plots_to_json(plots) == _convert_plots_to_json(plots, max_workers=1)
+
+
+def test_sections_are_yielded_as_the_plots_are_built():
+    built = []
+
+    def _build(index: int):
+        def build():
+            built.append(index)
+            return _plots(index + 1)[index][3]
+
+        return build
+
+    plots = [("trace", "ch1", f"theta[{index}]", _build(index)) for index in range(3)]
+    sections = iter_plots_html(plots, max_workers=1)
+    head, group = next(sections), next(sections)
+    assert "<html" in head.lower() and '<div id="trace">' in group
+    assert built == []
+    for index in range(3):
+        assert f'id="trace_ch1_theta[{index}]"' in next(sections)
+        assert built == list(range(index + 1))
+    assert "".join(sections).endswith("</html>\n")
+
+
+def test_streamed_result_is_the_rendered_page(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("WORKFLOW_DIR", tmp_path.as_posix())
+    monkeypatch.setenv("COINFER_ANALYZE_OUTPUT_DIR", tmp_path.as_posix())
+    monkeypatch.setenv(
+        "COINFER_ANALYZE_RESULT_PATH_FILE", (tmp_path / "path").as_posix()
+    )
+    plots = _plots(3)
+    expected = render_plots_to_html(plots, binary=True, max_workers=1)
+    save_result(iter_plots_html(plots, binary=True, max_workers=1))
+
+    output = tmp_path / "output.html"
+    assert output.read_text() == expected
+    assert (tmp_path / "path").read_text() == output.as_posix()
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_failed_stream_leaves_no_result(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("WORKFLOW_DIR", tmp_path.as_posix())
+    monkeypatch.setenv("COINFER_ANALYZE_OUTPUT_DIR", tmp_path.as_posix())
+
+    def sections():
+        yield "<html>"
+        raise ValueError("plot failed")
+
+    with pytest.raises(ValueError):
+        save_result(sections())
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+from Coinfer import _plot_to_json, analyze_cmd_impl, render_plots_to_html
+from Coinfer.plot_encoding import PLOT_DATA_DIR, write_plot_group
+
+
+def test_plot_group_file_is_named_by_its_content(tmp_path: Path):
+    items = [("trace_ch1_mu", {"doc": [1, 2]}), ("trace_ch2_mu", {"doc": "<x>"})]
+    name = write_plot_group(tmp_path, iter(items))
+
+    path = tmp_path / name
+    assert json.loads(gzip.decompress(path.read_bytes())) == dict(items)
+    assert path.stat().st_mode & 0o777 == 0o644
+    assert write_plot_group(tmp_path, iter(items)) == name
+    assert write_plot_group(tmp_path, iter(items[:1])) != name
+    empty = tmp_path / write_plot_group(tmp_path, [])
+    assert json.loads(gzip.decompress(empty.read_bytes())) == {}
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_split_page_only_holds_placeholders(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("COINFER_ANALYZE_OUTPUT_DIR", tmp_path.as_posix())
+    plots = []
+    for plot_func in ("trace", "hist"):
+        for chain in ("ch1", "ch2"):
+            fig = figure()
+            fig.line(np.arange(100.0), np.arange(100.0))
+            plots.append((plot_func, chain, "mu", fig))
+    html = render_plots_to_html(plots, split=True, max_workers=1)
+
+    placeholders = re.findall(r'<div id="([^"]+)" data-src="([^"]+)"', html)
+    assert [plot_id for plot_id, _ in placeholders] == [
+        "trace_ch1_mu",
+        "trace_ch2_mu",
+        "hist_ch1_mu",
+        "hist_ch2_mu",
+    ]
+    # one data file a plot group
+    sources = [src for _, src in placeholders]
+    assert sources[0] == sources[1] != sources[2] == sources[3]
+    assert all(src.startswith(f"{PLOT_DATA_DIR}/") for src in sources)
+    assert "Bokeh.embed.embed_item(plotData" not in html
+    assert "IntersectionObserver" in html
+
+    for (plot_id, src), (*_, fig) in zip(placeholders, plots):
+        items = json.loads(gzip.decompress((tmp_path / src).read_bytes()))
+        assert items[plot_id] == json.loads(json.dumps(_plot_to_json(fig)))
+
+
+def test_data_files_of_previous_runs_are_pruned(tmp_path: Path):
+    data_dir = tmp_path / PLOT_DATA_DIR
+    data_dir.mkdir()
+    (data_dir / "old.json.gz").write_bytes(b"")
+    (data_dir / "new.json.gz").write_bytes(b"")
+    os.utime(data_dir / "old.json.gz", (0, 0))
+    analyze_cmd_impl._prune_data_files(tmp_path, time.time())
+    assert [path.name for path in data_dir.iterdir()] == ["new.json.gz"]
+    assert analyze_cmd_impl._result_data_files(
+        (tmp_path / "output.html").as_posix()
+    ) == [(data_dir / "new.json.gz").as_posix()]
@@ -0,0 +1,100 @@
+import io
+import tarfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import arviz as az
+import numpy as np
+import pytest
+
+import Coinfer
+
+
+class _SlowRaw(io.RawIOBase):
+    """A non seekable response body, read up to `pause_at` until `resume` is set, like a download in progress."""
+
+    def __init__(self, data: bytes, pause_at: int, resume: threading.Event):
+        self.data = data
+        self.position = 0
+        self.pause_at = pause_at
+        self.resume = resume
+        self.decode_content = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self.position >= self.pause_at:
+            assert self.resume.wait(10), (
+                "the first chain is not decoded during the download"
+            )
+        size = min(len(buffer), 4096, len(self.data) - self.position)
+        if self.position < self.pause_at:
+            size = min(size, self.pause_at - self.position)
+        buffer[:size] = self.data[self.position : self.position + size]
+        self.position += size
+        return size
+
+
+def _tarball(tmp_path: Path, chains: list[str]) -> tuple[bytes, list[int]]:
+    """A tarball of one `.nc` file a chain, and the offset in it where every file ends."""
+    buffer = io.BytesIO()
+    ends = []
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for i, chain in enumerate(chains):
+            nc_file = tmp_path / f"{chain}.nc"
+            posterior = {"mu%5B1%5D": np.arange(5.0)[np.newaxis] + i}
+            az.from_dict(posterior=posterior, coords={"chain": [chain]}).to_netcdf(
+                nc_file
+            )
+            tar.add(nc_file, arcname=f"./{nc_file.name}")
+            ends.append(buffer.tell())
+        readme = tmp_path / "README"
+        readme.write_text("not a chain")
+        tar.add(readme, arcname="README")
+    return buffer.getvalue(), ends
+
+
+def test_chains_are_decoded_while_downloading(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    data, ends = _tarball(tmp_path, ["ch1", "ch2", "ch3"])
+    resume = threading.Event()
+    load_netcdf = Coinfer._load_netcdf
+
+    def _load(path: str, group_indexed: bool = False, lazy: bool = False):
+        resume.set()
+        return load_netcdf(path, group_indexed, lazy)
+
+    monkeypatch.setattr(Coinfer, "_load_netcdf", _load)
+    # the rest of the tarball is only sent once the first chain is being decoded
+    rsp = SimpleNamespace(raw=_SlowRaw(data, ends[0] + 1, resume))
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    inference_data = Coinfer._stream_inference_data(rsp, target_dir, group_indexed=True)
+
+    assert rsp.raw.decode_content
+    assert list(inference_data) == ["ch1", "ch2", "ch3"]
+    np.testing.assert_array_equal(
+        inference_data["ch3"].posterior["mu"].values[0, :, 0], np.arange(5.0) + 2
+    )
+    assert sorted(path.name for path in target_dir.iterdir()) == [
+        "ch1.nc",
+        "ch2.nc",
+        "ch3.nc",
+    ]
+
+
+def test_extract_only_without_decode(tmp_path: Path):
+    data, _ = _tarball(tmp_path, ["ch1", "ch2"])
+    resume = threading.Event()
+    resume.set()
+    rsp = SimpleNamespace(raw=_SlowRaw(data, len(data), resume))
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    assert Coinfer._stream_inference_data(rsp, target_dir, False, decode=False) == {}
+    with az.rc_context({"data.load": "eager"}):
+        posterior = az.from_netcdf(target_dir / "ch2.nc").posterior
+    np.testing.assert_array_equal(posterior["mu%5B1%5D"].values[0], np.arange(5.0) + 1)
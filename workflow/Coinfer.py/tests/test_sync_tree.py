@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+
+from Coinfer.analyze_cmd_impl import _sync_tree
+
+
+def _tree(root: Path, files: dict[str, str]):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def test_only_changed_files_are_copied(tmp_path: Path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    _tree(src, {"__init__.py": "a", "sub/module.py": "b", "__pycache__/x.pyc": "c"})
+    assert _sync_tree(src, dst) == 2
+    assert (dst / "sub" / "module.py").read_text() == "b"
+    assert not (dst / "__pycache__").exists()
+    copied_inode = (dst / "__init__.py").stat().st_ino
+
+    assert _sync_tree(src, dst) == 0
+    # unchanged files are not replaced
+    assert (dst / "__init__.py").stat().st_ino == copied_inode
+
+    (src / "sub" / "module.py").write_text("b2")
+    _tree(src, {"new.py": "d"})
+    assert _sync_tree(src, dst) == 2
+    assert (dst / "sub" / "module.py").read_text() == "b2"
+    assert (dst / "new.py").read_text() == "d"
+    assert not list(dst.rglob(".*.tmp"))
+
+
+def test_touched_file_of_the_same_content_is_not_copied(tmp_path: Path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    _tree(src, {"__init__.py": "a"})
+    _sync_tree(src, dst)
+    copied_inode = (dst / "__init__.py").stat().st_ino
+    os.utime(src / "__init__.py", ns=(10**18, 10**18))
+
+    assert _sync_tree(src, dst) == 0
+    assert (dst / "__init__.py").stat().st_ino == copied_inode
+    # the mtime is taken over, the next run does not compare the contents again
+    assert (dst / "__init__.py").stat().st_mtime_ns == 10**18
+
+
+def test_files_missing_from_the_source_are_kept(tmp_path: Path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    _tree(src, {"__init__.py": "a"})
+    _tree(dst, {"analyzer.py": "keep"})
+    _sync_tree(src, dst)
+    assert (dst / "analyzer.py").read_text() == "keep"
@@ -0,0 +1,176 @@
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from Coinfer import warm_worker
+
+PACKAGE_ROOT = Path(__file__).parents[1]
+
+
+def _start_worker(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, *args: str
+) -> Iterator[Path]:
+    # a short path, unix socket paths are limited to about 100 bytes
+    socket_path = tmp_path / "w.sock"
+    monkeypatch.setenv("COINFER_WARM_WORKER_SOCKET", socket_path.as_posix())
+    command = [
+        sys.executable,
+        "-m",
+        "Coinfer.warm_worker",
+        "--socket",
+        socket_path.as_posix(),
+    ]
+    proc = subprocess.Popen(
+        [*command, "--preload", "json", *args],
+        env=os.environ | {"PYTHONPATH": PACKAGE_ROOT.as_posix()},
+    )
+    deadline = time.monotonic() + 30
+    while not socket_path.exists():
+        assert proc.poll() is None and time.monotonic() < deadline, (
+            "warm worker did not start"
+        )
+        time.sleep(0.05)
+    yield socket_path
+    proc.terminate()
+    proc.wait(10)
+
+
+@pytest.fixture
+def worker(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    yield from _start_worker(tmp_path, monkeypatch)
+
+
+def _script(path: Path, body: str, dependencies: list[str] | None = None) -> Path:
+    header = ""
+    if dependencies is not None:
+        lines = "".join(f'#   "{dependency}",\n' for dependency in dependencies)
+        header = f"# /// script\n# dependencies = [\n{lines}# ]\n# ///\n"
+    path.write_text(header + body)
+    return path
+
+
+def test_poll_then_wait(worker: Path, tmp_path: Path):
+    script = _script(
+        tmp_path / "slow.py",
+        "import time\nprint('started')\ntime.sleep(1)\nprint('done')\n",
+    )
+    proc = warm_worker.popen(
+        [sys.executable, script.as_posix()], env=dict(os.environ), cwd=tmp_path
+    )
+    assert proc is not None
+    assert proc.stdout.readline() == "started\n"
+    # polls time out without breaking the later reads
+    assert proc.poll() is None
+    assert proc.poll() is None
+    with pytest.raises(subprocess.TimeoutExpired):
+        proc.wait(0.1)
+    assert proc.wait() == 0
+    assert proc.poll() == 0
+    assert proc.stdout.read() == "done\n"
+
+
+def test_exit_code(worker: Path, tmp_path: Path):
+    script = _script(tmp_path / "fail.py", "import sys\nsys.exit(3)\n")
+    proc = warm_worker.popen(
+        [sys.executable, script.as_posix()], env=dict(os.environ), cwd=tmp_path
+    )
+    assert proc is not None
+    assert proc.wait() == 3
+
+
+def test_declines_scripts_with_unsatisfied_requirements(worker: Path, tmp_path: Path):
+    script = _script(
+        tmp_path / "data.py",
+        "print('ok')\n",
+        ["pytest", "coinfer-not-installed-package"],
+    )
+    assert (
+        warm_worker.popen(
+            ["uv", "run", "--script", script.as_posix()],
+            env=dict(os.environ),
+            cwd=tmp_path,
+        )
+        is None
+    )
+
+    script = _script(tmp_path / "data.py", "print('ok')\n", ["pytest>=1"])
+    proc = warm_worker.popen(
+        ["uv", "run", "--script", script.as_posix()], env=dict(os.environ), cwd=tmp_path
+    )
+    assert proc is not None
+    assert proc.wait() == 0
+    assert proc.stdout.read() == "ok\n"
+
+
+def test_unsatisfied_requirements(tmp_path: Path):
+    assert (
+        warm_worker.unsatisfied_requirements(
+            _script(tmp_path / "plain.py", "print(1)\n")
+        )
+        == []
+    )
+    script = _script(
+        tmp_path / "deps.py",
+        "print(1)\n",
+        [
+            "pytest",
+            "pytest<1",
+            "Pytest>=1",
+            "coinfer-not-installed-package",
+            "pytest[testing]",
+            "x; python_version<'3'",
+        ],
+    )
+    assert warm_worker.unsatisfied_requirements(script) == [
+        "pytest<1",
+        "coinfer-not-installed-package",
+        "pytest[testing]",
+    ]
+    script.write_text('# /// script\n# requires-python = "<3"\n# ///\n')
+    assert warm_worker.unsatisfied_requirements(script) == ["python<3"]
+
+
+def _project(path: Path) -> Path:
+    path.mkdir()
+    (path / "pyproject.toml").write_text('[project]\nname = "analyzer"\n')
+    _script(path / "entry.py", "print('ok')\n")
+    return path
+
+
+def test_declines_scripts_of_another_project(worker: Path, tmp_path: Path):
+    # the worker runs without a project, as a plain interpreter
+    project = _project(tmp_path / "analyzer")
+    command = ["uv", "run", "entry.py"]
+    assert warm_worker.popen(command, env=dict(os.environ), cwd=project) is None
+
+    _script(tmp_path / "entry.py", "print('ok')\n")
+    proc = warm_worker.popen(command, env=dict(os.environ), cwd=tmp_path)
+    assert proc is not None
+    assert proc.wait() == 0
+
+
+def test_runs_scripts_of_its_project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    project = _project(tmp_path / "analyzer")
+    other = _project(tmp_path / "other")
+    workers = _start_worker(tmp_path, monkeypatch, "--project", project.as_posix())
+    next(workers)
+    try:
+        command = ["uv", "run", "entry.py"]
+        proc = warm_worker.popen(command, env=dict(os.environ), cwd=project)
+        assert proc is not None
+        assert proc.wait() == 0
+        assert proc.stdout.read() == "ok\n"
+        assert warm_worker.popen(command, env=dict(os.environ), cwd=other) is None
+        # python commands are not run by uv, the project does not matter
+        proc = warm_worker.popen(
+            ["python", "entry.py"], env=dict(os.environ), cwd=other
+        )
+        assert proc is not None
+        assert proc.wait() == 0
+    finally:
+        next(workers, None)